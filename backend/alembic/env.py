@@ -16,6 +16,12 @@ from app.models.organization import Organization
 from app.models.personality import Personality
 from app.models.document import Document
 from app.models.conversation import Conversation
+from app.models.rate_limit import RateLimitBucket
+from app.models.analysis_job import AnalysisJob
+from app.models.advisor_response import AdvisorResponse
+from app.models.document_chunk import DocumentChunk
+from app.models.conversation_embedding import ConversationEmbedding
+from app.models.embedding_cache import EmbeddingCache
 
 # this is the Alembic Config object
 config = context.config
@@ -30,12 +36,21 @@ config.set_main_option("sqlalchemy.url", settings.SQLALCHEMY_DATABASE_URI)
 # Add your model's MetaData object here for 'autogenerate' support
 target_metadata = Base.metadata
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Full-text search columns are generated by Postgres and not mapped on the models
+    if type_ == "column" and name == "search_vector":
+        return False
+    if type_ == "index" and name.endswith("_search_vector"):
+        return False
+    return True
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -54,7 +69,8 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
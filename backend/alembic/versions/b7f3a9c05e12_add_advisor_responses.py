@@ -0,0 +1,39 @@
+"""add advisor responses
+
+Revision ID: b7f3a9c05e12
+Revises: 9e4b7c21d3f6
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3a9c05e12'
+down_revision: Union[str, None] = '9e4b7c21d3f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('advisor_responses',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_advisor_responses_conversation_event', 'advisor_responses', ['conversation_id', 'event_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advisor_responses_conversation_event', table_name='advisor_responses')
+    op.drop_table('advisor_responses')
@@ -0,0 +1,39 @@
+"""add conversation embeddings
+
+Revision ID: e8a2f61b7c93
+Revises: d41c7e9a2b58
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a2f61b7c93'
+down_revision: Union[str, None] = 'd41c7e9a2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('conversation_embeddings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=False),
+    sa.Column('embedding_model', sa.String(), nullable=False),
+    sa.Column('embedding', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('conversation_id')
+    )
+    op.create_index('ix_conversation_embeddings_org_model', 'conversation_embeddings', ['organization_id', 'embedding_model'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversation_embeddings_org_model', table_name='conversation_embeddings')
+    op.drop_table('conversation_embeddings')
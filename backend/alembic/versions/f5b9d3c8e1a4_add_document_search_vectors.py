@@ -0,0 +1,46 @@
+"""add document search vectors
+
+Revision ID: f5b9d3c8e1a4
+Revises: e8a2f61b7c93
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5b9d3c8e1a4'
+down_revision: Union[str, None] = 'e8a2f61b7c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Generated columns: Postgres keeps them current on every insert and update.
+    # The 'simple' configuration doesn't stem, so tickers, contract names and
+    # statute numbers are matched as written.
+    op.add_column('documents', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', coalesce(content, ''))", persisted=True),
+        nullable=True
+    ))
+    op.create_index('ix_documents_search_vector', 'documents', ['search_vector'], unique=False, postgresql_using='gin')
+    op.add_column('document_chunks', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', coalesce(text, ''))", persisted=True),
+        nullable=True
+    ))
+    op.create_index('ix_document_chunks_search_vector', 'document_chunks', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_document_chunks_search_vector', table_name='document_chunks')
+    op.drop_column('document_chunks', 'search_vector')
+    op.drop_index('ix_documents_search_vector', table_name='documents')
+    op.drop_column('documents', 'search_vector')
@@ -1,175 +1,154 @@
-import os
-import tempfile
-from typing import List, Dict, AsyncGenerator, Union
-import google.generativeai as genai
-from ..models.conversation import Conversation
-from ..models.document import Document
-from ..models.personality import Personality
-from sqlalchemy.orm import Session
+import asyncio
+from typing import AsyncGenerator, Optional
+from ..core.cache import fingerprint, normalize_topic, response_cache
 from ..core.config import settings
+from ..core.context import AdvisorContext
+from ..core.llm import LLMProvider, get_provider
+from ..core.prefix_cache import prefix_cache
+from ..core.resilience import resilient_caller
+from ..core.scheduler import Admission
+from ..core.singleflight import advisor_flights
+
+
+DEFAULT_PERSONALITIES = {
+    "legal": """
+    You are a seasoned Legal Advisor with expertise in corporate law, compliance, and risk management.
+    Your priorities are:
+    1. Ensuring legal compliance
+    2. Protecting the company from legal risks
+    3. Analyzing regulatory implications
+    4. Structuring deals and partnerships legally
+    5. Maintaining ethical standards
+    """,
+    
+    "financial": """
+    You are an experienced Financial Advisor with expertise in corporate finance and investment strategy.
+    Your priorities are:
+    1. Financial performance analysis
+    2. ROI optimization
+    3. Risk management
+    4. Market analysis
+    5. Capital allocation
+    """,
+    
+    "technology": """
+    You are a Technology Strategy Advisor with expertise in digital transformation and tech trends.
+    Your priorities are:
+    1. Technical feasibility assessment
+    2. Technology stack optimization
+    3. Digital transformation strategy
+    4. Cybersecurity considerations
+    5. Innovation opportunities
+    """
+}
 
 
-class ConversationMemory:
-    def get_relevant_history(self, db: Session, org_id: int, topic: str, limit: int = 5) -> List[Conversation]:
-        """Get semantically relevant conversation history"""
-        # TODO: Implement semantic search here
-        return (
-            db.query(Conversation)
-            .filter(Conversation.organization_id == org_id)
-            .order_by(Conversation.timestamp.desc())
-            .limit(limit)
-            .all()
-        )
-
-class DocumentManager:
-    def get_relevant_documents(self, db: Session, org_id: int, topic: str, limit: int = 3) -> List[Document]:
-        """Get semantically relevant documents"""
-        # TODO: Implement semantic search here
-        return (
-            db.query(Document)
-            .filter(Document.organization_id == org_id)
-            .order_by(Document.timestamp.desc())
-            .limit(limit)
-            .all()
-        )
-
 class AIAdvisor:
-    def __init__(self, role: str, db: Session = None, org_id: int = None):
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+    def __init__(self, role: str, personality: Optional[str] = None):
         self.role = role
-        self.db = db
-        self.org_id = org_id
-        self.personality = self.get_personality(role)
-        self.memory = ConversationMemory()
-        self.document_manager = DocumentManager()
+        # Custom personalities pass their prompt in; built-in roles fall back to the defaults
+        self.personality = personality or self.get_personality(role)
+        self.personality_version = fingerprint(self.personality)[:12]
+
+    @property
+    def llm(self) -> LLMProvider:
+        # Resolved on first use so building advisors never touches the SDK
+        return get_provider()
 
     def get_personality(self, role: str) -> str:
-        # First check for custom personality if db and org_id are available
-        if self.db and self.org_id:
-            custom_personality = (
-                self.db.query(Personality)
-                .filter(
-                    Personality.organization_id == self.org_id,
-                    Personality.name == role
-                )
-                .first()
-            )
-            if custom_personality:
-                return custom_personality.prompt_template
-        personalities = {
-            "legal": """
-            You are a seasoned Legal Advisor with expertise in corporate law, compliance, and risk management.
-            Your priorities are:
-            1. Ensuring legal compliance
-            2. Protecting the company from legal risks
-            3. Analyzing regulatory implications
-            4. Structuring deals and partnerships legally
-            5. Maintaining ethical standards
-            """,
-            
-            "financial": """
-            You are an experienced Financial Advisor with expertise in corporate finance and investment strategy.
-            Your priorities are:
-            1. Financial performance analysis
-            2. ROI optimization
-            3. Risk management
-            4. Market analysis
-            5. Capital allocation
-            """,
-            
-            "technology": """
-            You are a Technology Strategy Advisor with expertise in digital transformation and tech trends.
-            Your priorities are:
-            1. Technical feasibility assessment
-            2. Technology stack optimization
-            3. Digital transformation strategy
-            4. Cybersecurity considerations
-            5. Innovation opportunities
-            """
-        }
-        return personalities.get(role, "Generic board member personality")
+        return DEFAULT_PERSONALITIES.get(role, "Generic board member personality")
 
-    async def get_analysis(
-        self, 
-        input_data: Union[str, bytes], 
-        db: Session, 
-        org_id: int
-    ) -> AsyncGenerator[str, None]:
-        try:
-            # Handle audio input if bytes
-            if isinstance(input_data, bytes):
-                topic = await self._process_audio(input_data)
-            else:
-                topic = input_data
-
-            # Get relevant history and documents using managers
-            past_conversations = self.memory.get_relevant_history(db, org_id, topic)
-            relevant_docs = self.document_manager.get_relevant_documents(db, org_id, topic)
-
-            # Build context
-            context = f"""
+    def cache_key(self, context: AdvisorContext) -> tuple:
+        return (
+            context.org_id,
+            self.role,
+            self.personality_version,
+            normalize_topic(context.topic),
+            context.fingerprint
+        )
+
+    def build_prefix(self, context: AdvisorContext) -> str:
+        """Static part of the prompt: role, personality and the org's document library"""
+        return f"""
             As a {self.role} advisor with the following context:
             {self.personality}
 
-            {self._format_history(past_conversations)}
-            {self._format_documents(relevant_docs)}
+            {context.corpus}
+            """
+
+    def build_prompt(self, context: AdvisorContext) -> str:
+        """Per-request part of the prompt that follows the prefix"""
+        return f"""
+            {context.history}
+            {context.documents}
 
             Current topic:
-            {topic}
+            {context.topic}
 
             Provide your perspective based on your expertise and priorities.
             """
 
-            response = self.model.generate_content(context, stream=True)
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
-        except Exception as e:
-            yield f"Error from {self.role} advisor: {str(e)}"
-
-    async def _process_audio(self, audio_data: bytes) -> str:
-        """Process audio input to text using Gemini's multimodal capabilities"""
-        try:
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
-                temp_audio.write(audio_data)
-                temp_path = temp_audio.name
-
-            try:
-                with open(temp_path, 'rb') as audio:
-                    response = self.model.generate_content([audio.read()])
-                return response.text
-            finally:
-                os.remove(temp_path)
-        except Exception as e:
-            raise Exception(f"Error processing audio: {str(e)}")
-
-    def _format_history(self, conversations: List[Conversation]) -> str:
-        # Existing _format_history implementation remains the same
-        history = []
-        for conv in conversations:
-            try:
-                history.append(f"""
-                Date: {conv.timestamp}
-                Topic: {conv.topic}
-                Key Points: {conv.discussion.get('synthesis', 'No synthesis available')}
-                """)
-            except Exception as e:
-                print(f"Error formatting conversation: {str(e)}")
-                continue
-        return "Relevant past discussions:\n" + "\n".join(history) if history else ""
-
-    def _format_documents(self, documents: List[Document]) -> str:
-        # Existing _format_documents implementation remains the same
-        docs = []
-        for doc in documents:
-            try:
-                docs.append(f"""
-                Type: {doc.type}
-                Date: {doc.timestamp}
-                Content: {doc.content[:500]}... # Truncated for context
-                """)
-            except Exception as e:
-                print(f"Error formatting document: {str(e)}")
-                continue
-        return "Relevant company documents:\n" + "\n".join(docs) if docs else ""
\ No newline at end of file
+    async def get_analysis(
+        self,
+        context: AdvisorContext,
+        use_cache: bool = True,
+        admission: Optional[Admission] = None
+    ) -> AsyncGenerator[str, None]:
+        use_cache = use_cache and settings.RESPONSE_CACHE_ENABLED
+        key = self.cache_key(context)
+        if use_cache:
+            cached_chunks = response_cache.get(key)
+            if cached_chunks is not None:
+                # Replay through the same streaming path, chunk by chunk
+                for text in cached_chunks:
+                    yield text
+                    await asyncio.sleep(0)
+                return
+
+        # Upstream failures propagate, so callers report them as errors rather than answer text
+        if use_cache and settings.SINGLEFLIGHT_ENABLED:
+            # Identical in-flight requests share one upstream generation
+            stream = advisor_flights.stream(key, lambda: self._generate(context, key, use_cache, admission))
+        else:
+            stream = self._generate(context, key, use_cache, admission)
+        async for text in stream:
+            yield text
+
+    async def _generate(
+        self,
+        context: AdvisorContext,
+        key: tuple,
+        use_cache: bool,
+        admission: Optional[Admission]
+    ) -> AsyncGenerator[str, None]:
+        # Retried, hedged and circuit-broken per the role's resilience policy
+        stream = resilient_caller.stream(self.role, lambda: self._stream_upstream(context, key, use_cache))
+        if admission is None:
+            async for text in stream:
+                yield text
+            return
+        # Wait for a fair share of the upstream capacity before calling the model
+        async with admission.slot():
+            async for text in stream:
+                yield text
+
+    async def _stream_upstream(self, context: AdvisorContext, key: tuple, use_cache: bool) -> AsyncGenerator[str, None]:
+        prefix = self.build_prefix(context)
+        prompt = self.build_prompt(context)
+        handle = None
+        if settings.PREFIX_CACHE_ENABLED and self.llm.supports_prefix_cache:
+            handle = await prefix_cache.acquire(self.llm, context.org_id, prefix)
+        if handle is not None:
+            stream = self.llm.stream(prompt, cached_prefix=handle)
+        else:
+            # Uncached, the whole corpus would go out with every request: pack to budget instead
+            inline = context.without_corpus()
+            stream = self.llm.stream(self.build_prefix(inline) + self.build_prompt(inline))
+
+        chunks = []
+        async for text in stream:
+            chunks.append(text)
+            yield text
+        # Only complete, successful answers are cached
+        if use_cache and chunks:
+            response_cache.set(key, tuple(chunks))
@@ -0,0 +1,249 @@
+import asyncio
+import io
+import json
+import time
+import warnings
+import wave
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Tuple
+from .advisors import AIAdvisor
+from .board import board_runs, save_discussion, sse_end, sse_retry
+from .config import settings
+from .context import load_context
+from .llm import get_provider
+from .metrics import metrics
+from .scheduler import Admission
+from .streaming import iterate_in_thread
+from ..db.session import SessionLocal
+from ..models.conversation import Conversation
+
+# audioop is deprecated (and gone in Python 3.13); without it recordings are cut at fixed windows
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+
+class AudioTooLargeError(Exception):
+    pass
+
+
+@dataclass
+class AudioSegment:
+    index: int
+    data: bytes
+    mime_type: str
+
+
+async def receive_audio(chunks: AsyncIterator[bytes], max_bytes: int) -> SpooledTemporaryFile:
+    """Collect an uploaded recording in memory, spilling to disk only past ``AUDIO_SPOOL_MAX_BYTES``"""
+    spool = SpooledTemporaryFile(max_size=settings.AUDIO_SPOOL_MAX_BYTES)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise AudioTooLargeError(f"Audio is larger than {max_bytes} bytes")
+            if size > settings.AUDIO_SPOOL_MAX_BYTES:
+                # Spilled to disk: keep file writes off the event loop
+                await asyncio.to_thread(spool.write, chunk)
+            else:
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _wav_bytes(params: tuple, frames: List[bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setparams(params)
+        writer.writeframes(b"".join(frames))
+    return buffer.getvalue()
+
+
+def split_wav(source: BinaryIO) -> Iterator[AudioSegment]:
+    """Cut a WAV recording into segments, preferably at silences.
+
+    Frames are read one silence window at a time. A segment ends at the first
+    quiet window once it is ``AUDIO_SEGMENT_MIN_SECONDS`` long, and at
+    ``AUDIO_SEGMENT_SECONDS`` regardless. Only the segment being built is held
+    in memory.
+    """
+    with wave.open(source, "rb") as reader:
+        params = reader.getparams()
+        frame_bytes = params.sampwidth * params.nchannels
+        window_frames = max(1, params.framerate * settings.AUDIO_SILENCE_WINDOW_MS // 1000)
+        max_frames = int(params.framerate * settings.AUDIO_SEGMENT_SECONDS)
+        min_frames = int(params.framerate * settings.AUDIO_SEGMENT_MIN_SECONDS)
+        # The threshold is configured on the 16-bit scale
+        threshold = settings.AUDIO_SILENCE_RMS * 2 ** (8 * (params.sampwidth - 2))
+
+        index = 0
+        frames: List[bytes] = []
+        count = 0
+        while True:
+            data = reader.readframes(window_frames)
+            if not data:
+                break
+            frames.append(data)
+            count += len(data) // frame_bytes
+            quiet = audioop is not None and audioop.rms(data, params.sampwidth) < threshold
+            if count >= max_frames or (quiet and count >= min_frames):
+                yield AudioSegment(index, _wav_bytes(params, frames), "audio/wav")
+                index += 1
+                frames = []
+                count = 0
+        if frames:
+            yield AudioSegment(index, _wav_bytes(params, frames), "audio/wav")
+
+
+def split_audio(source: BinaryIO, mime_type: str) -> Iterator[AudioSegment]:
+    # Compressed formats would need a decoder to split, so they are transcribed whole
+    if mime_type in ("audio/wav", "audio/x-wav", "audio/wave"):
+        try:
+            yield from split_wav(source)
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"Not a readable WAV recording ({str(e) or 'truncated'})")
+    else:
+        yield AudioSegment(0, source.read(), mime_type)
+
+
+async def transcribe_segments(
+    segments: AsyncIterator[AudioSegment],
+    concurrency: int
+) -> AsyncIterator[Tuple[int, str]]:
+    """Transcribe segments concurrently, yielding ``(index, text)`` in recording order.
+
+    At most ``concurrency`` segments are in flight, which also bounds how many
+    are held in memory; each transcript is yielded as soon as every segment
+    before it is done.
+    """
+    provider = get_provider()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks: Dict[int, asyncio.Task] = {}
+    next_index = 0
+
+    async def transcribe(segment: AudioSegment) -> str:
+        started = time.monotonic()
+        try:
+            return await provider.transcribe(segment.data, segment.mime_type)
+        finally:
+            semaphore.release()
+            metrics.observe("audio_segment_transcribe_seconds", time.monotonic() - started)
+
+    try:
+        async for segment in segments:
+            await semaphore.acquire()
+            metrics.inc("audio_segments")
+            tasks[segment.index] = asyncio.create_task(transcribe(segment))
+            while next_index in tasks and tasks[next_index].done():
+                yield next_index, tasks.pop(next_index).result()
+                next_index += 1
+        while next_index in tasks:
+            yield next_index, await tasks.pop(next_index)
+            next_index += 1
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+async def transcribe_recording(source: BinaryIO, mime_type: str) -> AsyncIterator[Tuple[int, str]]:
+    """Split ``source`` on a worker thread and transcribe its segments as they are cut.
+
+    Once this generator is closed, nothing reads ``source`` any more.
+    """
+    segments = iterate_in_thread(
+        lambda: split_audio(source, mime_type),
+        maxsize=settings.AUDIO_TRANSCRIBE_CONCURRENCY,
+        wait_on_close=True
+    )
+    transcripts = transcribe_segments(segments, settings.AUDIO_TRANSCRIBE_CONCURRENCY)
+    try:
+        async for index, text in transcripts:
+            yield index, text
+    finally:
+        # Cancels outstanding transcriptions and waits for the splitter thread to stop reading ``source``
+        await transcripts.aclose()
+        await segments.aclose()
+
+
+def join_transcript(parts: List[str]) -> str:
+    return " ".join(part.strip() for part in parts if part and part.strip())
+
+
+def sse_transcript(index: int, text: str) -> str:
+    # No id: transcript events are not part of the resumable advisor stream
+    return f"event: transcript\ndata: {json.dumps({'index': index, 'text': text})}\n\n"
+
+
+def save_topic(conversation_id: int, topic: str):
+    db = SessionLocal()
+    try:
+        db.get(Conversation, conversation_id).topic = topic
+        db.commit()
+    finally:
+        db.close()
+
+
+async def stream_audio_analysis(
+    conversation_id: int,
+    org_id: int,
+    recording: SpooledTemporaryFile,
+    mime_type: str,
+    advisors: Dict[str, AIAdvisor],
+    roles: List[str],
+    admission: Admission,
+    use_cache: bool,
+    max_parallel: int
+) -> AsyncIterator[str]:
+    """SSE for an audio question: the transcript as it arrives, then the board's answer.
+
+    The transcript becomes the conversation topic, and the board run that
+    follows is the same resumable run ``/analyze`` starts.
+    """
+    yield sse_retry()
+    run = None
+    status = "cancelled"
+    started = time.monotonic()
+    transcripts = transcribe_recording(recording, mime_type)
+    try:
+        parts = []
+        async for index, text in transcripts:
+            parts.append(text)
+            yield sse_transcript(index, text)
+        metrics.observe("audio_transcribe_seconds", time.monotonic() - started)
+        transcript = join_transcript(parts)
+        if not transcript:
+            raise ValueError("No speech found in the recording")
+
+        await asyncio.to_thread(save_topic, conversation_id, transcript)
+        context_task = asyncio.create_task(load_context(org_id, transcript))
+        run = board_runs.start(conversation_id, advisors, roles, context_task, admission, use_cache, max_parallel)
+    except Exception as e:
+        status = "failed"
+        print(f"Error transcribing audio for conversation {conversation_id}: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'text': f'Error processing audio: {str(e)}'})}\n\n"
+        yield sse_end(status)
+    finally:
+        # The splitter thread must be done with the recording before it is closed
+        await transcripts.aclose()
+        recording.close()
+        if run is None:
+            admission.close()
+            try:
+                await asyncio.to_thread(save_discussion, conversation_id, complete=True, status=status)
+            except Exception as e:
+                print(f"Could not update conversation {conversation_id}: {str(e)}")
+    if run is None:
+        return
+
+    async for event in run.subscribe():
+        yield event.to_sse()
+    yield sse_end(run.status)
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from .advisors import AIAdvisor
+from .config import settings
+from .context import AdvisorContext
+from .history_index import conversation_indexer
+from .metrics import metrics
+from .response_log import response_log
+from .scheduler import scheduler
+from .streaming import multiplex_advisors
+from ..db.session import SessionLocal
+from ..models.conversation import Conversation
+
+
+@dataclass
+class BatchItem:
+    index: int
+    topic: str
+    conversation_id: int
+
+
+def create_conversations(db: Session, org_id: int, topics: List[str]) -> List[int]:
+    """Insert one queued Conversation per topic in a single statement; ids come back in topic order"""
+    ids = db.scalars(
+        insert(Conversation).returning(Conversation.id, sort_by_parameter_order=True),
+        [
+            {
+                "topic": topic,
+                "organization_id": org_id,
+                "discussion": {"complete": False, "status": "queued"}
+            }
+            for topic in topics
+        ]
+    ).all()
+    db.commit()
+    return list(ids)
+
+
+def write_discussions(discussions: Dict[int, Dict]):
+    """Bulk UPDATE of finished conversations by primary key, one round trip per flush"""
+    if not discussions:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Conversation),
+            [{"id": conversation_id, "discussion": discussion} for conversation_id, discussion in discussions.items()]
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def notify_indexer(discussions: Dict[int, Dict]):
+    """Queue newly completed conversations for summarizing and embedding"""
+    for conversation_id, discussion in discussions.items():
+        if discussion["status"] == "completed":
+            conversation_indexer.notify(conversation_id)
+
+
+def log_result(result: Dict, roles: List[str]):
+    """Append an item's answers to the response log.
+
+    A finished answer is a single done row holding the text, with seq 0 to
+    mark that no chunks precede it; a failed one keeps its partial text as a
+    chunk before the error row.
+    """
+    for index, role in enumerate(roles):
+        event_id = 2 * index + 1
+        if role in result["errors"]:
+            if result["texts"][role]:
+                response_log.append(result["conversation_id"], event_id, role, 0, "chunk", result["texts"][role])
+            response_log.append(result["conversation_id"], event_id + 1, role, 1, "error", result["errors"][role])
+        else:
+            response_log.append(result["conversation_id"], event_id + 1, role, 0, "done", result["responses"][role])
+
+
+async def run_batch(
+    org_id: int,
+    tier: Optional[str],
+    advisors: Dict[str, AIAdvisor],
+    roles: List[str],
+    items: List[BatchItem],
+    contexts: Dict[str, AdvisorContext],
+    use_cache: bool,
+    max_parallel: int,
+    concurrency: int
+) -> AsyncIterator[Dict]:
+    """Answer every item with the same advisor panel, yielding each result as it finishes.
+
+    At most ``concurrency`` items run at once, each taking scheduler slots like
+    an interactive request would. Answers go to the buffered response log and
+    conversation statuses are updated in bulk every ``BATCH_WRITE_SIZE`` items
+    or ``BATCH_WRITE_SECONDS``; items left unfinished when the client goes away
+    are recorded as cancelled.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_item(item: BatchItem) -> Dict:
+        async with semaphore:
+            started = time.monotonic()
+            admission = await scheduler.admit_waiting(org_id, tier, len(roles))
+            try:
+                context = contexts[item.topic]
+                sources = {
+                    role: (lambda role=role: advisors[role].get_analysis(context, use_cache, admission))
+                    for role in roles
+                }
+                texts = {role: "" for role in roles}
+                errors = {}
+                async for frame in multiplex_advisors(sources, max_parallel):
+                    if frame.kind == "chunk":
+                        texts[frame.role] += frame.text
+                    elif frame.kind == "error":
+                        errors[frame.role] = frame.text
+            finally:
+                admission.close()
+            metrics.observe("batch_item_seconds", time.monotonic() - started)
+            return {
+                "type": "item",
+                "index": item.index,
+                "topic": item.topic,
+                "conversation_id": item.conversation_id,
+                "status": "failed" if errors else "completed",
+                "responses": {
+                    role: f"Error: {errors[role]}" if role in errors else texts[role]
+                    for role in roles
+                },
+                "errors": errors,
+                "texts": texts
+            }
+
+    tasks = [asyncio.create_task(run_item(item)) for item in items]
+    finished = set()
+    pending_writes: Dict[int, Dict] = {}
+    last_write = time.monotonic()
+    counts = {"completed": 0, "failed": 0}
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            finished.add(result["conversation_id"])
+            counts[result["status"]] += 1
+            log_result(result, roles)
+            pending_writes[result["conversation_id"]] = {"complete": True, "status": result["status"]}
+            if (
+                len(pending_writes) >= settings.BATCH_WRITE_SIZE
+                or time.monotonic() - last_write >= settings.BATCH_WRITE_SECONDS
+            ):
+                await asyncio.to_thread(write_discussions, dict(pending_writes))
+                notify_indexer(pending_writes)
+                pending_writes.clear()
+                last_write = time.monotonic()
+            yield {key: value for key, value in result.items() if key != "texts"}
+        yield {"type": "summary", "items": len(items), **counts}
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for item in items:
+            if item.conversation_id not in finished:
+                pending_writes[item.conversation_id] = {"complete": True, "status": "cancelled"}
+        try:
+            await response_log.flush()
+            await asyncio.to_thread(write_discussions, pending_writes)
+            notify_indexer(pending_writes)
+        except Exception as e:
+            print(f"Error saving batch results: {str(e)}")
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from .advisors import AIAdvisor
+from .config import settings
+from .context import AdvisorContext
+from .history_index import conversation_indexer
+from .metrics import metrics
+from .response_log import load_response_rows, response_log
+from .scheduler import Admission
+from .singleflight import BroadcastStream
+from .streaming import AdvisorFrame, multiplex_advisors
+from ..db.session import SessionLocal
+from ..models.conversation import Conversation
+
+
+@dataclass(frozen=True)
+class BoardEvent:
+    """An advisor frame numbered within its conversation; the number is the SSE event id"""
+    id: int
+    frame: AdvisorFrame
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.frame.kind}\ndata: {self.frame.to_json()}\n\n"
+
+
+def sse_retry() -> str:
+    return f"retry: {settings.STREAM_RETRY_MS}\n\n"
+
+
+def sse_end(status: str) -> str:
+    # No id: a client reconnecting after the end should not skip past it
+    return f"event: end\ndata: {json.dumps({'status': status})}\n\n"
+
+
+def save_discussion(conversation_id: int, **update):
+    """Merge ``update`` into a conversation's discussion with a short-lived session"""
+    db = SessionLocal()
+    try:
+        conversation = db.get(Conversation, conversation_id)
+        conversation.discussion = {**(conversation.discussion or {}), **update}
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_persisted(conversation_id: int, after: int) -> Tuple[Dict, List[BoardEvent]]:
+    """Discussion metadata plus the logged events after ``after``"""
+    db = SessionLocal()
+    try:
+        conversation = db.get(Conversation, conversation_id)
+        if conversation is None:
+            return {}, []
+        discussion = conversation.discussion or {}
+        rows = load_response_rows(db, conversation_id, after)
+        events = []
+        for row in rows:
+            if row.kind == "done":
+                # Done rows hold the full answer. After chunks the done event carries no text;
+                # an answer logged whole (seq 0, batch answers) goes out in its done event alone.
+                text = row.text if row.seq == 0 else ""
+                events.append(BoardEvent(row.event_id, AdvisorFrame(row.role, row.seq, text, row.kind)))
+            else:
+                events.append(BoardEvent(row.event_id, AdvisorFrame(row.role, row.seq, row.text, row.kind)))
+        if not events and after == 0 and "responses" in discussion:
+            events = _legacy_events(discussion)
+        return discussion, events
+    finally:
+        db.close()
+
+
+def _legacy_events(discussion: Dict) -> List[BoardEvent]:
+    """One chunk per advisor for conversations stored before the response log"""
+    events = []
+    for role, text in (discussion.get("responses") or {}).items():
+        events.append(BoardEvent(len(events) + 1, AdvisorFrame(role, 0, text)))
+        events.append(BoardEvent(len(events) + 1, AdvisorFrame(role, 1, "", kind="done")))
+    return events
+
+
+class BoardRun:
+    """One board generation, decoupled from the HTTP connections watching it.
+
+    Every frame is numbered and kept, so a client that reconnects with the
+    last id it saw gets only the missing events and then follows the live
+    output. When the last viewer leaves, the generation is cancelled after
+    ``STREAM_RESUME_GRACE_SECONDS`` unless someone reattaches; detached runs
+    (background jobs) keep going regardless.
+    """
+
+    def __init__(self, conversation_id: int, roles: List[str], detached: bool = False):
+        self.conversation_id = conversation_id
+        self.roles = roles
+        self.detached = detached
+        self.status = "running"
+        self.task: Optional[asyncio.Task] = None
+        self.broadcast = BroadcastStream()
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def events(self) -> List[BoardEvent]:
+        return self.broadcast.chunks
+
+    @property
+    def done(self) -> bool:
+        return self.broadcast.done
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[BoardEvent]:
+        self.broadcast.subscribers += 1
+        if self._abandon_timer is not None:
+            # Reattached within the grace period
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        try:
+            # Event ids start at 1, so the event after ``after`` sits at index ``after``
+            async for event in self.broadcast.subscribe(start=after):
+                yield event
+        finally:
+            self.broadcast.subscribers -= 1
+            if self.broadcast.subscribers == 0 and not self.done and not self.detached:
+                self._abandon_timer = asyncio.get_running_loop().call_later(
+                    settings.STREAM_RESUME_GRACE_SECONDS, self._cancel_if_abandoned
+                )
+
+    def _cancel_if_abandoned(self):
+        self._abandon_timer = None
+        if self.broadcast.subscribers == 0 and not self.done and self.task is not None:
+            print(f"No client reattached to conversation {self.conversation_id}, cancelling generation")
+            self.task.cancel()
+
+    def _log(self, event: BoardEvent, full_text: str = ""):
+        frame = event.frame
+        # The final row carries the whole answer, so reading a conversation never stitches chunks
+        text = full_text if frame.kind == "done" else frame.text
+        response_log.append(self.conversation_id, event.id, frame.role, frame.seq, frame.kind, text)
+
+    async def run(
+        self,
+        advisors: Dict[str, AIAdvisor],
+        context_task: "asyncio.Future[AdvisorContext]",
+        admission: Admission,
+        use_cache: bool,
+        max_parallel: int
+    ):
+        def advisor_source(role: str):
+            async def stream():
+                # Shielded so one cancelled advisor doesn't cancel retrieval for the others
+                context = await asyncio.shield(context_task)
+                async for chunk in advisors[role].get_analysis(context, use_cache, admission):
+                    yield chunk
+            return stream
+
+        partial_responses = {role: "" for role in self.roles}
+        finished = set()
+        failed = set()
+        try:
+            sources = {role: advisor_source(role) for role in self.roles}
+            async for frame in multiplex_advisors(sources, max_parallel):
+                event = BoardEvent(len(self.events) + 1, frame)
+                self.broadcast.publish(event)
+                self._log(event, partial_responses[frame.role])
+
+                if frame.kind == "chunk":
+                    partial_responses[frame.role] += frame.text
+                else:
+                    if frame.kind == "error":
+                        print(f"Advisor error from {frame.role}: {frame.text}")
+                        failed.add(frame.role)
+                    finished.add(frame.role)
+            # Like a batch item, a run with any failed advisor is failed (and never indexed)
+            self.status = "failed" if failed else "completed"
+
+        except asyncio.CancelledError:
+            # Abandoned by every client; multiplex_advisors cancels the advisors still generating
+            self.status = "cancelled"
+            metrics.inc("advisor_streams_cancelled")
+            raise
+        except Exception as e:
+            self.status = "failed"
+            print(f"Error generating response for conversation {self.conversation_id}: {str(e)}")
+            self.broadcast.publish(
+                BoardEvent(len(self.events) + 1, AdvisorFrame("board", 0, str(e), kind="error"))
+            )
+        finally:
+            context_task.cancel()
+            admission.close()
+            try:
+                # Logged output must be durable before the conversation reads as finished
+                await response_log.flush()
+                # Unfinished advisors keep whatever they had produced, stitched from their chunks
+                summary = {
+                    "complete": True,
+                    "status": self.status,
+                    "partial_roles": [role for role in self.roles if role not in finished],
+                    "failed_roles": [role for role in self.roles if role in failed]
+                }
+                if context_task.done() and not context_task.cancelled() and not context_task.exception():
+                    # Record how much retrieved context each advisor prompt carried
+                    context = context_task.result()
+                    summary["context_tokens"] = {
+                        "history": context.history_tokens,
+                        "documents": context.document_tokens,
+                        "cached_prefix": context.corpus_tokens,
+                        "total": context.packed_tokens
+                    }
+                await asyncio.to_thread(save_discussion, self.conversation_id, **summary)
+                if self.status == "completed":
+                    conversation_indexer.notify(self.conversation_id)
+            except Exception as cleanup_error:
+                print(f"Error during cleanup: {str(cleanup_error)}")
+            finally:
+                self.broadcast.finish()
+
+
+class BoardRuns:
+    """Board generations live in this worker, by conversation id"""
+
+    def __init__(self):
+        self._runs: Dict[int, BoardRun] = {}
+
+    def start(
+        self,
+        conversation_id: int,
+        advisors: Dict[str, AIAdvisor],
+        roles: List[str],
+        context_task: "asyncio.Future[AdvisorContext]",
+        admission: Admission,
+        use_cache: bool,
+        max_parallel: int,
+        detached: bool = False
+    ) -> BoardRun:
+        run = BoardRun(conversation_id, roles, detached)
+        self._runs[conversation_id] = run
+        run.task = asyncio.create_task(run.run(advisors, context_task, admission, use_cache, max_parallel))
+        run.task.add_done_callback(lambda _: self._forget(run))
+        return run
+
+    def get(self, conversation_id: int) -> Optional[BoardRun]:
+        return self._runs.get(conversation_id)
+
+    def _forget(self, run: BoardRun):
+        if self._runs.get(run.conversation_id) is run:
+            del self._runs[run.conversation_id]
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+
+board_runs = BoardRuns()
+
+
+async def stream_live(run: BoardRun, after: int = 0) -> AsyncIterator[str]:
+    """SSE for a run in this worker: missed events first, then the live output"""
+    yield sse_retry()
+    async for event in run.subscribe(after):
+        yield event.to_sse()
+    yield sse_end(run.status)
+
+
+async def stream_persisted(conversation_id: int, after: int = 0) -> AsyncIterator[str]:
+    """SSE replayed from the response log, tailing it while another worker is still generating"""
+    yield sse_retry()
+    last_progress = time.monotonic()
+    while True:
+        discussion, events = await asyncio.to_thread(load_persisted, conversation_id, after)
+        for event in events:
+            yield event.to_sse()
+        if events or discussion.get("status") == "queued":
+            # A queued job is waiting for a worker, not stalled
+            after = events[-1].id if events else after
+            last_progress = time.monotonic()
+        if discussion.get("complete", True):
+            yield sse_end(discussion.get("status", "completed"))
+            return
+        if time.monotonic() - last_progress > settings.STREAM_TAIL_TIMEOUT_SECONDS:
+            # The generating worker has likely gone away without finishing
+            yield sse_end("stalled")
+            return
+        await asyncio.sleep(settings.STREAM_TAIL_POLL_SECONDS)
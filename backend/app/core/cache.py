@@ -0,0 +1,79 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from .config import settings
+from .metrics import metrics
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after a fixed TTL"""
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                metrics.inc(f"{self.name}_expired")
+                entry = None
+            if entry is None:
+                metrics.inc(f"{self.name}_misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.inc(f"{self.name}_hits")
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.inc(f"{self.name}_evictions")
+            metrics.set_gauge(f"{self.name}_entries", len(self._entries))
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            metrics.set_gauge(f"{self.name}_entries", len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            metrics.set_gauge(f"{self.name}_entries", 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_topic(topic: str) -> str:
+    """Fold case, whitespace and trailing punctuation so trivially different asks share a key"""
+    return _WHITESPACE_RE.sub(" ", topic).strip().rstrip("?!. ").lower()
+
+
+def fingerprint(*parts: str) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# Complete advisor answers, stored as the original chunk sequence
+response_cache = TTLCache(
+    "response_cache",
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS
+)
@@ -1,5 +1,5 @@
 from pydantic import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "AI Advisory Board"
@@ -20,6 +20,142 @@ class Settings(BaseSettings):
     # Google API
     GOOGLE_API_KEY: str = ""
 
+    # LLM backend: "gemini" or "stub" (local stand-in for load tests)
+    LLM_PROVIDER: str = "gemini"
+    LLM_MODEL: str = "gemini-1.5-flash"
+    LLM_CACHE_MODEL: str = "models/gemini-1.5-flash-001"  # Context caching needs a pinned version
+    LLM_PREFIX_CACHE_MIN_TOKENS: int = 32768  # Gemini's minimum cacheable context
+    LLM_WARMUP_ON_STARTUP: bool = True  # Build the provider in the background at startup
+    LLM_RECORD_FILE: Optional[str] = None  # Append prompt/response pairs as JSONL
+    LLM_STREAM_THREADS: int = 32  # Worker threads driving blocking SDK streams
+    LLM_STREAM_QUEUE_SIZE: int = 16  # Buffered chunks per stream before backpressure
+    LLM_STUB_TTFT_MS: float = 300.0
+    LLM_STUB_TOKENS_PER_SEC: float = 50.0
+    LLM_STUB_TOKENS_PER_CHUNK: int = 4
+    LLM_STUB_ERROR_RATE: float = 0.0
+    LLM_STUB_PREFILL_MS_PER_1K_TOKENS: float = 20.0  # Simulated prompt processing cost
+    LLM_STUB_RESPONSES_FILE: Optional[str] = None  # JSONL written via LLM_RECORD_FILE
+    LLM_STUB_SEED: Optional[int] = None
+
+    # Advisor board
+    ADVISOR_MAX_PARALLELISM: int = 3  # Advisors generating at once per request
+    ADVISOR_REGISTRY_TTL_SECONDS: float = 300.0  # Bounds staleness across workers
+
+    # Context packing: prompt budget for retrieved history and documents per advisor
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_HISTORY_SHARE: float = 0.25  # Max fraction of the budget spent on history
+    CONTEXT_PASSAGE_TOKENS: int = 200
+    CONTEXT_HISTORY_SUMMARY_TOKENS: int = 120
+    CONTEXT_DOCUMENT_CANDIDATES: int = 20
+    CONTEXT_HISTORY_CANDIDATES: int = 10
+    CONTEXT_HISTORY_RECENT: int = 3  # Latest conversations always considered, indexed or not
+
+    # Semantic document retrieval: chunk embeddings searched in-process
+    EMBEDDING_PROVIDER: str = "hashing"  # "hashing" (deterministic, offline) or "sentence-transformers"
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"  # For sentence-transformers
+    EMBEDDING_DIM: int = 512  # For hashing
+    EMBEDDING_BATCH_SIZE: int = 64  # Passages per model call, across documents
+    EMBEDDING_WORKERS: int = 0  # Processes running the model (e.g. one per core); 0 embeds in-process
+    EMBEDDING_REINDEX_DOCUMENTS: int = 50  # Documents per commit when re-indexing an org
+    VECTOR_SEARCH_CANDIDATES: int = 24  # Passages from the vector index per topic
+    VECTOR_INDEX_DIR: str = "data/vector_index"  # Memory-mapped per-org indexes, shared by the workers on a host
+    VECTOR_INDEX_DTYPE: str = "float32"  # "float16" halves disk and page cache for slightly coarser scores
+    VECTOR_INDEX_COMPACT_RATIO: float = 0.2  # Compact an org's index once this share of its rows are deleted
+    VECTOR_INDEX_ANN_MIN_ROWS: int = 50000  # Orgs with this many vectors also get an IVF index; 0 disables
+    VECTOR_INDEX_ANN_PROBES: int = 16  # IVF lists scanned per query; more is slower but finds more
+    VECTOR_INDEX_SYNC_SECONDS: float = 30.0  # How often a worker checks an org's index against the database
+
+    # Hybrid document retrieval: vector and full-text hits merged by reciprocal rank fusion
+    RETRIEVAL_MODE: str = "hybrid"  # "hybrid", "vector" or "lexical"
+    RETRIEVAL_CANDIDATES: int = 24  # Fused passages per topic handed to packing
+    LEXICAL_SEARCH_CANDIDATES: int = 24  # Passages from full-text search per topic
+    RETRIEVAL_RRF_K: int = 60
+    TEXT_SEARCH_CONFIG: str = "simple"  # Must match the generated search_vector columns
+
+    # Background summaries and embeddings of finished conversations, for history retrieval
+    CONVERSATION_INDEX_ENABLED: bool = True  # Run an indexer inside each API process
+    CONVERSATION_SUMMARY_LLM: bool = True  # Summarize with the model; an extractive digest otherwise
+    CONVERSATION_SUMMARY_TOKENS: int = 150
+    CONVERSATION_INDEX_POLL_SECONDS: float = 30.0  # Sweep for conversations nobody indexed
+    CONVERSATION_INDEX_SWEEP_DELAY_SECONDS: float = 120.0  # Fresh ones are left to the worker that ran them
+    CONVERSATION_INDEX_BATCH_SIZE: int = 20
+    CONVERSATION_INDEX_MAX_FAILURES: int = 3  # Sweeps stop retrying a conversation after this many
+
+    # Static per-org, per-role prompt prefix registered with the provider
+    PREFIX_CACHE_ENABLED: bool = True
+    PREFIX_CACHE_CORPUS_TOKENS: int = 60000  # Org document library carried in the prefix
+    PREFIX_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Per-worker scheduling of LLM generations across organizations
+    SCHEDULER_GLOBAL_CONCURRENCY: int = 32
+    SCHEDULER_ORG_CONCURRENCY: int = 8
+    SCHEDULER_MAX_QUEUED: int = 200
+    SCHEDULER_MAX_QUEUED_PER_ORG: int = 24
+    SCHEDULER_TIER_WEIGHTS: Dict[str, float] = {"basic": 1.0, "pro": 2.0, "enterprise": 4.0}
+
+    # Cache of complete advisor answers
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+    SINGLEFLIGHT_ENABLED: bool = True  # Coalesce identical in-flight advisor generations
+
+    # Resumable SSE board streams
+    STREAM_RETRY_MS: int = 3000  # Reconnect delay suggested to SSE clients
+    STREAM_RESUME_GRACE_SECONDS: float = 15.0  # Keep generating this long after the last client leaves
+    RESPONSE_LOG_BATCH_SIZE: int = 200  # Advisor output rows per bulk insert
+    RESPONSE_LOG_FLUSH_SECONDS: float = 0.5  # Longest a streamed chunk waits to be persisted
+    STREAM_TAIL_POLL_SECONDS: float = 1.0  # Resume polling when another worker is generating
+    STREAM_TAIL_TIMEOUT_SECONDS: float = 120.0  # Give up tailing after this long without progress
+    # Advisor chunks are merged into frames of at least this many bytes...
+    STREAM_COALESCE_BYTES: int = 64
+    STREAM_COALESCE_MS: float = 50.0  # ...or whatever arrived within this window; 0 disables coalescing
+
+    # Background analysis jobs (POST /advisors/analyze/jobs)
+    JOBS_WORKER_ENABLED: bool = True  # Run a job worker inside each API process
+    JOBS_WORKER_CONCURRENCY: int = 4  # Jobs run at once per worker
+    JOBS_POLL_SECONDS: float = 1.0
+    JOBS_HEARTBEAT_SECONDS: float = 10.0
+    JOBS_STALE_SECONDS: float = 60.0  # Running jobs without a heartbeat this long are requeued
+    JOBS_MAX_ATTEMPTS: int = 3
+
+    # Batch analysis (POST /advisors/analyze/batch)
+    BATCH_MAX_TOPICS: int = 100
+    BATCH_MAX_CONCURRENCY: int = 8  # Topics answered at once per batch
+    BATCH_WRITE_SIZE: int = 10  # Finished conversations written per bulk update
+    BATCH_WRITE_SECONDS: float = 2.0
+
+    # Audio analysis (POST /advisors/analyze/audio)
+    AUDIO_MAX_BYTES: int = 50 * 1024 * 1024
+    AUDIO_SPOOL_MAX_BYTES: int = 4 * 1024 * 1024  # Uploads stay in memory up to this size
+    AUDIO_SEGMENT_SECONDS: float = 30.0  # Longest segment sent for transcription
+    AUDIO_SEGMENT_MIN_SECONDS: float = 10.0  # Shortest segment cut at a silence
+    AUDIO_SILENCE_WINDOW_MS: int = 300  # Silence must last this long to cut there
+    AUDIO_SILENCE_RMS: int = 500  # RMS level (16-bit scale) below which a window counts as silence
+    AUDIO_TRANSCRIBE_CONCURRENCY: int = 4  # Segments transcribed at once per recording
+
+    # Provider quota: "database" (shared by all workers through leases), "local" (per worker) or "off"
+    RATE_LIMIT_BACKEND: str = "database"
+    RATE_LIMIT_REQUESTS_PER_MINUTE: float = 1000.0
+    RATE_LIMIT_TOKENS_PER_MINUTE: float = 4000000.0
+    RATE_LIMIT_BURST_SECONDS: float = 10.0  # Bucket capacity as seconds of refill
+    RATE_LIMIT_EXPECTED_OUTPUT_TOKENS: int = 800  # Charged up front per generation, settled afterwards
+    RATE_LIMIT_MAX_WAIT_SECONDS: float = 1.0  # Longest single sleep before re-checking
+    RATE_LIMIT_LEASE_FRACTION: float = 0.1  # Share of a shared bucket a worker takes per database round trip
+    RATE_LIMIT_LEASE_SECONDS: float = 5.0  # A worker returns what's left of its lease after this long
+
+    # Retries, hedging and circuit breaking around advisor generations
+    RESILIENCE_MAX_ATTEMPTS: int = 3
+    RESILIENCE_BACKOFF_BASE_SECONDS: float = 0.5
+    RESILIENCE_BACKOFF_MAX_SECONDS: float = 8.0
+    RESILIENCE_HEDGE_ENABLED: bool = True
+    RESILIENCE_HEDGE_PERCENTILE: float = 95.0  # Hedge when TTFT passes this percentile
+    RESILIENCE_HEDGE_MIN_SAMPLES: int = 20
+    RESILIENCE_HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    RESILIENCE_BREAKER_FAILURES: int = 5  # Consecutive failures that open the circuit
+    RESILIENCE_BREAKER_RESET_SECONDS: float = 30.0
+    # Per-role overrides, e.g. {"legal": {"max_attempts": 5, "hedge_enabled": false}}
+    RESILIENCE_ROLE_POLICIES: Dict[str, Dict[str, float]] = {}
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,262 @@
+import asyncio
+from dataclasses import dataclass, replace
+from functools import cached_property
+from typing import Dict, List, Sequence
+from sqlalchemy.orm import Session
+from .cache import fingerprint, normalize_topic
+from .history_index import conversation_index
+from .config import settings
+from .llm import get_provider
+from .metrics import metrics
+from .packing import pack_history, pack_passages, select_document_passages
+from .prefix_cache import OrgCorpus, prefix_cache
+from .response_log import assemble_discussions
+from .retrieval import hybrid_retriever, lexical_documents
+from ..db.session import SessionLocal
+from ..models.conversation import Conversation
+from ..models.document import Document
+
+
+@dataclass(frozen=True)
+class AdvisorContext:
+    """Retrieved and pre-formatted context shared by every advisor of one request"""
+    org_id: int
+    topic: str
+    history: str
+    documents: str
+    history_tokens: int = 0
+    document_tokens: int = 0
+    # Org document library carried by the cached prompt prefix, if any
+    corpus: str = ""
+    corpus_tokens: int = 0
+    corpus_fingerprint: str = ""
+    # Documents packed without counting on the corpus, for when the prefix isn't cached
+    uncached_documents: str = ""
+    uncached_document_tokens: int = 0
+
+    @property
+    def packed_tokens(self) -> int:
+        return self.history_tokens + self.document_tokens
+
+    def without_corpus(self) -> "AdvisorContext":
+        """The same context with documents packed to budget instead of the whole corpus.
+
+        Used when the provider couldn't cache the prefix, so the library isn't
+        resent in full with every request.
+        """
+        if not self.corpus:
+            return self
+        return replace(
+            self,
+            documents=self.uncached_documents,
+            document_tokens=self.uncached_document_tokens,
+            corpus="",
+            corpus_tokens=0
+        )
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Identifies the retrieved documents, so cached answers go stale when they change.
+
+        History is left out on purpose: every new conversation (including the
+        one being answered) changes it, so no answer would ever be reused.
+        """
+        return fingerprint(self.corpus_fingerprint, self.documents)
+
+
+class ConversationMemory:
+    def get_relevant_history(self, db: Session, org_id: int, topic: str, limit: int = 5) -> List[Conversation]:
+        """Past conversations most similar to ``topic``, plus the latest few"""
+        return self.get_relevant_history_batch(db, org_id, [topic], limit)[0]
+
+    def get_relevant_history_batch(
+        self, db: Session, org_id: int, topics: Sequence[str], limit: int = 5
+    ) -> List[List[Conversation]]:
+        """Candidates for several topics at once, in the order of ``topics``.
+
+        Similar conversations come from the org's conversation index; the most
+        recent ones are always added since they may not be indexed yet.
+        """
+        recent = (
+            db.query(Conversation)
+            .filter(Conversation.organization_id == org_id)
+            .order_by(Conversation.timestamp.desc())
+            .limit(settings.CONTEXT_HISTORY_RECENT)
+            .all()
+        )
+        try:
+            hits = conversation_index.search(db, org_id, topics, limit)
+        except Exception as e:
+            print(f"History search failed for organization {org_id}, using recent conversations: {str(e)}")
+            db.rollback()
+            hits = [[] for _ in topics]
+
+        ids = {conversation_id for topic_hits in hits for _, (conversation_id,) in topic_hits}
+        found = {}
+        if ids:
+            found = {c.id: c for c in db.query(Conversation).filter(Conversation.id.in_(ids)).all()}
+        candidates = []
+        for topic_hits in hits:
+            similar = [found[conversation_id] for _, (conversation_id,) in topic_hits if conversation_id in found]
+            similar_ids = {conversation.id for conversation in similar}
+            candidates.append(similar + [c for c in recent if c.id not in similar_ids])
+        return candidates
+
+class DocumentManager:
+    def get_relevant_documents(self, db: Session, org_id: int, topic: str, limit: int = 3) -> List[Document]:
+        """Documents matching ``topic`` in full text, else the newest; the fallback when passage search finds nothing"""
+        matches = lexical_documents(db, org_id, topic, limit) if topic else []
+        return matches or (
+            db.query(Document)
+            .filter(Document.organization_id == org_id)
+            .order_by(Document.timestamp.desc())
+            .limit(limit)
+            .all()
+        )
+
+    def get_relevant_passages(self, db: Session, org_id: int, topic: str, limit: int = 24) -> List[str]:
+        """Passages most relevant to ``topic``, best first"""
+        return self.get_relevant_passages_batch(db, org_id, [topic], limit)[0]
+
+    def get_relevant_passages_batch(
+        self, db: Session, org_id: int, topics: Sequence[str], limit: int = 24
+    ) -> List[List[str]]:
+        """Passages for several topics at once, in the order of ``topics``.
+
+        Topics without any indexed passage (documents uploaded before indexing,
+        or not yet re-embedded after a model change) fall back to whole documents.
+        """
+        try:
+            hits = hybrid_retriever.search(db, org_id, topics, limit)
+        except Exception as e:
+            print(f"Passage search failed for organization {org_id}, using whole documents: {str(e)}")
+            db.rollback()
+            hits = [[] for _ in topics]
+        passages = []
+        for topic, topic_hits in zip(topics, hits):
+            if topic_hits:
+                passages.append([hit.text for hit in topic_hits])
+                continue
+            documents = self.get_relevant_documents(db, org_id, topic, settings.CONTEXT_DOCUMENT_CANDIDATES)
+            if documents:
+                metrics.inc("passage_search_fallbacks")
+            passages.append(select_document_passages(
+                documents, topic, settings.CONTEXT_TOKEN_BUDGET, settings.CONTEXT_PASSAGE_TOKENS
+            ))
+        return passages
+
+
+memory = ConversationMemory()
+document_manager = DocumentManager()
+
+
+def build_context(db: Session, org_id: int, topic: str) -> AdvisorContext:
+    """Run retrieval and pack the results into the per-advisor token budget, once per request"""
+    past_conversations = memory.get_relevant_history(
+        db, org_id, topic, limit=settings.CONTEXT_HISTORY_CANDIDATES
+    )
+    relevant_passages = document_manager.get_relevant_passages(
+        db, org_id, topic, limit=settings.RETRIEVAL_CANDIDATES
+    )
+    # Passages already in the org's cached prefix are not repeated per topic
+    corpus = prefix_cache.corpus(db, get_provider(), org_id)
+    discussions = assemble_discussions(db, past_conversations)
+    return _pack_context(org_id, topic, past_conversations, discussions, relevant_passages, corpus)
+
+
+def build_contexts(db: Session, org_id: int, topics: Sequence[str]) -> Dict[str, AdvisorContext]:
+    """``build_context`` for many topics, sharing retrieval work between them.
+
+    Candidates are fetched in one batch for the distinct topics, the org corpus
+    is loaded once, and topics that normalize to the same text share a context.
+    """
+    distinct: Dict[str, str] = {}
+    for topic in topics:
+        distinct.setdefault(normalize_topic(topic), topic)
+    unique_topics = list(distinct.values())
+
+    histories = memory.get_relevant_history_batch(
+        db, org_id, unique_topics, limit=settings.CONTEXT_HISTORY_CANDIDATES
+    )
+    passage_sets = document_manager.get_relevant_passages_batch(
+        db, org_id, unique_topics, limit=settings.RETRIEVAL_CANDIDATES
+    )
+    corpus = prefix_cache.corpus(db, get_provider(), org_id)
+    # One response log read covers every candidate conversation
+    discussions = assemble_discussions(
+        db, list({conversation.id: conversation for history in histories for conversation in history}.values())
+    )
+
+    packed = {
+        normalize_topic(topic): _pack_context(org_id, topic, history, discussions, passages, corpus)
+        for topic, history, passages in zip(unique_topics, histories, passage_sets)
+    }
+    metrics.inc("context_batch_shared", len(topics) - len(unique_topics))
+    return {topic: packed[normalize_topic(topic)] for topic in topics}
+
+
+def _pack_context(
+    org_id: int,
+    topic: str,
+    past_conversations: Sequence[Conversation],
+    discussions: Dict[int, Dict],
+    relevant_passages: Sequence[str],
+    corpus: OrgCorpus
+) -> AdvisorContext:
+    budget = settings.CONTEXT_TOKEN_BUDGET
+    history, history_tokens = pack_history(
+        past_conversations,
+        topic,
+        int(budget * settings.CONTEXT_HISTORY_SHARE),
+        settings.CONTEXT_HISTORY_SUMMARY_TOKENS,
+        discussions
+    )
+    # Whatever history leaves unused goes to documents
+    documents, document_tokens = pack_passages(
+        relevant_passages,
+        budget - history_tokens,
+        exclude=corpus.passages
+    )
+    uncached_documents, uncached_document_tokens = documents, document_tokens
+    if corpus.passages:
+        uncached_documents, uncached_document_tokens = pack_passages(relevant_passages, budget - history_tokens)
+
+    metrics.observe("context_packed_tokens", history_tokens + document_tokens)
+    return AdvisorContext(
+        org_id=org_id,
+        topic=topic,
+        history=history,
+        documents=documents,
+        history_tokens=history_tokens,
+        document_tokens=document_tokens,
+        corpus=corpus.text,
+        corpus_tokens=corpus.tokens,
+        corpus_fingerprint=corpus.fingerprint,
+        uncached_documents=uncached_documents,
+        uncached_document_tokens=uncached_document_tokens
+    )
+
+
+async def load_context(org_id: int, topic: str) -> AdvisorContext:
+    """Build the shared context off the event loop, with its own DB session"""
+
+    def run() -> AdvisorContext:
+        db = SessionLocal()
+        try:
+            return build_context(db, org_id, topic)
+        finally:
+            db.close()
+
+    return await asyncio.to_thread(run)
+
+
+async def load_contexts(org_id: int, topics: Sequence[str]) -> Dict[str, AdvisorContext]:
+    """``build_contexts`` off the event loop, with its own DB session"""
+    def run() -> Dict[str, AdvisorContext]:
+        db = SessionLocal()
+        try:
+            return build_contexts(db, org_id, topics)
+        finally:
+            db.close()
+
+    return await asyncio.to_thread(run)
@@ -0,0 +1,128 @@
+import hashlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from .config import settings
+from .embeddings import get_embedder
+from .metrics import metrics
+from ..models.embedding_cache import EmbeddingCache
+
+_LOOKUP_BATCH = 500  # Hashes per IN (...) query
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _warm_worker():
+    # Runs once in each pool process so the first batch doesn't pay for loading the model
+    get_embedder()
+
+
+def _embed_in_worker(texts: List[str]) -> np.ndarray:
+    return get_embedder().embed(texts)
+
+
+class EmbeddingService:
+    """Embeds passages in fixed-size batches, through a cache keyed by content hash.
+
+    Callers hand over every passage they have (all documents of an upload or
+    a whole org), so batches span documents and the model always sees full
+    batches. A passage whose text was embedded before by the same model, in
+    any document of any org, is read from ``embedding_cache`` instead. With
+    ``EMBEDDING_WORKERS`` set, batches run in a pool of processes that each
+    load the model once, so CPU-bound models use every core.
+    """
+
+    def __init__(self, batch_size: int, workers: int):
+        self.batch_size = max(1, batch_size)
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                # Spawned, not forked: forking a process with running threads (and torch) is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def _embed_batches(self, texts: List[str]) -> np.ndarray:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        pool = self._get_pool()
+        if pool is None:
+            embedder = get_embedder()
+            return np.vstack([embedder.embed(batch) for batch in batches])
+        return np.vstack(list(pool.map(_embed_in_worker, batches)))
+
+    def _lookup(self, db: Session, model: str, hashes: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        for start in range(0, len(hashes), _LOOKUP_BATCH):
+            rows = (
+                db.query(EmbeddingCache.content_hash, EmbeddingCache.embedding)
+                .filter(
+                    EmbeddingCache.embedding_model == model,
+                    EmbeddingCache.content_hash.in_(hashes[start:start + _LOOKUP_BATCH])
+                )
+                .all()
+            )
+            found.update((row.content_hash, row.embedding) for row in rows)
+        return found
+
+    def _store(self, db: Session, model: str, embeddings: Dict[str, bytes]):
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        rows = [
+            {"embedding_model": model, "content_hash": digest, "embedding": embedding}
+            for digest, embedding in embeddings.items()
+        ]
+        for start in range(0, len(rows), _LOOKUP_BATCH):
+            # Another worker may have cached the same passage meanwhile
+            db.execute(
+                dialect.insert(EmbeddingCache)
+                .values(rows[start:start + _LOOKUP_BATCH])
+                .on_conflict_do_nothing()
+            )
+
+    def embed(self, db: Session, texts: Sequence[str]) -> np.ndarray:
+        """Vectors for ``texts``, one row each, in order; new cache rows are committed with the caller's transaction"""
+        embedder = get_embedder()
+        hashes = [content_hash(text) for text in texts]
+        unique = dict(zip(hashes, texts))
+        embeddings = self._lookup(db, embedder.name, list(unique))
+        missing = [digest for digest in unique if digest not in embeddings]
+        if missing:
+            started = time.monotonic()
+            vectors = self._embed_batches([unique[digest] for digest in missing])
+            elapsed = time.monotonic() - started
+            if elapsed > 0:
+                metrics.observe("embedding_chunks_per_second", len(missing) / elapsed)
+            fresh = {digest: vector.tobytes() for digest, vector in zip(missing, vectors)}
+            self._store(db, embedder.name, fresh)
+            embeddings.update(fresh)
+        metrics.inc("embedding_cache_hits", len(texts) - len(missing))
+        metrics.inc("embedding_cache_misses", len(missing))
+
+        matrix = np.zeros((len(texts), embedder.dim), dtype=np.float32)
+        for row, digest in enumerate(hashes):
+            matrix[row] = np.frombuffer(embeddings[digest], dtype=np.float32)
+        return matrix
+
+
+embedding_service = EmbeddingService(settings.EMBEDDING_BATCH_SIZE, settings.EMBEDDING_WORKERS)
@@ -0,0 +1,87 @@
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Optional, Sequence
+import numpy as np
+from .config import settings
+from .packing import terms
+
+
+class Embedder:
+    """Turns texts into L2-normalized float32 vectors, one row per text"""
+
+    name: str = "base"
+    dim: int = 0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+@lru_cache(maxsize=65536)
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic offline embedder: signed feature hashing of terms and term bigrams.
+
+    No model download or network; similar wording gives similar vectors, which
+    is enough for tests, local development and as a fallback.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = terms(text)
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                hashed = _feature_hash(feature)
+                vectors[row, hashed % self.dim] += 1.0 if hashed >> 63 else -1.0
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Local sentence-transformers model; runs offline once the model is on disk"""
+
+    def __init__(self, model_name: str):
+        # Imported lazily; sentence-transformers pulls in torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def build_embedder(name: str) -> Embedder:
+    if name == "hashing":
+        return HashingEmbedder(settings.EMBEDDING_DIM)
+    if name == "sentence-transformers":
+        return SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+_embedder: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    """Return the process-wide embedder selected by ``EMBEDDING_PROVIDER``, built on first use"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = build_embedder(settings.EMBEDDING_PROVIDER)
+    return _embedder
@@ -0,0 +1,248 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import exists, or_
+from sqlalchemy.exc import IntegrityError
+from .config import settings
+from .embeddings import get_embedder
+from .llm import get_provider
+from .metrics import metrics
+from .packing import summarize_conversation, truncate_to_tokens
+from .response_log import assemble_discussions
+from .scheduler import scheduler
+from .vector_index import IndexChanges, VectorIndex
+from ..db.session import SessionLocal
+from ..models.conversation import Conversation
+from ..models.conversation_embedding import ConversationEmbedding
+from ..models.organization import Organization
+
+
+class ConversationIndex(VectorIndex):
+    name = "conversations"
+    model = ConversationEmbedding
+    payload = (ConversationEmbedding.conversation_id,)
+
+
+conversation_index = ConversationIndex()
+
+
+def _load_for_index(conversation_id: int) -> Optional[Tuple[Conversation, Dict, Optional[str]]]:
+    """The conversation, its assembled discussion and its org's tier, if it finished successfully and isn't indexed yet"""
+    db = SessionLocal()
+    try:
+        conversation = db.get(Conversation, conversation_id)
+        if conversation is None:
+            return None
+        if (conversation.discussion or {}).get("index_failures", 0) >= settings.CONVERSATION_INDEX_MAX_FAILURES:
+            return None
+        indexed = db.query(
+            exists().where(
+                ConversationEmbedding.conversation_id == conversation_id,
+                ConversationEmbedding.embedding_model == get_embedder().name
+            )
+        ).scalar()
+        if indexed:
+            return None
+        discussion = assemble_discussions(db, [conversation])[conversation.id]
+        if not discussion.get("complete", True) or discussion.get("status", "completed") != "completed":
+            return None
+        organization = db.get(Organization, conversation.organization_id)
+        db.expunge(conversation)
+        return conversation, discussion, organization.subscription_tier if organization else None
+    finally:
+        db.close()
+
+
+def _record_failure(conversation_id: int):
+    """Count a failed indexing attempt; sweeps give up after ``CONVERSATION_INDEX_MAX_FAILURES``"""
+    db = SessionLocal()
+    try:
+        conversation = db.get(Conversation, conversation_id)
+        if conversation is None:
+            return
+        discussion = conversation.discussion or {}
+        conversation.discussion = {**discussion, "index_failures": discussion.get("index_failures", 0) + 1}
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error recording index failure for conversation {conversation_id}: {str(e)}")
+    finally:
+        db.close()
+
+
+def _synthesis_prompt(topic: str, discussion: Dict) -> str:
+    per_advisor = max(50, 1500 // max(1, len(discussion["responses"])))
+    answers = "\n\n".join(
+        f"{role}: {truncate_to_tokens(' '.join(str(answer).split()), per_advisor)}"
+        for role, answer in discussion["responses"].items()
+    )
+    return (
+        f"Summarize this advisory board discussion in at most "
+        f"{settings.CONVERSATION_SUMMARY_TOKENS * 3 // 4} words for future reference. "
+        "State the question, each advisor's key recommendation and any disagreement. "
+        "Reply with the summary only.\n\n"
+        f"Question: {topic}\n\n{answers}"
+    )
+
+
+async def summarize(conversation: Conversation, discussion: Dict, tier: Optional[str]) -> str:
+    """The discussion's synthesis: written by the model, or an extractive digest as the fallback"""
+    if discussion.get("synthesis"):
+        return discussion["synthesis"]
+    if settings.CONVERSATION_SUMMARY_LLM and discussion.get("responses"):
+        try:
+            # Background work shares the org's scheduler slots like jobs and batches do
+            admission = await scheduler.admit_waiting(conversation.organization_id, tier, 1)
+            try:
+                async with admission.slot():
+                    summary = await get_provider().generate(_synthesis_prompt(conversation.topic or "", discussion))
+            finally:
+                admission.close()
+            if summary and summary.strip():
+                return truncate_to_tokens(" ".join(summary.split()), settings.CONVERSATION_SUMMARY_TOKENS)
+        except Exception as e:
+            print(f"Could not summarize conversation {conversation.id}, using an extract: {str(e)}")
+            metrics.inc("conversation_summary_errors")
+    return summarize_conversation(conversation, settings.CONVERSATION_SUMMARY_TOKENS, discussion)
+
+
+def _store(conversation: Conversation, synthesis: str, embedding: bytes, model: str):
+    db = SessionLocal()
+    try:
+        stored = db.get(Conversation, conversation.id)
+        stored.discussion = {**(stored.discussion or {}), "synthesis": synthesis}
+        row = ConversationEmbedding(
+            conversation_id=conversation.id,
+            organization_id=conversation.organization_id,
+            embedding_model=model,
+            embedding=embedding
+        )
+        db.add(row)
+        db.commit()
+        conversation_index.apply(IndexChanges(added=[(row.organization_id, row.id, embedding)]))
+    except IntegrityError:
+        # Another worker indexed it first
+        db.rollback()
+    finally:
+        db.close()
+
+
+async def index_conversation(conversation_id: int) -> bool:
+    """Summarize and embed one finished conversation; returns whether it was indexed"""
+    loaded = await asyncio.to_thread(_load_for_index, conversation_id)
+    if loaded is None:
+        return False
+    conversation, discussion, tier = loaded
+    started = time.monotonic()
+    synthesis = await summarize(conversation, discussion, tier)
+    embedder = get_embedder()
+    vector = await asyncio.to_thread(embedder.embed, [f"{conversation.topic or ''}\n{synthesis}"])
+    await asyncio.to_thread(_store, conversation, synthesis, vector[0].tobytes(), embedder.name)
+    metrics.inc("conversations_indexed")
+    metrics.observe("conversation_index_seconds", time.monotonic() - started)
+    return True
+
+
+def find_unindexed(limit: int, older_than_seconds: float) -> List[int]:
+    """Finished conversations without an embedding for the current model, newest first.
+
+    Conversations that failed ``CONVERSATION_INDEX_MAX_FAILURES`` times are
+    skipped so they can't crowd out the rest of the backlog.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)
+    status = Conversation.discussion["status"].as_string()
+    failures = Conversation.discussion["index_failures"].as_integer()
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Conversation.id)
+            .filter(
+                Conversation.timestamp < cutoff,
+                Conversation.discussion["complete"].as_boolean().is_(True),
+                # Conversations stored before statuses existed have none
+                or_(status == "completed", status.is_(None)),
+                or_(failures.is_(None), failures < settings.CONVERSATION_INDEX_MAX_FAILURES),
+                ~exists().where(
+                    ConversationEmbedding.conversation_id == Conversation.id,
+                    ConversationEmbedding.embedding_model == get_embedder().name
+                )
+            )
+            .order_by(Conversation.id.desc())
+            .limit(limit)
+            .all()
+        )
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+class ConversationIndexer:
+    """Summarizes and embeds finished conversations in the background, off the request path.
+
+    Board runs ``notify`` it as soon as a conversation completes. A periodic
+    sweep also picks up conversations that finished in a process without an
+    indexer, or before a restart, or before the embedding model changed. The
+    sweep leaves conversations younger than ``CONVERSATION_INDEX_SWEEP_DELAY_SECONDS``
+    to the worker that ran them.
+    """
+
+    def __init__(self, poll_seconds: float, batch_size: int):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._pending: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def notify(self, conversation_id: int):
+        self._pending.add(conversation_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        last_sweep = 0.0
+        while True:
+            conversation_ids = list(self._pending)
+            self._pending.clear()
+            if time.monotonic() - last_sweep >= self.poll_seconds:
+                last_sweep = time.monotonic()
+                try:
+                    conversation_ids += await asyncio.to_thread(
+                        find_unindexed, self.batch_size, settings.CONVERSATION_INDEX_SWEEP_DELAY_SECONDS
+                    )
+                except Exception as e:
+                    print(f"Error looking for unindexed conversations: {str(e)}")
+
+            for conversation_id in dict.fromkeys(conversation_ids):
+                try:
+                    await index_conversation(conversation_id)
+                except Exception as e:
+                    print(f"Error indexing conversation {conversation_id}: {str(e)}")
+                    metrics.inc("conversation_index_errors")
+                    await asyncio.to_thread(_record_failure, conversation_id)
+            metrics.set_gauge("conversation_index_pending", len(self._pending))
+            if self._pending:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+conversation_indexer = ConversationIndexer(
+    settings.CONVERSATION_INDEX_POLL_SECONDS, settings.CONVERSATION_INDEX_BATCH_SIZE
+)
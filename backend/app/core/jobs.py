@@ -0,0 +1,297 @@
+import asyncio
+import os
+import socket
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from .board import board_runs, save_discussion
+from .config import settings
+from .context import load_context
+from .metrics import metrics
+from .registry import advisor_registry
+from .response_log import reset_responses
+from .scheduler import clamp_concurrency, scheduler
+from ..db.session import SessionLocal
+from ..models.analysis_job import AnalysisJob
+from ..models.organization import Organization
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class ClaimedJob:
+    id: int
+    conversation_id: int
+    organization_id: int
+    subscription_tier: Optional[str]
+    request: Dict
+
+
+def claim_job(worker_id: str) -> Optional[ClaimedJob]:
+    """Take the oldest queued job; SKIP LOCKED lets workers claim concurrently without blocking"""
+    db = SessionLocal()
+    try:
+        job = (
+            db.query(AnalysisJob)
+            .filter(AnalysisJob.status == "queued")
+            .order_by(AnalysisJob.id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            return None
+        now = _utcnow()
+        job.status = "running"
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        organization = db.get(Organization, job.organization_id)
+        claimed = ClaimedJob(
+            job.id,
+            job.conversation_id,
+            job.organization_id,
+            organization.subscription_tier if organization else None,
+            dict(job.request)
+        )
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def finish_job(job_id: int, status: str, error: Optional[str] = None):
+    db = SessionLocal()
+    try:
+        job = db.get(AnalysisJob, job_id)
+        job.status = status
+        job.error = error
+        job.finished_at = _utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def requeue_job(job_id: int):
+    """Hand a job back to the queue, e.g. when its worker shuts down mid-run"""
+    db = SessionLocal()
+    try:
+        job = db.get(AnalysisJob, job_id)
+        conversation_id = job.conversation_id
+        job.status = "queued"
+        job.worker_id = None
+        # An orderly shutdown shouldn't count against the job's attempts
+        job.attempts = max(0, job.attempts - 1)
+        db.commit()
+    finally:
+        db.close()
+    save_discussion_safely(conversation_id, status="queued", complete=False)
+
+
+def save_discussion_safely(conversation_id: int, **update):
+    try:
+        save_discussion(conversation_id, **update)
+    except Exception as e:
+        print(f"Could not update conversation {conversation_id}: {str(e)}")
+
+
+def heartbeat(job_ids: List[int]):
+    if not job_ids:
+        return
+    db = SessionLocal()
+    try:
+        (
+            db.query(AnalysisJob)
+            .filter(AnalysisJob.id.in_(job_ids), AnalysisJob.status == "running")
+            .update({AnalysisJob.heartbeat_at: _utcnow()}, synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def requeue_stale_jobs() -> int:
+    """Requeue running jobs whose worker stopped heartbeating (crash or restart); returns how many"""
+    cutoff = _utcnow() - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        stale = (
+            db.query(AnalysisJob)
+            .filter(AnalysisJob.status == "running", AnalysisJob.heartbeat_at < cutoff)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        requeued = []
+        for job in stale:
+            if job.attempts >= settings.JOBS_MAX_ATTEMPTS:
+                job.status = "failed"
+                job.error = f"Worker {job.worker_id} stopped responding"
+                job.finished_at = _utcnow()
+            else:
+                job.status = "queued"
+                requeued.append(job.conversation_id)
+            job.worker_id = None
+        db.commit()
+    finally:
+        db.close()
+    for conversation_id in requeued:
+        save_discussion_safely(conversation_id, status="queued", complete=False)
+    if stale:
+        print(f"Recovered {len(stale)} stale analysis jobs ({len(requeued)} requeued)")
+        metrics.inc("jobs_recovered", len(stale))
+    return len(stale)
+
+
+class JobWorker:
+    """Pool that runs queued analysis jobs, in the API process or standalone (``python -m app.worker``).
+
+    Jobs live in the ``analysis_jobs`` table, so they survive restarts: a
+    worker claims them with ``SELECT ... FOR UPDATE SKIP LOCKED``, heartbeats
+    while running them, and any worker requeues jobs whose heartbeat went stale.
+    Each job runs as a detached board run, so clients can attach to its live
+    stream through the usual resume endpoint.
+    """
+
+    def __init__(self, concurrency: int, poll_seconds: float):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Dict[int, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Unfinished jobs go back to the queue for the next worker
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def notify(self):
+        """Wake the worker early, e.g. right after a job was enqueued in this process"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        print(f"Job worker {self.worker_id} started with {self.concurrency} slots")
+        await self._recover()
+        last_heartbeat = last_sweep = time.monotonic()
+        while True:
+            if len(self._running) < self.concurrency:
+                try:
+                    job = await asyncio.to_thread(claim_job, self.worker_id)
+                except Exception as e:
+                    print(f"Error claiming analysis job: {str(e)}")
+                    job = None
+                if job is not None:
+                    self._running[job.id] = asyncio.create_task(self._execute(job))
+                    metrics.set_gauge("jobs_running", len(self._running))
+                    continue
+
+            now = time.monotonic()
+            if now - last_heartbeat >= settings.JOBS_HEARTBEAT_SECONDS:
+                last_heartbeat = now
+                try:
+                    await asyncio.to_thread(heartbeat, list(self._running))
+                except Exception as e:
+                    print(f"Error heartbeating analysis jobs: {str(e)}")
+            if now - last_sweep >= settings.JOBS_STALE_SECONDS:
+                last_sweep = now
+                await self._recover()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _recover(self):
+        try:
+            await asyncio.to_thread(requeue_stale_jobs)
+        except Exception as e:
+            print(f"Error recovering stale analysis jobs: {str(e)}")
+
+    async def _execute(self, job: ClaimedJob):
+        status, error = "failed", None
+        started = time.monotonic()
+        run = None
+        try:
+            db = SessionLocal()
+            try:
+                advisors = advisor_registry.get_advisors(db, job.organization_id)
+            finally:
+                db.close()
+            roles = list(job.request["advisor_roles"])
+            invalid_roles = [role for role in roles if role not in advisors]
+            if invalid_roles:
+                error = f"Invalid advisor roles: {', '.join(invalid_roles)}"
+                return
+
+            # Jobs wait for scheduler capacity instead of being rejected like interactive requests
+            admission = await scheduler.admit_waiting(job.organization_id, job.subscription_tier, len(roles))
+
+            context_task = None
+            try:
+                max_parallel = clamp_concurrency(job.request.get("max_parallel"), settings.ADVISOR_MAX_PARALLELISM)
+                context_task = asyncio.create_task(load_context(job.organization_id, job.request["topic"]))
+                # A retried job starts its answer over
+                await asyncio.to_thread(reset_responses, job.conversation_id)
+                await asyncio.to_thread(save_discussion, job.conversation_id, complete=False, status="running")
+                run = board_runs.start(
+                    job.conversation_id,
+                    advisors,
+                    roles,
+                    context_task,
+                    admission,
+                    job.request.get("use_cache", True),
+                    max_parallel,
+                    detached=True
+                )
+            except BaseException:
+                # Until the run owns them, the reservation and the retrieval are released here
+                if context_task is not None:
+                    context_task.cancel()
+                admission.close()
+                raise
+            await run.task
+            status = run.status
+            metrics.observe("job_run_seconds", time.monotonic() - started)
+        except asyncio.CancelledError:
+            status = None
+            if run is not None:
+                # Let the run record its cancellation before the job is reset for the next worker
+                await asyncio.gather(run.task, return_exceptions=True)
+            await asyncio.to_thread(requeue_job, job.id)
+            raise
+        except Exception as e:
+            error = str(e)
+            print(f"Analysis job {job.id} failed: {error}")
+        finally:
+            self._running.pop(job.id, None)
+            metrics.set_gauge("jobs_running", len(self._running))
+            self.notify()
+            if status is not None:
+                metrics.inc("jobs_finished", status=status)
+                try:
+                    await asyncio.to_thread(finish_job, job.id, status, error)
+                    if error:
+                        await asyncio.to_thread(
+                            save_discussion_safely, job.conversation_id, complete=True, status=status, error=error
+                        )
+                except Exception as e:
+                    print(f"Error recording result of analysis job {job.id}: {str(e)}")
+
+
+job_worker = JobWorker(settings.JOBS_WORKER_CONCURRENCY, settings.JOBS_POLL_SECONDS)
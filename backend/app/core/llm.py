@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+from .config import settings
+from .packing import estimate_tokens
+from .streaming import iterate_in_thread
+
+
+class LLMError(Exception):
+    """Raised by a provider when the upstream model call fails"""
+
+
+class LLMProvider:
+    """Interface every model backend implements.
+
+    Advisors only talk to this interface, so the backend can be swapped by
+    config (``LLM_PROVIDER``) without touching the advisor or route code.
+    """
+    name = "base"
+    supports_prefix_cache = False
+    min_prefix_tokens = 0  # Smallest prefix worth caching upstream
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, cached_prefix: Any = None) -> AsyncIterator[str]:
+        """Stream a completion; ``cached_prefix`` is a handle from ``create_prefix_cache``
+        whose content is prepended to ``prompt`` upstream."""
+        raise NotImplementedError
+
+    async def create_prefix_cache(self, prefix: str, ttl_seconds: float) -> Any:
+        """Register a static prompt prefix upstream; None means send it inline instead"""
+        return None
+
+    def drop_prefix_cache(self, handle: Any):
+        pass
+
+    def close(self):
+        """Give back anything held for this process, e.g. a leased share of the quota"""
+
+    async def transcribe(self, audio: bytes, mime_type: str = "audio/wav") -> str:
+        raise NotImplementedError
+
+
+class _GeminiPrefix:
+    def __init__(self, cached_content, model):
+        self.cached_content = cached_content
+        self.model = model
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.model = genai.GenerativeModel(model_name)
+        self.min_prefix_tokens = settings.LLM_PREFIX_CACHE_MIN_TOKENS
+        try:
+            # Context caching only exists in newer SDK releases
+            from google.generativeai import caching
+            self.caching = caching
+        except ImportError:
+            self.caching = None
+        self.supports_prefix_cache = self.caching is not None
+
+    async def create_prefix_cache(self, prefix: str, ttl_seconds: float) -> Any:
+        if self.caching is None or estimate_tokens(prefix) < self.min_prefix_tokens:
+            return None
+        cached_content = await asyncio.to_thread(
+            self.caching.CachedContent.create,
+            model=settings.LLM_CACHE_MODEL,
+            contents=[prefix],
+            ttl=timedelta(seconds=ttl_seconds)
+        )
+        return _GeminiPrefix(
+            cached_content,
+            self.genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+        )
+
+    def drop_prefix_cache(self, handle: Any):
+        handle.cached_content.delete()
+
+    async def generate(self, prompt: str) -> str:
+        response = await asyncio.to_thread(self.model.generate_content, prompt)
+        return response.text
+
+    async def stream(self, prompt: str, cached_prefix: Any = None) -> AsyncIterator[str]:
+        model = cached_prefix.model if cached_prefix is not None else self.model
+
+        def stream_chunks():
+            # Runs on a worker thread; the SDK stream is fully synchronous
+            for chunk in model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+
+        async for text in iterate_in_thread(stream_chunks, settings.LLM_STREAM_QUEUE_SIZE):
+            yield text
+
+    async def transcribe(self, audio: bytes, mime_type: str = "audio/wav") -> str:
+        response = await asyncio.to_thread(
+            self.model.generate_content,
+            [
+                "Transcribe this audio recording verbatim.",
+                {"mime_type": mime_type, "data": audio}
+            ]
+        )
+        return response.text
+
+
+_CANNED_RESPONSE = (
+    "From my perspective the proposal has merit but carries risks that the board "
+    "should weigh carefully. First, we need clarity on the expected outcomes and "
+    "how they will be measured. Second, the timeline should leave room for review "
+    "of contractual, financial and technical dependencies. Third, we should "
+    "identify the stakeholders affected and plan communication accordingly. "
+    "I recommend proceeding in phases with explicit checkpoints, so that the "
+    "organization can adjust course as new information becomes available."
+)
+_TOKEN_RE = re.compile(r"\S+\s*")
+
+
+class StubProvider(LLMProvider):
+    """Local stand-in backend for load tests and offline development.
+
+    Streams canned text, or responses recorded to a JSONL file (one
+    ``{"prompt": ..., "response": ...}`` object per line), with a configurable
+    time-to-first-token, tokens/sec and error rate. No network calls are made,
+    so benchmarks measure our own overhead plus the simulated model latency.
+
+    Prompt processing is simulated as extra time-to-first-token per 1k prompt
+    tokens; prefixes registered through ``create_prefix_cache`` are kept
+    locally and don't count, mimicking provider-side context caching.
+    """
+    name = "stub"
+    supports_prefix_cache = True
+
+    def __init__(
+        self,
+        ttft_ms: float = 300.0,
+        tokens_per_sec: float = 50.0,
+        tokens_per_chunk: int = 4,
+        error_rate: float = 0.0,
+        prefill_ms_per_1k_tokens: float = 0.0,
+        responses_file: Optional[str] = None,
+        seed: Optional[int] = None
+    ):
+        self.ttft = ttft_ms / 1000
+        self.prefill_per_token = prefill_ms_per_1k_tokens / 1000 / 1000
+        self.prefixes: Dict[str, str] = {}
+        self.tokens_per_sec = max(tokens_per_sec, 0.001)
+        self.tokens_per_chunk = max(1, tokens_per_chunk)
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.recorded: Dict[str, str] = {}
+        self.recorded_list: List[str] = []
+        if responses_file:
+            self._load_recordings(responses_file)
+
+    def _load_recordings(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self.recorded[_prompt_key(record.get("prompt", ""))] = record["response"]
+                self.recorded_list.append(record["response"])
+
+    def _response_for(self, prompt: str) -> str:
+        key = _prompt_key(prompt)
+        if key in self.recorded:
+            return self.recorded[key]
+        if self.recorded_list:
+            # Deterministic pick so the same prompt always replays the same answer
+            return self.recorded_list[int(key, 16) % len(self.recorded_list)]
+        return _CANNED_RESPONSE
+
+    def _maybe_fail(self, stage: str):
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise LLMError(f"Simulated upstream error during {stage}")
+
+    async def generate(self, prompt: str) -> str:
+        return "".join([chunk async for chunk in self.stream(prompt)])
+
+    async def create_prefix_cache(self, prefix: str, ttl_seconds: float) -> Any:
+        handle = _prompt_key(prefix)
+        self.prefixes[handle] = prefix
+        return handle
+
+    def drop_prefix_cache(self, handle: Any):
+        self.prefixes.pop(handle, None)
+
+    async def stream(self, prompt: str, cached_prefix: Any = None) -> AsyncIterator[str]:
+        # Only the uncached part of the prompt pays the simulated prefill cost
+        await asyncio.sleep(self.ttft + estimate_tokens(prompt) * self.prefill_per_token)
+        self._maybe_fail("request")
+        if cached_prefix is not None:
+            prompt = self.prefixes.get(cached_prefix, "") + prompt
+        tokens = _TOKEN_RE.findall(self._response_for(prompt))
+        for start in range(0, len(tokens), self.tokens_per_chunk):
+            if start:
+                await asyncio.sleep(self.tokens_per_chunk / self.tokens_per_sec)
+                # Mid-stream failures are rarer than failed requests upstream
+                if self.error_rate and self.random.random() < self.error_rate / 10:
+                    raise LLMError("Simulated upstream error mid-stream")
+            yield "".join(tokens[start:start + self.tokens_per_chunk])
+
+    async def transcribe(self, audio: bytes, mime_type: str = "audio/wav") -> str:
+        await asyncio.sleep(self.ttft)
+        self._maybe_fail("transcription")
+        return f"[stub transcript of {len(audio)} bytes of {mime_type}]"
+
+
+class RecordingProvider(LLMProvider):
+    """Wrap a provider and append every prompt/response pair to a JSONL file.
+
+    The output can be fed back to ``StubProvider`` through ``LLM_STUB_RESPONSES_FILE``.
+    """
+
+    def __init__(self, inner: LLMProvider, path: str):
+        self.inner = inner
+        self.path = path
+        self.name = inner.name
+        self.supports_prefix_cache = inner.supports_prefix_cache
+        self.min_prefix_tokens = inner.min_prefix_tokens
+        self.prefixes: Dict[Any, str] = {}
+
+    def _record(self, prompt: str, response: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"prompt": prompt, "response": response}) + "\n")
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.inner.generate(prompt)
+        self._record(prompt, response)
+        return response
+
+    async def create_prefix_cache(self, prefix: str, ttl_seconds: float) -> Any:
+        handle = await self.inner.create_prefix_cache(prefix, ttl_seconds)
+        if handle is not None:
+            self.prefixes[id(handle)] = prefix
+        return handle
+
+    def drop_prefix_cache(self, handle: Any):
+        self.prefixes.pop(id(handle), None)
+        self.inner.drop_prefix_cache(handle)
+
+    def close(self):
+        self.inner.close()
+
+    async def stream(self, prompt: str, cached_prefix: Any = None) -> AsyncIterator[str]:
+        chunks = []
+        async for chunk in self.inner.stream(prompt, cached_prefix):
+            chunks.append(chunk)
+            yield chunk
+        # Record the full prompt so replays match regardless of prefix caching
+        prefix = self.prefixes.get(id(cached_prefix), "") if cached_prefix is not None else ""
+        self._record(prefix + prompt, "".join(chunks))
+
+    async def transcribe(self, audio: bytes, mime_type: str = "audio/wav") -> str:
+        return await self.inner.transcribe(audio, mime_type)
+
+
+def _prompt_key(prompt: str) -> str:
+    return hashlib.sha1(" ".join(prompt.split()).encode("utf-8")).hexdigest()
+
+
+def build_provider(name: str) -> LLMProvider:
+    if name == "gemini":
+        provider: LLMProvider = GeminiProvider(settings.GOOGLE_API_KEY, settings.LLM_MODEL)
+    elif name == "stub":
+        provider = StubProvider(
+            ttft_ms=settings.LLM_STUB_TTFT_MS,
+            tokens_per_sec=settings.LLM_STUB_TOKENS_PER_SEC,
+            tokens_per_chunk=settings.LLM_STUB_TOKENS_PER_CHUNK,
+            error_rate=settings.LLM_STUB_ERROR_RATE,
+            prefill_ms_per_1k_tokens=settings.LLM_STUB_PREFILL_MS_PER_1K_TOKENS,
+            responses_file=settings.LLM_STUB_RESPONSES_FILE,
+            seed=settings.LLM_STUB_SEED
+        )
+    else:
+        raise ValueError(f"Unknown LLM provider: {name}")
+
+    # Imported here: the limiter pulls in the database layer
+    from .ratelimit import RateLimitedProvider, build_limiter
+
+    limiter = build_limiter(settings.RATE_LIMIT_BACKEND, f"{name}:{settings.LLM_MODEL}")
+    if limiter is not None:
+        provider = RateLimitedProvider(provider, limiter)
+    if settings.LLM_RECORD_FILE:
+        provider = RecordingProvider(provider, settings.LLM_RECORD_FILE)
+    return provider
+
+
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> LLMProvider:
+    """Return the process-wide provider selected by ``LLM_PROVIDER``.
+
+    Built on first use (the SDK import and client setup are not paid at import
+    time); the startup hook may warm it in the background.
+    """
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider(settings.LLM_PROVIDER)
+    return _provider
+
+
+def close_provider():
+    """Close the provider if one was built; nothing to do otherwise"""
+    if _provider is not None:
+        _provider.close()
@@ -0,0 +1,84 @@
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional
+
+
+def _key(name: str, labels: Dict[str, object]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class Metrics:
+    """Tiny in-process metrics registry (counters, gauges and sampled histograms)"""
+
+    def __init__(self, sample_size: int = 1024):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=sample_size))
+        self._totals: Dict[str, list] = defaultdict(lambda: [0, 0.0, 0.0])  # count, sum, max
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        with self._lock:
+            key = _key(name, labels)
+            self._gauges[key] = self._gauges.get(key, 0.0) + delta
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            key = _key(name, labels)
+            self._samples[key].append(value)
+            totals = self._totals[key]
+            totals[0] += 1
+            totals[1] += value
+            totals[2] = max(totals[2], value)
+
+    def percentile(self, name: str, q: float, **labels) -> Optional[float]:
+        """Return the q-th percentile (0-100) of recent observations, if any"""
+        with self._lock:
+            samples = sorted(self._samples.get(_key(name, labels), ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def count(self, name: str, **labels) -> int:
+        with self._lock:
+            totals = self._totals.get(_key(name, labels))
+        return totals[0] if totals else 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            histograms = {}
+            for key, samples in self._samples.items():
+                ordered = sorted(samples)
+                count, total, maximum = self._totals[key]
+
+                def pct(q: float) -> float:
+                    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+                histograms[key] = {
+                    "count": count,
+                    "mean": total / count if count else 0.0,
+                    "p50": pct(50),
+                    "p95": pct(95),
+                    "p99": pct(99),
+                    "max": maximum
+                }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": histograms
+            }
+
+
+metrics = Metrics()
@@ -0,0 +1,207 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import AbstractSet, Dict, List, Optional, Sequence, Tuple
+from ..models.conversation import Conversation
+from ..models.document import Document
+
+_TERM_RE = re.compile(r"[a-z0-9][a-z0-9\-\./§]*")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from had has have how i if in into is it its
+may might more most of on or our should so than that the their them then there these they this
+to was we were what when where which who why will with would you your
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate (~4 characters per token for English prose)"""
+    return (len(text) + 3) // 4
+
+
+def terms(text: str) -> List[str]:
+    """Lowercased search terms; keeps tickers, section numbers and hyphenated names intact"""
+    return [
+        term.rstrip(".")
+        for term in _TERM_RE.findall(text.lower())
+        if term.rstrip(".") not in _STOPWORDS
+    ]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * 4]
+    # Prefer ending on a word boundary
+    return cut[:cut.rfind(" ")] + "..." if " " in cut else cut + "..."
+
+
+def split_passages(text: str, max_tokens: int) -> List[str]:
+    """Split text into passages of at most ``max_tokens``, on paragraph and sentence boundaries"""
+    pieces: List[str] = []
+    for paragraph in _PARAGRAPH_RE.split(text or ""):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            while estimate_tokens(sentence) > max_tokens:
+                pieces.append(sentence[:max_tokens * 4])
+                sentence = sentence[max_tokens * 4:]
+            if sentence:
+                pieces.append(sentence)
+
+    # Merge neighbouring small pieces back up to the passage size
+    passages: List[str] = []
+    for piece in pieces:
+        if passages and estimate_tokens(passages[-1]) + estimate_tokens(piece) + 1 <= max_tokens:
+            passages[-1] = f"{passages[-1]} {piece}"
+        else:
+            passages.append(piece)
+    return passages
+
+
+@dataclass
+class _Candidate:
+    text: str
+    tokens: int
+    score: float
+    order: Tuple[int, int]  # (source rank, position within source)
+
+
+def bm25_scores(query: Sequence[str], texts: Sequence[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """BM25 over the candidate set itself; good enough to rank a few hundred passages"""
+    query_terms = set(query)
+    if not query_terms or not texts:
+        return [0.0] * len(texts)
+    counts = [Counter(terms(text)) for text in texts]
+    lengths = [sum(c.values()) or 1 for c in counts]
+    avg_length = sum(lengths) / len(lengths)
+    document_frequency: Dict[str, int] = Counter(t for c in counts for t in query_terms if t in c)
+    scores = []
+    for count, length in zip(counts, lengths):
+        score = 0.0
+        for term in query_terms:
+            tf = count.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(texts) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    return scores
+
+
+def _fill(candidates: List[_Candidate], budget: int) -> List[_Candidate]:
+    """Greedily take the best-scoring candidates that still fit, then restore source order"""
+    chosen, used = [], 0
+    for candidate in sorted(candidates, key=lambda c: (-c.score, c.order)):
+        if used + candidate.tokens <= budget:
+            chosen.append(candidate)
+            used += candidate.tokens
+    return sorted(chosen, key=lambda c: c.order)
+
+
+def select_document_passages(
+    documents: Sequence[Document],
+    topic: str,
+    budget: int,
+    passage_tokens: int,
+    exclude: AbstractSet[str] = frozenset()
+) -> List[str]:
+    """Pick the passages most relevant to ``topic`` that fit in ``budget`` tokens.
+
+    ``documents`` are expected newest first; recency breaks ties between
+    passages that match the topic equally well. Passages in ``exclude`` (e.g.
+    already sent as part of a cached prefix) are skipped.
+    """
+    candidates: List[_Candidate] = []
+    for rank, doc in enumerate(documents):
+        header = f"[{doc.type}, {doc.timestamp}]"
+        for position, passage in enumerate(split_passages(doc.content or "", passage_tokens)):
+            text = f"{header} {passage}"
+            if text in exclude:
+                continue
+            candidates.append(_Candidate(text, estimate_tokens(text) + 1, 0.0, (rank, position)))
+
+    scores = bm25_scores(terms(topic), [c.text for c in candidates])
+    for candidate, score in zip(candidates, scores):
+        rank, position = candidate.order
+        candidate.score = score + 0.1 / (1 + rank) + 0.01 / (1 + position)
+
+    return [c.text for c in _fill(candidates, budget)]
+
+
+def pack_passages(
+    passages: Sequence[str],
+    budget: int,
+    exclude: AbstractSet[str] = frozenset()
+) -> Tuple[str, int]:
+    """Fill ``budget`` tokens with document passages given most relevant first.
+
+    Passages in ``exclude`` (already in the cached prefix) and repeats are skipped.
+    """
+    chosen: List[str] = []
+    used = 0
+    for passage in passages:
+        if passage in exclude or passage in chosen:
+            continue
+        tokens = estimate_tokens(passage) + 1
+        if used + tokens <= budget:
+            chosen.append(passage)
+            used += tokens
+    if not chosen:
+        return "", 0
+    return "Relevant company documents:\n" + "\n".join(chosen), used
+
+
+def summarize_conversation(conversation: Conversation, max_tokens: int, discussion: Optional[Dict] = None) -> str:
+    """Short digest of a past discussion: its synthesis if any, else each advisor's opening"""
+    if discussion is None:
+        discussion = conversation.discussion or {}
+    synthesis = discussion.get("synthesis")
+    if synthesis:
+        return truncate_to_tokens(synthesis, max_tokens)
+    responses = discussion.get("responses") or {}
+    if not responses:
+        return ""
+    per_advisor = max(8, max_tokens // len(responses))
+    return " ".join(
+        f"{role}: {truncate_to_tokens(' '.join(str(answer).split()), per_advisor)}"
+        for role, answer in responses.items()
+    )
+
+
+def pack_history(
+    conversations: Sequence[Conversation],
+    topic: str,
+    budget: int,
+    summary_tokens: int,
+    discussions: Optional[Dict[int, Dict]] = None
+) -> Tuple[str, int]:
+    """Fill ``budget`` tokens with summaries of the past discussions most relevant to ``topic``.
+
+    ``discussions`` maps conversation ids to their assembled discussion (see
+    ``assemble_discussions``); without it the stored JSON is summarized.
+    """
+    candidates: List[_Candidate] = []
+    for rank, conversation in enumerate(conversations):
+        discussion = discussions.get(conversation.id) if discussions else None
+        summary = summarize_conversation(conversation, summary_tokens, discussion)
+        if not summary:
+            continue
+        text = f"- {conversation.timestamp} | {conversation.topic}: {summary}"
+        candidates.append(_Candidate(text, estimate_tokens(text) + 1, 0.0, (rank, 0)))
+
+    scores = bm25_scores(terms(topic), [c.text for c in candidates])
+    for candidate, score in zip(candidates, scores):
+        candidate.score = score + 0.1 / (1 + candidate.order[0])
+
+    chosen = _fill(candidates, budget)
+    if not chosen:
+        return "", 0
+    text = "Relevant past discussions:\n" + "\n".join(c.text for c in chosen)
+    return text, sum(c.tokens for c in chosen)
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List
+from sqlalchemy.orm import Session
+from .cache import TTLCache, fingerprint
+from .config import settings
+from .llm import LLMProvider
+from .metrics import metrics
+from .packing import estimate_tokens, select_document_passages
+from ..models.document import Document
+
+
+@dataclass(frozen=True)
+class OrgCorpus:
+    """Topic-independent document context of an organization, sent in the cached prefix"""
+    text: str
+    tokens: int
+    passages: FrozenSet[str]
+    fingerprint: str
+
+
+EMPTY_CORPUS = OrgCorpus("", 0, frozenset(), "")
+
+
+@dataclass
+class _Prefix:
+    org_id: int
+    provider: LLMProvider
+    handle: Any  # Provider handle, or None when the prefix is sent inline
+    expires_at: float
+
+
+class PrefixCache:
+    """Registers each static per-org, per-role prompt prefix with the provider once.
+
+    Prefixes are content-addressed, so a changed personality or document
+    library simply maps to a new entry. Creating or deleting documents and
+    personalities also calls ``invalidate_org`` to rebuild the org's library
+    and release stale upstream caches early. Expired entries, including those
+    whose content is never asked for again, are swept and released upstream
+    as well.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._corpora = TTLCache("prefix_corpus_cache", max_entries=1024, ttl_seconds=ttl_seconds)
+        self._versions: Dict[int, int] = {}
+        self._prefixes: Dict[str, _Prefix] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._next_sweep = 0.0
+
+    def corpus(self, db: Session, provider: LLMProvider, org_id: int) -> OrgCorpus:
+        """Return the org's document library for the prefix, or an empty one when caching won't pay off"""
+        if not settings.PREFIX_CACHE_ENABLED or not provider.supports_prefix_cache:
+            return EMPTY_CORPUS
+        cached = self._corpora.get(org_id)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            version = self._versions.get(org_id, 0)
+        documents = (
+            db.query(Document)
+            .filter(Document.organization_id == org_id)
+            .order_by(Document.timestamp.desc())
+            .all()
+        )
+        passages = select_document_passages(
+            documents, "", settings.PREFIX_CACHE_CORPUS_TOKENS, settings.CONTEXT_PASSAGE_TOKENS
+        )
+        tokens = sum(estimate_tokens(p) + 1 for p in passages)
+        if not passages or tokens < provider.min_prefix_tokens:
+            # Too small to cache upstream; the per-topic packer covers it instead
+            corpus = EMPTY_CORPUS
+        else:
+            text = "Company document library:\n" + "\n".join(passages)
+            corpus = OrgCorpus(text, tokens, frozenset(passages), fingerprint(text))
+
+        with self._lock:
+            if self._versions.get(org_id, 0) == version:
+                self._corpora.set(org_id, corpus)
+        return corpus
+
+    async def acquire(self, provider: LLMProvider, org_id: int, prefix: str) -> Any:
+        """Return the provider handle for ``prefix``, registering it on first use.
+
+        None means the caller should send the prefix inline.
+        """
+        key = fingerprint(provider.name, prefix)
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.ttl_seconds * 0.1
+                expired = [stale for stale, entry in self._prefixes.items() if entry.expires_at <= now]
+            entry = self._prefixes.get(key)
+            if entry is not None and entry.expires_at <= now:
+                expired.append(key)
+                entry = None
+            entries = [self._prefixes.pop(key) for key in set(expired)]
+        self._release(entries)
+        if entry is not None:
+            metrics.inc("prefix_cache_hits" if entry.handle is not None else "prefix_cache_inline")
+            return entry.handle
+
+        # Concurrent advisors with the same prefix wait for a single registration
+        pending = self._pending.get(key)
+        if pending is None:
+            metrics.inc("prefix_cache_misses")
+            pending = asyncio.ensure_future(self._create(provider, org_id, key, prefix))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _create(self, provider: LLMProvider, org_id: int, key: str, prefix: str) -> Any:
+        try:
+            handle = await provider.create_prefix_cache(prefix, self.ttl_seconds)
+        except Exception as e:
+            print(f"Prefix cache registration failed: {str(e)}")
+            handle = None
+        if handle is not None:
+            metrics.inc("prefix_cache_registered")
+            metrics.observe("prefix_cache_tokens", estimate_tokens(prefix))
+        with self._lock:
+            # Refresh a little before the upstream TTL runs out
+            self._prefixes[key] = _Prefix(org_id, provider, handle, time.monotonic() + self.ttl_seconds * 0.9)
+        return handle
+
+    def invalidate_org(self, org_id: int):
+        with self._lock:
+            self._versions[org_id] = self._versions.get(org_id, 0) + 1
+            stale = [key for key, entry in self._prefixes.items() if entry.org_id == org_id]
+            entries = [self._prefixes.pop(key) for key in stale]
+        self._corpora.pop(org_id)
+        self._release(entries)
+
+    def _release(self, entries: List[_Prefix]):
+        entries = [entry for entry in entries if entry.handle is not None]
+        if entries:
+            metrics.inc("prefix_cache_released", len(entries))
+            # Deleting upstream caches is best effort and shouldn't slow the caller
+            threading.Thread(target=self._drop, args=(entries,), daemon=True).start()
+
+    def _drop(self, entries: List[_Prefix]):
+        for entry in entries:
+            try:
+                entry.provider.drop_prefix_cache(entry.handle)
+            except Exception as e:
+                print(f"Error dropping prefix cache: {str(e)}")
+
+
+prefix_cache = PrefixCache(settings.PREFIX_CACHE_TTL_SECONDS)
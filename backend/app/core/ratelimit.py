@@ -0,0 +1,353 @@
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from .config import settings
+from .llm import LLMProvider
+from .metrics import metrics
+from .packing import estimate_tokens
+from ..db.session import SessionLocal
+from ..models.rate_limit import RateLimitBucket
+
+
+@dataclass(frozen=True)
+class BucketSpec:
+    name: str
+    capacity: float
+    rate: float  # Tokens added per second
+
+
+class TokenBucketLimiter:
+    """Waits for capacity in a set of token buckets before each provider call.
+
+    A call is charged against every bucket at once (e.g. one request and N
+    tokens) and only goes ahead when all of them can pay, so the combined
+    requests/min and tokens/min quota is never overdrawn. Callers sleep for the
+    computed refill time instead of failing. Output length is only known
+    afterwards, so calls are charged an estimate and ``settle`` corrects it.
+    """
+
+    def __init__(self, buckets: Dict[str, BucketSpec]):
+        self.buckets = buckets
+
+    def _try_acquire(self, costs: Dict[str, float]) -> float:
+        """Take ``costs`` if all buckets can pay; otherwise return the seconds to wait"""
+        raise NotImplementedError
+
+    async def _try_acquire_async(self, costs: Dict[str, float]) -> float:
+        return self._try_acquire(costs)
+
+    async def acquire(self, **costs: float):
+        # A single call larger than a bucket could never be served; cap it at a full bucket
+        costs = {
+            name: min(cost, self.buckets[name].capacity)
+            for name, cost in costs.items() if cost > 0
+        }
+        started = time.monotonic()
+        waited = False
+        while True:
+            wait = await self._try_acquire_async(costs)
+            if wait <= 0:
+                break
+            waited = True
+            # Jitter spreads out workers that were all told to wait the same time
+            await asyncio.sleep(min(wait, settings.RATE_LIMIT_MAX_WAIT_SECONDS) * random.uniform(1.0, 1.2))
+        if waited:
+            metrics.inc("rate_limit_waits")
+            metrics.observe("rate_limit_wait_seconds", time.monotonic() - started)
+
+    def settle(self, **deltas: float):
+        """Correct an up-front charge once the actual usage is known.
+
+        Positive deltas charge extra usage and negative ones credit unused
+        capacity back. Extra usage is never waited for; the bucket goes into
+        debt and later calls wait for it to refill.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if deltas:
+            self._settle(deltas)
+
+    def _settle(self, deltas: Dict[str, float]):
+        raise NotImplementedError
+
+    def release(self):
+        """Give back capacity held by this process (called on shutdown)"""
+
+
+def _refill(tokens: float, updated_at: float, now: float, bucket: BucketSpec) -> float:
+    return min(bucket.capacity, tokens + max(0.0, now - updated_at) * bucket.rate)
+
+
+class LocalTokenBucketLimiter(TokenBucketLimiter):
+    """In-process buckets; each worker gets the full quota, so only for single-worker setups"""
+
+    def __init__(self, buckets: Dict[str, BucketSpec]):
+        super().__init__(buckets)
+        self._lock = threading.Lock()
+        now = time.time()
+        self._state = {name: (bucket.capacity, now) for name, bucket in buckets.items()}
+
+    def _try_acquire(self, costs: Dict[str, float]) -> float:
+        with self._lock:
+            now = time.time()
+            available = {
+                name: _refill(*self._state[name], now, self.buckets[name]) for name in costs
+            }
+            wait = max(
+                [(costs[name] - available[name]) / self.buckets[name].rate for name in costs],
+                default=0.0
+            )
+            for name in costs:
+                left = available[name] - costs[name] if wait <= 0 else available[name]
+                self._state[name] = (left, now)
+            return wait
+
+    def _settle(self, deltas: Dict[str, float]):
+        with self._lock:
+            now = time.time()
+            for name, delta in deltas.items():
+                tokens = _refill(*self._state[name], now, self.buckets[name]) - delta
+                self._state[name] = (min(tokens, self.buckets[name].capacity), now)
+
+
+class DatabaseTokenBucketLimiter(TokenBucketLimiter):
+    """Buckets kept as rows in the shared database, so all workers draw on one quota.
+
+    Workers don't go to the database for every call. Each one leases a slice of
+    the bucket (``RATE_LIMIT_LEASE_FRACTION`` of its capacity, or the shortfall
+    if larger) and serves calls from it locally until it runs out. Leasing locks
+    the bucket rows (``SELECT ... FOR UPDATE``) in name order, refills them from
+    the elapsed time and either takes the slice or reports the wait.
+
+    Settlements adjust the local lease. ``RATE_LIMIT_LEASE_SECONDS`` after a
+    worker starts holding a balance, or on shutdown, whatever is left (unused
+    capacity, refunds, or debt from longer outputs) goes back to the shared
+    rows, so an idle worker doesn't sit on quota the others need. Errors fail
+    open: the limiter should never take generation down with it.
+    """
+
+    def __init__(self, buckets: Dict[str, BucketSpec]):
+        super().__init__(buckets)
+        self._lock = threading.Lock()
+        self._leased = {name: 0.0 for name in buckets}
+        self._timer: Optional[threading.Timer] = None
+
+    def _take_leased(self, costs: Dict[str, float]) -> bool:
+        with self._lock:
+            if any(self._leased[name] < cost for name, cost in costs.items()):
+                return False
+            for name, cost in costs.items():
+                self._leased[name] -= cost
+            return True
+
+    async def _try_acquire_async(self, costs: Dict[str, float]) -> float:
+        if self._take_leased(costs):
+            return 0.0
+        return await asyncio.to_thread(self._try_acquire, costs)
+
+    def _try_acquire(self, costs: Dict[str, float]) -> float:
+        if self._take_leased(costs):
+            return 0.0
+        with self._lock:
+            amounts = {}
+            for name, cost in costs.items():
+                bucket = self.buckets[name]
+                shortfall = cost - self._leased[name]
+                if shortfall > 0:
+                    lease = bucket.capacity * settings.RATE_LIMIT_LEASE_FRACTION
+                    amounts[name] = min(bucket.capacity, max(shortfall, lease))
+        wait = self._lease(amounts)
+        if wait > 0:
+            return wait
+        metrics.inc("rate_limit_leases")
+        with self._lock:
+            for name, amount in amounts.items():
+                self._leased[name] += amount
+            self._hold()
+        if self._take_leased(costs):
+            return 0.0
+        # Another call took the new lease first; lease again shortly
+        return 0.01
+
+    def _settle(self, deltas: Dict[str, float]):
+        # Corrections go into this worker's lease rather than costing a round trip;
+        # the shared rows get them when the lease is returned
+        with self._lock:
+            for name, delta in deltas.items():
+                self._leased[name] = min(self._leased[name] - delta, self.buckets[name].capacity)
+            self._hold()
+
+    def _hold(self):
+        """Schedule the return of the lease; the caller holds ``_lock``"""
+        if self._timer is None:
+            self._timer = threading.Timer(settings.RATE_LIMIT_LEASE_SECONDS, self.release)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def release(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            balances = {name: amount for name, amount in self._leased.items() if amount}
+            self._leased = {name: 0.0 for name in self.buckets}
+        if balances:
+            self._return(balances)
+
+    def _return(self, balances: Dict[str, float]):
+        """Add what's left of a lease (negative for debt) back to the shared rows"""
+        db = SessionLocal()
+        try:
+            now = time.time()
+            for name in sorted(balances):
+                bucket = self.buckets[name]
+                row = (
+                    db.query(RateLimitBucket)
+                    .filter(RateLimitBucket.name == bucket.name)
+                    .with_for_update()
+                    .first()
+                )
+                if row is None:
+                    continue
+                tokens = _refill(row.tokens, row.updated_at, now, bucket) + balances[name]
+                row.tokens = min(tokens, bucket.capacity)
+                row.updated_at = now
+            db.commit()
+            metrics.inc("rate_limit_lease_returns")
+        except SQLAlchemyError as e:
+            db.rollback()
+            metrics.inc("rate_limit_errors")
+            print(f"Error returning rate limit lease: {e}")
+        finally:
+            db.close()
+
+    def _lease(self, amounts: Dict[str, float]) -> float:
+        """Take ``amounts`` from the shared rows if all can pay; otherwise return the seconds to wait"""
+        db = SessionLocal()
+        try:
+            now = time.time()
+            rows = {}
+            for name in sorted(amounts):  # Fixed lock order avoids deadlocks between workers
+                bucket = self.buckets[name]
+                row = (
+                    db.query(RateLimitBucket)
+                    .filter(RateLimitBucket.name == bucket.name)
+                    .with_for_update()
+                    .first()
+                )
+                if row is None:
+                    row = RateLimitBucket(name=bucket.name, tokens=bucket.capacity, updated_at=now)
+                    db.add(row)
+                    db.flush()
+                rows[name] = row
+
+            wait = 0.0
+            for name, row in rows.items():
+                bucket = self.buckets[name]
+                row.tokens = _refill(row.tokens, row.updated_at, now, bucket)
+                row.updated_at = now
+                wait = max(wait, (amounts[name] - row.tokens) / bucket.rate)
+            if wait <= 0:
+                for name, row in rows.items():
+                    row.tokens -= amounts[name]
+            db.commit()
+            return wait
+        except IntegrityError:
+            # Another worker created the bucket row first; check again shortly
+            db.rollback()
+            return 0.01
+        except SQLAlchemyError as e:
+            db.rollback()
+            metrics.inc("rate_limit_errors")
+            print(f"Rate limiter unavailable, not throttling: {e}")
+            return 0.0
+        finally:
+            db.close()
+
+
+class RateLimitedProvider(LLMProvider):
+    """Charges every upstream call against the shared quota before making it"""
+
+    def __init__(self, inner: LLMProvider, limiter: TokenBucketLimiter):
+        self.inner = inner
+        self.limiter = limiter
+        self.name = inner.name
+        self.supports_prefix_cache = inner.supports_prefix_cache
+        self.min_prefix_tokens = inner.min_prefix_tokens
+        self.prefix_tokens: Dict[int, int] = {}
+
+    async def _charge(self, input_tokens: int, output_tokens: int):
+        await self.limiter.acquire(requests=1, tokens=input_tokens + output_tokens)
+
+    def _settle_output(self, text: str):
+        """Swap the expected output charge for the tokens actually produced"""
+        self.limiter.settle(tokens=estimate_tokens(text) - settings.RATE_LIMIT_EXPECTED_OUTPUT_TOKENS)
+
+    async def generate(self, prompt: str) -> str:
+        await self._charge(estimate_tokens(prompt), settings.RATE_LIMIT_EXPECTED_OUTPUT_TOKENS)
+        text = ""
+        try:
+            text = await self.inner.generate(prompt)
+            return text
+        finally:
+            self._settle_output(text)
+
+    async def create_prefix_cache(self, prefix: str, ttl_seconds: float) -> Any:
+        tokens = estimate_tokens(prefix)
+        await self._charge(tokens, 0)
+        handle = await self.inner.create_prefix_cache(prefix, ttl_seconds)
+        if handle is not None:
+            self.prefix_tokens[id(handle)] = tokens
+        return handle
+
+    def drop_prefix_cache(self, handle: Any):
+        self.prefix_tokens.pop(id(handle), None)
+        self.inner.drop_prefix_cache(handle)
+
+    def close(self):
+        self.limiter.release()
+        self.inner.close()
+
+    async def stream(self, prompt: str, cached_prefix: Any = None) -> AsyncIterator[str]:
+        # Cached prefix tokens still count as input against the quota
+        prefix_tokens = self.prefix_tokens.get(id(cached_prefix), 0) if cached_prefix is not None else 0
+        await self._charge(
+            estimate_tokens(prompt) + prefix_tokens, settings.RATE_LIMIT_EXPECTED_OUTPUT_TOKENS
+        )
+        # Settled on failure or cancellation too, for whatever was produced by then
+        chunks = []
+        try:
+            async for chunk in self.inner.stream(prompt, cached_prefix):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            self._settle_output("".join(chunks))
+
+    async def transcribe(self, audio: bytes, mime_type: str = "audio/wav") -> str:
+        await self._charge(0, settings.RATE_LIMIT_EXPECTED_OUTPUT_TOKENS)
+        text = ""
+        try:
+            text = await self.inner.transcribe(audio, mime_type)
+            return text
+        finally:
+            self._settle_output(text)
+
+
+def build_limiter(backend: str, prefix: str) -> Optional[TokenBucketLimiter]:
+    if backend == "off":
+        return None
+    burst = settings.RATE_LIMIT_BURST_SECONDS
+    requests_rate = settings.RATE_LIMIT_REQUESTS_PER_MINUTE / 60.0
+    tokens_rate = settings.RATE_LIMIT_TOKENS_PER_MINUTE / 60.0
+    buckets = {
+        "requests": BucketSpec(f"{prefix}:requests", max(1.0, requests_rate * burst), requests_rate),
+        "tokens": BucketSpec(f"{prefix}:tokens", tokens_rate * burst, tokens_rate),
+    }
+    if backend == "local":
+        return LocalTokenBucketLimiter(buckets)
+    if backend == "database":
+        return DatabaseTokenBucketLimiter(buckets)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
@@ -0,0 +1,72 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict
+from sqlalchemy.orm import Session
+from .advisors import AIAdvisor, DEFAULT_PERSONALITIES
+from .config import settings
+from ..models.personality import Personality
+
+
+@dataclass
+class _OrgAdvisors:
+    version: int
+    loaded_at: float
+    advisors: Dict[str, AIAdvisor]
+
+
+class AdvisorRegistry:
+    """Long-lived, per-organization set of ready-to-use advisors.
+
+    Advisors hold no per-request state, so one instance per role is shared by
+    every request of an organization. Creating or deleting a personality bumps
+    the organization's version, which makes the next lookup rebuild the set.
+    Versions are per process, so entries also expire after a TTL to pick up
+    changes made through other workers.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[int, _OrgAdvisors] = {}
+        self._versions: Dict[int, int] = {}
+
+    def version(self, org_id: int) -> int:
+        with self._lock:
+            return self._versions.get(org_id, 0)
+
+    def invalidate(self, org_id: int):
+        with self._lock:
+            self._versions[org_id] = self._versions.get(org_id, 0) + 1
+            self._entries.pop(org_id, None)
+
+    def get_advisors(self, db: Session, org_id: int) -> Dict[str, AIAdvisor]:
+        with self._lock:
+            version = self._versions.get(org_id, 0)
+            entry = self._entries.get(org_id)
+        if (
+            entry is not None
+            and entry.version == version
+            and time.monotonic() - entry.loaded_at < self.ttl_seconds
+        ):
+            return entry.advisors
+
+        advisors = self._build(db, org_id)
+        with self._lock:
+            # Only publish if no invalidation happened while we were loading
+            if self._versions.get(org_id, 0) == version:
+                self._entries[org_id] = _OrgAdvisors(version, time.monotonic(), advisors)
+        return advisors
+
+    def _build(self, db: Session, org_id: int) -> Dict[str, AIAdvisor]:
+        advisors = {role: AIAdvisor(role) for role in DEFAULT_PERSONALITIES}
+        custom_personalities = db.query(Personality).filter(
+            Personality.organization_id == org_id
+        ).all()
+        # Custom personalities override built-in roles with the same name
+        for personality in custom_personalities:
+            advisors[personality.name] = AIAdvisor(personality.name, personality.prompt_template)
+        return advisors
+
+
+advisor_registry = AdvisorRegistry(settings.ADVISOR_REGISTRY_TTL_SECONDS)
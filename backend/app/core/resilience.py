@@ -0,0 +1,248 @@
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, fields, replace
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from .config import settings
+from .llm import LLMError
+from .metrics import metrics
+
+# google.api_core exceptions worth retrying, matched by name so the SDK stays optional
+_TRANSIENT_ERROR_NAMES = {
+    "ServiceUnavailable", "ResourceExhausted", "TooManyRequests", "DeadlineExceeded",
+    "InternalServerError", "BadGateway", "GatewayTimeout", "Aborted"
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, (LLMError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+@dataclass(frozen=True)
+class ResiliencePolicy:
+    max_attempts: int = 3
+    backoff_base_seconds: float = 0.5
+    backoff_max_seconds: float = 8.0
+    hedge_enabled: bool = True
+    hedge_percentile: float = 95.0  # Hedge once TTFT passes this percentile of recent TTFTs
+    hedge_min_samples: int = 20  # TTFT observations needed before hedging kicks in
+    hedge_min_delay_seconds: float = 0.5
+    breaker_failure_threshold: int = 5  # Consecutive failures that open the circuit
+    breaker_reset_seconds: float = 30.0  # Open time before a trial request is let through
+
+    @classmethod
+    def for_role(cls, role: str) -> "ResiliencePolicy":
+        """Defaults from settings with the role's overrides from ``RESILIENCE_ROLE_POLICIES``"""
+        policy = cls(
+            max_attempts=settings.RESILIENCE_MAX_ATTEMPTS,
+            backoff_base_seconds=settings.RESILIENCE_BACKOFF_BASE_SECONDS,
+            backoff_max_seconds=settings.RESILIENCE_BACKOFF_MAX_SECONDS,
+            hedge_enabled=settings.RESILIENCE_HEDGE_ENABLED,
+            hedge_percentile=settings.RESILIENCE_HEDGE_PERCENTILE,
+            hedge_min_samples=settings.RESILIENCE_HEDGE_MIN_SAMPLES,
+            hedge_min_delay_seconds=settings.RESILIENCE_HEDGE_MIN_DELAY_SECONDS,
+            breaker_failure_threshold=settings.RESILIENCE_BREAKER_FAILURES,
+            breaker_reset_seconds=settings.RESILIENCE_BREAKER_RESET_SECONDS
+        )
+        overrides = settings.RESILIENCE_ROLE_POLICIES.get(role, {})
+        types = {f.name: f.type for f in fields(cls)}
+        return replace(policy, **{
+            name: types[name](value) for name, value in overrides.items() if name in types
+        })
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries from many requests over the whole window
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> one trial request per reset period"""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed >= self.reset_seconds:
+                # Let one request probe the provider; the rest keep failing fast until it reports back
+                self._opened_at = time.monotonic()
+                metrics.inc("circuit_breaker_trials", breaker=self.name)
+                return
+            retry_after = max(1.0, self.reset_seconds - elapsed)
+        metrics.inc("circuit_breaker_rejected", breaker=self.name)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"Circuit {self.name} closed")
+                metrics.set_gauge("circuit_breaker_open", 0, breaker=self.name)
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.failure_threshold:
+                return
+            if self._opened_at is None:
+                print(f"Circuit {self.name} opened after {self._failures} failures")
+                metrics.inc("circuit_breaker_opened", breaker=self.name)
+                metrics.set_gauge("circuit_breaker_open", 1, breaker=self.name)
+            self._opened_at = time.monotonic()
+
+
+async def _first_chunk(stream: AsyncIterator[str]) -> Optional[str]:
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def _discard(task: asyncio.Task, stream: AsyncIterator[str]):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await stream.aclose()
+
+
+class ResilientCaller:
+    """Retries, TTFT hedging and circuit breaking around streaming provider calls.
+
+    Only the start of a stream is retried or hedged: once the first chunk has
+    been handed to the client, a failure is surfaced rather than replayed, so
+    users never see duplicated text. Policies and breakers are per advisor role.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, role: str, policy: ResiliencePolicy) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(role)
+            if breaker is None:
+                breaker = CircuitBreaker(role, policy.breaker_failure_threshold, policy.breaker_reset_seconds)
+                self._breakers[role] = breaker
+            return breaker
+
+    def hedge_delay(self, role: str, policy: ResiliencePolicy) -> Optional[float]:
+        if not policy.hedge_enabled or metrics.count("advisor_ttft_seconds", role=role) < policy.hedge_min_samples:
+            return None
+        threshold = metrics.percentile("advisor_ttft_seconds", policy.hedge_percentile, role=role)
+        return max(threshold, policy.hedge_min_delay_seconds)
+
+    async def stream(self, role: str, make_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        policy = ResiliencePolicy.for_role(role)
+        breaker = self.breaker(role, policy)
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.check()
+            try:
+                stream, first = await self._start(role, make_stream, policy)
+                break
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                breaker.record_failure()
+                metrics.inc("advisor_upstream_errors", role=role)
+                if attempt >= policy.max_attempts:
+                    raise
+                delay = policy.backoff(attempt)
+                print(f"Retrying {role} advisor in {delay:.2f}s after attempt {attempt} failed: {e}")
+                metrics.inc("advisor_retries", role=role)
+                await asyncio.sleep(delay)
+
+        try:
+            if first is not None:
+                yield first
+            async for text in stream:
+                yield text
+            breaker.record_success()
+        except Exception as e:
+            if is_transient(e):
+                breaker.record_failure()
+                metrics.inc("advisor_upstream_errors", role=role)
+            raise
+        finally:
+            await stream.aclose()
+
+    async def _start(
+        self,
+        role: str,
+        make_stream: Callable[[], AsyncIterator[str]],
+        policy: ResiliencePolicy
+    ) -> Tuple[AsyncIterator[str], Optional[str]]:
+        """Start a stream and wait for its first chunk, hedging with a second request if it is slow"""
+        started = time.monotonic()
+        streams = {}
+        primary = make_stream()
+        primary_task = asyncio.ensure_future(_first_chunk(primary))
+        streams[primary_task] = primary
+        pending = {primary_task}
+        delay = self.hedge_delay(role, policy)
+        winner = None
+        error: Optional[BaseException] = None
+        try:
+            if delay is not None:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    metrics.inc("advisor_hedges", role=role)
+                    secondary = make_stream()
+                    hedge = asyncio.ensure_future(_first_chunk(secondary))
+                    streams[hedge] = secondary
+                    pending.add(hedge)
+                pending |= done
+
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None:
+                        winner = finished
+                        break
+                    error = finished.exception()
+                # Failed attempts are finished; only the still-running loser needs cancelling
+                for finished in done:
+                    if finished is not winner:
+                        await streams.pop(finished).aclose()
+        finally:
+            for other in list(streams):
+                if other is not winner:
+                    await _discard(other, streams.pop(other))
+
+        if winner is None:
+            raise error
+        if winner is not primary_task:
+            metrics.inc("advisor_hedges_won", role=role)
+        metrics.observe("advisor_ttft_seconds", time.monotonic() - started, role=role)
+        return streams[winner], winner.result()
+
+
+resilient_caller = ResilientCaller()
@@ -0,0 +1,188 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .config import settings
+from .metrics import metrics
+from ..db.session import SessionLocal
+from ..models.advisor_response import AdvisorResponse
+from ..models.conversation import Conversation
+
+
+def _insert_rows(rows: List[Dict]):
+    db = SessionLocal()
+    try:
+        db.execute(insert(AdvisorResponse), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _insert_each(rows: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """Insert rows one at a time after a bulk insert failed.
+
+    Returns the rows the database rejected (e.g. their conversation was
+    deleted), which will never go in, and the rows left unwritten because
+    of any other error, which may on a later flush.
+    """
+    rejected = []
+    db = SessionLocal()
+    try:
+        for index, row in enumerate(rows):
+            try:
+                db.execute(insert(AdvisorResponse), [row])
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                rejected.append(row)
+            except Exception:
+                # Likely the database itself; don't try the rest one by one
+                db.rollback()
+                return rejected, rows[index:]
+        return rejected, []
+    finally:
+        db.close()
+
+
+class ResponseLogWriter:
+    """Buffers advisor output rows and appends them in bulk.
+
+    Rows are flushed once ``batch_size`` are waiting or ``flush_seconds`` after
+    the first one arrived, whichever comes first, so a streamed answer costs a
+    handful of multi-row INSERTs instead of a commit per chunk or per advisor.
+    Callers that need their rows durable (e.g. before marking a conversation
+    complete) await ``flush``.
+
+    When a bulk insert fails its rows are retried one by one, so a row that
+    can never be inserted doesn't hold back other conversations' output. Rows
+    the database rejects, and rows beyond ten batches still waiting for the
+    database to come back, are dropped and counted in ``response_log_dropped``.
+    """
+
+    def __init__(self, batch_size: int, flush_seconds: float):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._buffer: List[Dict] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def append(self, conversation_id: int, event_id: int, role: str, seq: int, kind: str, text: str):
+        self._buffer.append({
+            "conversation_id": conversation_id,
+            "event_id": event_id,
+            "role": role,
+            "seq": seq,
+            "kind": kind,
+            "text": text
+        })
+        loop = asyncio.get_running_loop()
+        if len(self._buffer) >= self.batch_size:
+            loop.create_task(self.flush())
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_seconds, lambda: loop.create_task(self.flush()))
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # One flush at a time keeps rows of a conversation in insertion order
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(_insert_rows, rows)
+            except Exception as e:
+                print(f"Error writing {len(rows)} advisor response rows, retrying them one by one: {str(e)}")
+                metrics.inc("response_log_errors")
+                try:
+                    rejected, unwritten = await asyncio.to_thread(_insert_each, rows)
+                except Exception:
+                    rejected, unwritten = [], rows
+                self._drop(rejected, "rejected by the database")
+                # Keep the rest for the next flush, within reason
+                room = max(0, self.batch_size * 10 - len(self._buffer))
+                self._buffer[:0] = unwritten[:room]
+                self._drop(unwritten[room:], "too many waiting for the database")
+                metrics.inc("response_log_rows", len(rows) - len(rejected) - len(unwritten))
+                return
+            metrics.inc("response_log_rows", len(rows))
+            metrics.observe("response_log_flush_seconds", time.monotonic() - started)
+
+    def _drop(self, rows: List[Dict], reason: str):
+        if not rows:
+            return
+        metrics.inc("response_log_dropped", len(rows))
+        conversation_ids = sorted({row["conversation_id"] for row in rows})
+        print(f"Dropped {len(rows)} advisor response rows ({reason}) of conversations {conversation_ids}")
+
+
+response_log = ResponseLogWriter(settings.RESPONSE_LOG_BATCH_SIZE, settings.RESPONSE_LOG_FLUSH_SECONDS)
+
+
+def reset_responses(conversation_id: int):
+    """Drop a conversation's logged output before it is generated again (e.g. a retried job)"""
+    db = SessionLocal()
+    try:
+        db.query(AdvisorResponse).filter(AdvisorResponse.conversation_id == conversation_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_response_rows(db: Session, conversation_id: int, after: int = 0) -> List[AdvisorResponse]:
+    return (
+        db.query(AdvisorResponse)
+        .filter(AdvisorResponse.conversation_id == conversation_id, AdvisorResponse.event_id > after)
+        .order_by(AdvisorResponse.event_id)
+        .all()
+    )
+
+
+def assemble_discussions(db: Session, conversations: Sequence[Conversation]) -> Dict[int, Dict]:
+    """Each conversation's discussion with ``responses`` rebuilt from the response log.
+
+    Finished advisors come from their final row; advisors cut off mid-answer
+    (``partial_roles``) are stitched together from their chunks. Conversations
+    stored before the log keep the responses in their JSON.
+    """
+    ids = [conversation.id for conversation in conversations]
+    responses: Dict[int, Dict[str, str]] = {conversation_id: {} for conversation_id in ids}
+    if ids:
+        final_rows = (
+            db.query(AdvisorResponse.conversation_id, AdvisorResponse.role, AdvisorResponse.kind, AdvisorResponse.text)
+            .filter(AdvisorResponse.conversation_id.in_(ids), AdvisorResponse.kind.in_(("done", "error")))
+            .order_by(AdvisorResponse.conversation_id, AdvisorResponse.event_id)
+            .all()
+        )
+        for conversation_id, role, kind, text in final_rows:
+            responses[conversation_id][role] = text if kind == "done" else f"Error: {text}"
+
+        partial = {
+            conversation.id: set((conversation.discussion or {}).get("partial_roles") or ())
+            for conversation in conversations
+        }
+        partial = {conversation_id: roles for conversation_id, roles in partial.items() if roles}
+        if partial:
+            chunk_rows = (
+                db.query(AdvisorResponse.conversation_id, AdvisorResponse.role, AdvisorResponse.text)
+                .filter(AdvisorResponse.conversation_id.in_(list(partial)), AdvisorResponse.kind == "chunk")
+                .order_by(AdvisorResponse.conversation_id, AdvisorResponse.event_id)
+                .all()
+            )
+            for conversation_id, role, text in chunk_rows:
+                if role in partial[conversation_id]:
+                    answers = responses[conversation_id]
+                    answers[role] = answers.get(role, "") + text
+
+    assembled = {}
+    for conversation in conversations:
+        discussion = dict(conversation.discussion or {})
+        discussion["responses"] = {**(discussion.get("responses") or {}), **responses[conversation.id]}
+        assembled[conversation.id] = discussion
+    return assembled
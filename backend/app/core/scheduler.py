@@ -0,0 +1,213 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+from .config import settings
+from .metrics import metrics
+
+
+class QueueFullError(Exception):
+    """Raised at admission when an organization's (or the global) queue is full"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many queued advisor requests, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionTooLargeError(Exception):
+    """Raised at admission when a request needs more slots than could ever be reserved; retrying won't help"""
+
+    def __init__(self, slots: int, capacity: int):
+        super().__init__(f"{slots} advisors exceed the {capacity} generations an organization can queue at once")
+        self.slots = slots
+        self.capacity = capacity
+
+
+@dataclass
+class _Waiter:
+    org_id: int
+    finish_tag: float
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class FairScheduler:
+    """Admission control and weighted fair queuing for LLM generations.
+
+    Requests reserve queue space up front with ``admit`` (failing fast when the
+    organization's or the global queue is full) and then take run slots one
+    generation at a time. At most ``global_limit`` generations run at once, at
+    most ``org_limit`` per organization. When slots free up, waiting
+    organizations are served in order of their virtual finish tags, so an org
+    with weight 2 gets about twice the share of a weight-1 org under load and
+    a busy tenant cannot starve the others.
+    """
+
+    def __init__(
+        self,
+        global_limit: int,
+        org_limit: int,
+        max_queued: int,
+        max_queued_per_org: int,
+        tier_weights: Dict[str, float]
+    ):
+        self.global_limit = global_limit
+        self.org_limit = org_limit
+        self.max_queued = max_queued
+        self.max_queued_per_org = max_queued_per_org
+        self.tier_weights = tier_weights
+        self.running_total = 0
+        self.running: Dict[int, int] = {}
+        self.reserved: Dict[int, int] = {}
+        self.queues: Dict[int, Deque[_Waiter]] = {}
+        self.weights: Dict[int, float] = {}
+        self.last_finish: Dict[int, float] = {}
+        self.virtual_time = 0.0
+        self.avg_hold_seconds = 10.0  # EWMA of slot hold time, used for Retry-After
+
+    @property
+    def capacity(self) -> int:
+        """Most slots a single request can reserve, with every queue empty"""
+        return min(self.org_limit + self.max_queued_per_org, self.global_limit + self.max_queued)
+
+    def check_slots(self, slots: int):
+        if slots > self.capacity:
+            raise AdmissionTooLargeError(slots, self.capacity)
+
+    def admit(self, org_id: int, tier: Optional[str], slots: int) -> "Admission":
+        """Reserve room for ``slots`` generations or raise ``QueueFullError``.
+
+        Raises ``AdmissionTooLargeError`` for requests that could never fit.
+        """
+        self.check_slots(slots)
+        self.weights[org_id] = self.tier_weights.get(tier or "basic", 1.0)
+        org_reserved = self.reserved.get(org_id, 0)
+        total_reserved = sum(self.reserved.values())
+        if (
+            org_reserved + slots > self.org_limit + self.max_queued_per_org
+            or total_reserved + slots > self.global_limit + self.max_queued
+        ):
+            metrics.inc("scheduler_rejected")
+            raise QueueFullError(self._retry_after(org_reserved))
+        self.reserved[org_id] = org_reserved + slots
+        return Admission(self, org_id, slots)
+
+    async def admit_waiting(self, org_id: int, tier: Optional[str], slots: int) -> "Admission":
+        """``admit`` for background work (jobs, batches): wait out a full queue instead of failing.
+
+        ``AdmissionTooLargeError`` still propagates, since no amount of waiting makes room.
+        """
+        while True:
+            try:
+                return self.admit(org_id, tier, slots)
+            except QueueFullError as e:
+                await asyncio.sleep(e.retry_after)
+
+    def _retry_after(self, queued_ahead: int) -> float:
+        backlog = max(queued_ahead, sum(len(q) for q in self.queues.values()))
+        return max(1.0, math.ceil(self.avg_hold_seconds * (backlog + 1) / max(1, self.global_limit)))
+
+    async def acquire(self, org_id: int):
+        weight = self.weights.get(org_id, 1.0)
+        start_tag = max(self.virtual_time, self.last_finish.get(org_id, 0.0))
+        finish_tag = start_tag + 1.0 / weight
+        self.last_finish[org_id] = finish_tag
+
+        waiter = _Waiter(org_id, finish_tag, asyncio.get_running_loop().create_future())
+        self.queues.setdefault(org_id, deque()).append(waiter)
+        self._update_gauges()
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled; hand the slot back
+                self.release(org_id)
+            else:
+                self._remove(waiter)
+            raise
+        metrics.observe("scheduler_wait_seconds", time.monotonic() - waiter.enqueued_at)
+
+    def release(self, org_id: int, held_seconds: Optional[float] = None):
+        self.running_total -= 1
+        self.running[org_id] -= 1
+        if held_seconds is not None:
+            self.avg_hold_seconds = 0.9 * self.avg_hold_seconds + 0.1 * held_seconds
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter):
+        queue = self.queues.get(waiter.org_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+        self._update_gauges()
+
+    def _dispatch(self):
+        while self.running_total < self.global_limit:
+            # Head of line per org with spare per-org capacity, smallest finish tag wins
+            candidates = [
+                queue[0] for org_id, queue in self.queues.items()
+                if queue and self.running.get(org_id, 0) < self.org_limit
+            ]
+            if not candidates:
+                break
+            waiter = min(candidates, key=lambda w: w.finish_tag)
+            self.queues[waiter.org_id].popleft()
+            if waiter.future.done():
+                # Cancelled while queued; its task is about to remove it anyway
+                continue
+            self.virtual_time = max(self.virtual_time, waiter.finish_tag - 1.0 / self.weights.get(waiter.org_id, 1.0))
+            self.running_total += 1
+            self.running[waiter.org_id] = self.running.get(waiter.org_id, 0) + 1
+            waiter.future.set_result(None)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.set_gauge("scheduler_queue_depth", sum(len(q) for q in self.queues.values()))
+        metrics.set_gauge("scheduler_running", self.running_total)
+
+
+class Admission:
+    """Queue space reserved for one request; each generation takes a slot from it"""
+
+    def __init__(self, scheduler: FairScheduler, org_id: int, slots: int):
+        self.scheduler = scheduler
+        self.org_id = org_id
+        self.remaining = slots
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.scheduler.acquire(self.org_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.scheduler.release(self.org_id, time.monotonic() - started)
+            self._consume(1)
+
+    def _consume(self, slots: int):
+        slots = min(slots, self.remaining)
+        self.remaining -= slots
+        self.scheduler.reserved[self.org_id] -= slots
+
+    def close(self):
+        """Return reservations that were never used (cache hits, coalesced streams); idempotent"""
+        self._consume(self.remaining)
+
+
+def clamp_concurrency(requested: Optional[int], limit: int) -> int:
+    """A caller's requested concurrency, between 1 and ``limit``; ``limit`` when none was requested"""
+    if not requested:
+        return limit
+    return max(1, min(requested, limit))
+
+
+scheduler = FairScheduler(
+    global_limit=settings.SCHEDULER_GLOBAL_CONCURRENCY,
+    org_limit=settings.SCHEDULER_ORG_CONCURRENCY,
+    max_queued=settings.SCHEDULER_MAX_QUEUED,
+    max_queued_per_org=settings.SCHEDULER_MAX_QUEUED_PER_ORG,
+    tier_weights=settings.SCHEDULER_TIER_WEIGHTS
+)
@@ -0,0 +1,105 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional
+from .metrics import metrics
+
+
+class BroadcastStream:
+    """Chunks produced once and read by any number of subscribers.
+
+    Every subscriber starts from the first chunk, so late joiners get the part
+    already emitted before following the live output.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.get_running_loop().create_future()
+
+    def _notify(self):
+        if not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = asyncio.get_running_loop().create_future()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[str]:
+        index = start
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            # Shielded: a cancelled subscriber must not cancel the shared future
+            await asyncio.shield(self._changed)
+
+
+class SingleFlight:
+    """Coalesce concurrent identical generations into one upstream stream.
+
+    The first caller for a key starts the producer in its own task; callers
+    arriving while it runs subscribe to the same broadcast. The producer is
+    cancelled once its last subscriber goes away.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, BroadcastStream] = {}
+
+    def stream(self, key: Hashable, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            broadcast = BroadcastStream()
+            self._inflight[key] = broadcast
+            broadcast.task = asyncio.create_task(self._drive(key, broadcast, produce))
+            metrics.inc(f"{self.name}_leaders")
+        else:
+            metrics.inc(f"{self.name}_followers")
+        return self._follow(key, broadcast)
+
+    async def _drive(self, key: Hashable, broadcast: BroadcastStream, produce: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in produce():
+                broadcast.publish(chunk)
+            broadcast.finish()
+        except asyncio.CancelledError as e:
+            broadcast.finish(e)
+            raise
+        except Exception as e:
+            broadcast.finish(e)
+        finally:
+            self._forget(key, broadcast)
+
+    async def _follow(self, key: Hashable, broadcast: BroadcastStream) -> AsyncIterator[str]:
+        broadcast.subscribers += 1
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Nobody is listening any more; stop spending upstream quota
+                self._forget(key, broadcast)
+                broadcast.task.cancel()
+
+    def _forget(self, key: Hashable, broadcast: BroadcastStream):
+        if self._inflight.get(key) is broadcast:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+advisor_flights = SingleFlight("singleflight")
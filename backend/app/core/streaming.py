@@ -0,0 +1,296 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, Iterable, Optional, TypeVar
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from .config import settings
+from .metrics import metrics
+
+T = TypeVar("T")
+
+_END = object()
+_stream_executor: Optional[ThreadPoolExecutor] = None
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _get_stream_executor() -> ThreadPoolExecutor:
+    # Dedicated pool so blocking SDK streams never starve the default executor
+    global _stream_executor
+    if _stream_executor is None:
+        _stream_executor = ThreadPoolExecutor(
+            max_workers=settings.LLM_STREAM_THREADS,
+            thread_name_prefix="llm-stream"
+        )
+    return _stream_executor
+
+
+async def iterate_in_thread(
+    make_iterator: Callable[[], Iterable[T]],
+    maxsize: int = 16,
+    wait_on_close: bool = False
+) -> AsyncGenerator[T, None]:
+    """Drive a blocking iterator on a worker thread and hand its items to the event loop.
+
+    The iterator is created and consumed on the thread, so neither the initial
+    request nor the per-chunk network reads block the loop. Items pass through a
+    bounded queue: when the consumer falls behind, the producer thread waits
+    instead of buffering the whole response. Closing the generator tells the
+    producer to stop after its current item; with ``wait_on_close`` it also
+    waits for that, for iterators reading something the caller releases next.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        try:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        except RuntimeError:
+            # Event loop already closed
+            return False
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except FutureTimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        iterator = None
+        metrics.add_gauge("llm_stream_threads_active", 1)
+        try:
+            iterator = iter(make_iterator())
+            for item in iterator:
+                if stop.is_set() or not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            metrics.add_gauge("llm_stream_threads_active", -1)
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    producer = loop.run_in_executor(_get_stream_executor(), produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        # Free queue slots so a producer blocked on backpressure notices the stop
+        while not queue.empty():
+            queue.get_nowait()
+        if wait_on_close:
+            await asyncio.shield(producer)
+
+
+class EventLoopLagMonitor:
+    """Measure how late the event loop wakes up compared to a fixed timer.
+
+    A healthy loop wakes within a millisecond or so; blocking calls on the loop
+    show up directly as lag in the ``event_loop_lag_seconds`` histogram.
+    """
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            metrics.observe("event_loop_lag_seconds", lag)
+            metrics.set_gauge("event_loop_lag_seconds_last", lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+loop_lag_monitor = EventLoopLagMonitor()
+
+
+async def coalesce_chunks(
+    chunks: AsyncIterator[str],
+    max_bytes: int,
+    max_delay: float,
+    role: str = ""
+) -> AsyncGenerator[str, None]:
+    """Merge small upstream chunks into fewer, larger frames.
+
+    A frame goes out once ``max_bytes`` have accumulated or ``max_delay``
+    seconds after its first chunk arrived, whichever comes first. The very
+    first chunk is passed straight through so time to first token is
+    unaffected. ``stream_source_chunks`` and ``stream_frames`` count both
+    sides, per role, to tune the trade-off.
+    """
+    loop = asyncio.get_running_loop()
+    buffer = []
+    size = 0
+    deadline: Optional[float] = None
+    first = True
+    pending: Optional[asyncio.Future] = None
+
+    def take() -> str:
+        nonlocal size, deadline
+        text = "".join(buffer)
+        buffer.clear()
+        size = 0
+        deadline = None
+        metrics.inc("stream_frames", role=role)
+        return text
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(chunks.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Window expired while upstream is quiet; the pending read carries over
+                yield take()
+                continue
+
+            finished, pending = pending, None
+            try:
+                text = finished.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # Deliver what already arrived before surfacing the error
+                if buffer:
+                    yield take()
+                raise
+            if not text:
+                continue
+            metrics.inc("stream_source_chunks", role=role)
+            buffer.append(text)
+            size += len(text.encode("utf-8"))
+            if first or size >= max_bytes or max_delay <= 0:
+                first = False
+                yield take()
+            elif deadline is None:
+                deadline = loop.time() + max_delay
+        if buffer:
+            yield take()
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+@dataclass(frozen=True)
+class AdvisorFrame:
+    """A tagged piece of one advisor's answer inside the multiplexed board stream"""
+    role: str
+    seq: int
+    text: str
+    kind: str = "chunk"  # "chunk", "done" or "error"
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "role": self.role,
+            "seq": self.seq,
+            "type": self.kind,
+            "text": self.text
+        })
+
+
+async def multiplex_advisors(
+    sources: Dict[str, Callable[[], AsyncIterator[str]]],
+    max_parallel: int,
+    queue_size: int = 64
+) -> AsyncGenerator[AdvisorFrame, None]:
+    """Run advisor streams concurrently and interleave their chunks as tagged frames.
+
+    At most ``max_parallel`` advisors generate at the same time. Chunks are
+    coalesced per advisor (``STREAM_COALESCE_BYTES`` / ``STREAM_COALESCE_MS``)
+    before becoming frames. Every advisor ends with exactly one "done" or
+    "error" frame, so callers can persist per-advisor results as soon as each
+    one finishes.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def pump(role: str, source: Callable[[], AsyncIterator[str]]):
+        seq = 0
+        async with semaphore:
+            try:
+                chunks = coalesce_chunks(
+                    source(),
+                    settings.STREAM_COALESCE_BYTES,
+                    settings.STREAM_COALESCE_MS / 1000,
+                    role
+                )
+                async for text in chunks:
+                    if text:
+                        await queue.put(AdvisorFrame(role, seq, text))
+                        seq += 1
+                await queue.put(AdvisorFrame(role, seq, "", kind="done"))
+            except Exception as e:
+                await queue.put(AdvisorFrame(role, seq, str(e), kind="error"))
+
+    tasks = [asyncio.create_task(pump(role, source)) for role, source in sources.items()]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            frame = await queue.get()
+            if frame.kind != "chunk":
+                remaining -= 1
+            yield frame
+    finally:
+        # Stop any advisor still running, e.g. when the consumer goes away early
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class DisconnectAwareStreamingResponse(StreamingResponse):
+    """StreamingResponse that closes its body generator as soon as the client goes away.
+
+    Starlette already listens for ``http.disconnect`` and cancels the send loop,
+    but a generator parked at ``yield`` is left suspended until it is garbage
+    collected. Closing it here runs its cleanup (cancelling advisor tasks,
+    persisting partial results) immediately.
+    """
+
+    disconnected = False
+
+    async def listen_for_disconnect(self, receive: Receive):
+        await super().listen_for_disconnect(receive)
+        self.disconnected = True
+        metrics.inc("stream_client_disconnects")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -0,0 +1,274 @@
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .config import settings
+from .embedding_service import embedding_service
+from .embeddings import Embedder, get_embedder
+from .metrics import metrics
+from .packing import split_passages
+from .vector_store import OrgVectorFile
+from ..models.document import Document
+from ..models.document_chunk import DocumentChunk
+
+_SYNC_BATCH = 1000  # Embeddings read from the database per query when syncing
+
+
+@dataclass
+class IndexChanges:
+    """Embedding rows written in a transaction, to apply to the vector index once it commits"""
+    added: List[Tuple[int, int, bytes]] = field(default_factory=list)  # (organization_id, id, embedding)
+    removed: List[Tuple[int, int]] = field(default_factory=list)  # (organization_id, id)
+
+
+def document_header(document: Document) -> str:
+    # Same header as select_document_passages, so passages already in a cached prefix match
+    return f"[{document.type}, {document.timestamp}]"
+
+
+def _chunk_ids(db: Session, document_ids: Sequence[int]) -> List[Tuple[int, int]]:
+    return [
+        (row.organization_id, row.id) for row in
+        db.query(DocumentChunk.organization_id, DocumentChunk.id).filter(DocumentChunk.document_id.in_(document_ids))
+    ]
+
+
+def delete_document_chunks(db: Session, document_id: int) -> IndexChanges:
+    """Delete a document's chunks; the caller commits, then applies the returned changes"""
+    changes = IndexChanges(removed=_chunk_ids(db, [document_id]))
+    db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete(synchronize_session=False)
+    return changes
+
+
+def index_documents(db: Session, documents: Sequence[Document]) -> IndexChanges:
+    """Replace the documents' chunks with freshly embedded passages, embedded together.
+
+    The caller commits, then applies the returned changes to ``document_index``.
+    """
+    if not documents:
+        return IndexChanges()
+    document_ids = [document.id for document in documents]
+    changes = IndexChanges(removed=_chunk_ids(db, document_ids))
+    db.query(DocumentChunk).filter(DocumentChunk.document_id.in_(document_ids)).delete(synchronize_session=False)
+    chunks = [
+        (document, position, f"{document_header(document)} {passage}", passage)
+        for document in documents
+        for position, passage in enumerate(split_passages(document.content or "", settings.CONTEXT_PASSAGE_TOKENS))
+    ]
+    if not chunks:
+        return changes
+    vectors = embedding_service.embed(db, [passage for _, _, _, passage in chunks])
+    model = get_embedder().name
+    rows = [
+        DocumentChunk(
+            document_id=document.id,
+            organization_id=document.organization_id,
+            position=position,
+            text=text,
+            embedding_model=model,
+            embedding=vector.tobytes()
+        )
+        for (document, position, text, _), vector in zip(chunks, vectors)
+    ]
+    db.add_all(rows)
+    # Assigns the ids the vector index stores
+    db.flush()
+    changes.added = [(row.organization_id, row.id, row.embedding) for row in rows]
+    metrics.inc("document_chunks_indexed", len(rows))
+    return changes
+
+
+def reindex_org(db: Session, org_id: int) -> Dict[str, float]:
+    """Re-embed every document of the org with the current model, committing a group of documents at a time.
+
+    Searches keep working throughout: each group's old chunks are replaced in
+    the same transaction as its new ones.
+    """
+    started = time.monotonic()
+    document_ids = [
+        row.id for row in
+        db.query(Document.id)
+        .filter(Document.organization_id == org_id, Document.content.isnot(None))
+        .order_by(Document.id)
+        .all()
+    ]
+    chunks = 0
+    group = max(1, settings.EMBEDDING_REINDEX_DOCUMENTS)
+    for start in range(0, len(document_ids), group):
+        documents = db.query(Document).filter(Document.id.in_(document_ids[start:start + group])).all()
+        changes = index_documents(db, documents)
+        db.commit()
+        document_index.apply(changes)
+        chunks += len(changes.added)
+    elapsed = time.monotonic() - started
+    stats = {
+        "documents": len(document_ids),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(chunks / elapsed, 1) if elapsed > 0 else 0.0
+    }
+    metrics.observe("document_reindex_chunks_per_second", stats["chunks_per_second"])
+    print(f"Re-indexed organization {org_id}: {stats}")
+    return stats
+
+
+@dataclass(frozen=True)
+class PassageHit:
+    chunk_id: int
+    document_id: int
+    text: str
+    score: float
+
+
+class VectorIndex:
+    """Per-org vector index over an embeddings table, kept in memory-mapped files (see ``OrgVectorFile``).
+
+    Searches run over the mapped matrix, shared by all workers on the host,
+    instead of loading every embedding from the database. The table stays
+    the source of truth: writers ``apply`` their changes after committing,
+    which bumps the file's ``meta.json`` version so every worker on the host
+    sees them on its next search without touching the database. At most every
+    ``VECTOR_INDEX_SYNC_SECONDS`` a search also compares a (count, max id)
+    signature of the org's rows with the file's live rows and syncs the file
+    when they differ (rows written by another host, or by a worker that died
+    before applying).
+    Subclasses name the table (``model``, with ``id``, ``organization_id``,
+    ``embedding_model`` and ``embedding`` columns) and the ``payload``
+    columns returned by a search, read for the hits only.
+    """
+
+    name = "vector_index"
+    model: type
+    payload: Tuple = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Guards the dicts below, not the files
+        self._files: Dict[Tuple[int, str], OrgVectorFile] = {}
+        self._org_locks: Dict[Tuple[int, str], threading.Lock] = {}
+        self._checked_at: Dict[Tuple[int, str], float] = {}
+
+    def _file(self, org_id: int, embedder: Embedder) -> Tuple[OrgVectorFile, threading.Lock]:
+        """The org's file and the lock serializing its database checks"""
+        with self._lock:
+            key = (org_id, embedder.name)
+            if key not in self._files:
+                model = re.sub(r"[^A-Za-z0-9._-]", "_", embedder.name)
+                self._files[key] = OrgVectorFile(
+                    os.path.join(settings.VECTOR_INDEX_DIR, self.name, model, str(org_id)), embedder.dim
+                )
+                self._org_locks[key] = threading.Lock()
+            return self._files[key], self._org_locks[key]
+
+    def _signature(self, db: Session, org_id: int, model: str) -> Tuple[int, int]:
+        count, highest = (
+            db.query(func.count(self.model.id), func.max(self.model.id))
+            .filter(self.model.organization_id == org_id, self.model.embedding_model == model)
+            .one()
+        )
+        return count, highest or 0
+
+    def _sync(self, db: Session, org_id: int, embedder: Embedder, org_file: OrgVectorFile):
+        started = time.monotonic()
+        table_ids = np.array([
+            row.id for row in
+            db.query(self.model.id)
+            .filter(self.model.organization_id == org_id, self.model.embedding_model == embedder.name)
+        ], dtype=np.int64)
+        live_ids = org_file.snapshot().live_ids
+        org_file.remove(np.setdiff1d(live_ids, table_ids))
+        missing = np.setdiff1d(table_ids, live_ids)
+        for start in range(0, len(missing), _SYNC_BATCH):
+            rows = (
+                db.query(self.model.id, self.model.embedding)
+                .filter(self.model.id.in_(missing[start:start + _SYNC_BATCH].tolist()))
+                .all()
+            )
+            org_file.append(
+                np.array([row.id for row in rows], dtype=np.int64),
+                np.array([np.frombuffer(row.embedding, dtype=np.float32) for row in rows]).reshape(-1, embedder.dim)
+            )
+        metrics.inc("vector_index_syncs", index=self.name)
+        metrics.observe("vector_index_sync_seconds", time.monotonic() - started, index=self.name)
+
+    def org_file(self, db: Session, org_id: int, embedder: Embedder) -> OrgVectorFile:
+        org_file, org_lock = self._file(org_id, embedder)
+        key = (org_id, embedder.name)
+        # Only searches of the same org wait for its check and sync
+        with org_lock:
+            now = time.monotonic()
+            if now - self._checked_at.get(key, float("-inf")) >= settings.VECTOR_INDEX_SYNC_SECONDS:
+                self._checked_at[key] = now
+                if org_file.snapshot().signature != self._signature(db, org_id, embedder.name):
+                    self._sync(db, org_id, embedder, org_file)
+        return org_file
+
+    def apply(self, changes: IndexChanges):
+        """Make committed inserts and deletes searchable without waiting for a sync"""
+        embedder = get_embedder()
+        try:
+            removed: Dict[int, List[int]] = {}
+            for org_id, row_id in changes.removed:
+                removed.setdefault(org_id, []).append(row_id)
+            for org_id, row_ids in removed.items():
+                self._file(org_id, embedder)[0].remove(np.array(row_ids, dtype=np.int64))
+
+            added: Dict[int, List[Tuple[int, bytes]]] = {}
+            for org_id, row_id, embedding in changes.added:
+                added.setdefault(org_id, []).append((row_id, embedding))
+            for org_id, rows in added.items():
+                self._file(org_id, embedder)[0].append(
+                    np.array([row_id for row_id, _ in rows], dtype=np.int64),
+                    np.array([np.frombuffer(embedding, dtype=np.float32) for _, embedding in rows])
+                )
+        except Exception as e:
+            # The next search notices the mismatch and syncs from the database
+            print(f"Could not update vector index {self.name}: {str(e)}")
+            metrics.inc("vector_index_apply_errors", index=self.name)
+
+    def search(self, db: Session, org_id: int, topics: Sequence[str], k: int) -> List[List[Tuple[float, tuple]]]:
+        """Top ``k`` ``(score, payload)`` pairs of the org by cosine similarity, for each topic"""
+        if not topics:
+            return []
+        return self.search_vectors(db, org_id, get_embedder().embed(topics), k)
+
+    def search_vectors(self, db: Session, org_id: int, queries: np.ndarray, k: int) -> List[List[Tuple[float, tuple]]]:
+        """``search`` with the topics already embedded, one query per row"""
+        org_file = self.org_file(db, org_id, get_embedder())
+        if not len(queries):
+            return []
+
+        started = time.monotonic()
+        hits = org_file.search(queries, k)
+        metrics.observe("vector_search_seconds", time.monotonic() - started, index=self.name)
+        hit_ids = {row_id for topic_hits in hits for _, row_id in topic_hits}
+        if not hit_ids:
+            return [[] for _ in hits]
+        payloads = {
+            row[0]: tuple(row[1:]) for row in
+            db.query(self.model.id, *self.payload).filter(self.model.id.in_(hit_ids))
+        }
+        # Rows deleted since the file was last synced have no payload
+        return [
+            [(score, payloads[row_id]) for score, row_id in topic_hits if row_id in payloads]
+            for topic_hits in hits
+        ]
+
+
+class DocumentIndex(VectorIndex):
+    name = "documents"
+    model = DocumentChunk
+    payload = (DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.text)
+
+    def search_passages(self, db: Session, org_id: int, queries: np.ndarray, k: int) -> List[List[PassageHit]]:
+        return [
+            [PassageHit(chunk_id, document_id, text, score) for score, (chunk_id, document_id, text) in hits]
+            for hits in self.search_vectors(db, org_id, queries, k)
+        ]
+
+
+document_index = DocumentIndex()
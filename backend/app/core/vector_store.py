@@ -0,0 +1,287 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from .config import settings
+
+_BLOCK_ROWS = 65536  # Rows scored per matrix product, bounding the float32 copy of float16 blocks
+_KMEANS_ITERATIONS = 8
+_KMEANS_SAMPLE_PER_LIST = 64
+
+
+@dataclass(frozen=True)
+class _Ann:
+    """Inverted file (IVF): rows grouped by their nearest centroid"""
+    centroids: np.ndarray  # (lists, dim), normalized
+    order: np.ndarray  # Row numbers grouped by list
+    offsets: np.ndarray  # List i is order[offsets[i]:offsets[i + 1]]
+    rows: int  # Rows that existed when it was built; later appends are scanned exhaustively
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int  # meta.json version when mapped
+    rows: int
+    matrix: Optional[np.ndarray]  # Memory-mapped (rows, dim); None while empty
+    ids: np.ndarray  # Row id in the source table, per row
+    live: np.ndarray  # False for tombstoned rows
+    ann: Optional[_Ann]
+
+    @property
+    def live_ids(self) -> np.ndarray:
+        return self.ids[self.live]
+
+    @property
+    def signature(self) -> Tuple[int, int]:
+        live_ids = self.live_ids
+        return len(live_ids), int(live_ids.max()) if len(live_ids) else 0
+
+
+def _train_ivf(matrix: np.ndarray, rows: np.ndarray, lists: int) -> _Ann:
+    """Spherical k-means on a sample of ``rows``, then every row assigned to its nearest centroid"""
+    rng = np.random.default_rng(0)
+    sample = rng.choice(rows, min(len(rows), lists * _KMEANS_SAMPLE_PER_LIST), replace=False)
+    data = np.asarray(matrix[np.sort(sample)], dtype=np.float32)
+    centroids = data[rng.choice(len(data), lists, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # An empty list keeps its old centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+
+    assignment = np.concatenate([
+        np.argmax(np.asarray(matrix[rows[start:start + _BLOCK_ROWS]], dtype=np.float32) @ centroids.T, axis=1)
+        for start in range(0, len(rows), _BLOCK_ROWS)
+    ])
+    grouped = np.argsort(assignment, kind="stable")
+    offsets = np.searchsorted(assignment[grouped], np.arange(lists + 1))
+    return _Ann(centroids, rows[grouped].astype(np.int64), offsets.astype(np.int64), len(matrix))
+
+
+class OrgVectorFile:
+    """One organization's vectors on disk, memory-mapped by every worker on the host.
+
+    The directory holds, per generation ``g``:
+
+    - ``vectors-g.bin``: contiguous row-major matrix, float32 or float16
+    - ``ids-g.bin``: int64 source-table id of each row
+    - ``tombstones-g.bin``: int64 numbers of deleted rows
+    - ``ann-g-n.npz``: optional IVF index built over the first ``n`` rows
+
+    and ``meta.json`` with a version, the generation and how many rows and
+    tombstones are valid. Writers take an exclusive ``flock``, append to the files and
+    then atomically replace ``meta.json``; readers map only the rows
+    ``meta.json`` counts, so they never see a partial append. Compaction
+    writes the live rows to the next generation and deletes the old files;
+    workers still mapping them keep reading until they notice the new
+    ``meta.json`` (an unlinked file stays readable while it is mapped).
+    Pages live in the OS page cache, shared by all workers, not copied
+    into each process.
+    """
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self._snapshot: Optional[_Snapshot] = None
+        self._ann_cache: Dict[str, _Ann] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path("lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Dict:
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {
+                "version": 0, "generation": 0, "rows": 0, "tombstones": 0,
+                "dtype": settings.VECTOR_INDEX_DTYPE, "ann": None
+            }
+
+    def _write_meta(self, meta: Dict):
+        meta = {**meta, "version": self._read_meta()["version"] + 1}
+        temporary = self._path("meta.json.tmp")
+        with open(temporary, "w") as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._path("meta.json"))
+
+    def _append_file(self, name: str, valid_bytes: int, data: bytes):
+        with open(self._path(name), "ab") as f:
+            # Drop anything past the valid rows, left by a writer that died before updating meta.json
+            f.truncate(valid_bytes)
+            f.write(data)
+
+    def _load_ann(self, name: Optional[str]) -> Optional[_Ann]:
+        if name is None:
+            return None
+        if name not in self._ann_cache:
+            with np.load(self._path(name)) as data:
+                self._ann_cache = {name: _Ann(
+                    data["centroids"], data["order"], data["offsets"], int(data["rows"])
+                )}
+        return self._ann_cache[name]
+
+    def _map(self, meta: Dict) -> _Snapshot:
+        generation, rows = meta["generation"], meta["rows"]
+        matrix = None
+        ids = np.zeros(0, dtype=np.int64)
+        live = np.zeros(0, dtype=bool)
+        if rows:
+            matrix = np.memmap(
+                self._path(f"vectors-{generation}.bin"), dtype=meta["dtype"], mode="r", shape=(rows, self.dim)
+            )
+            ids = np.memmap(self._path(f"ids-{generation}.bin"), dtype=np.int64, mode="r", shape=(rows,))
+            live = np.ones(rows, dtype=bool)
+            if meta["tombstones"]:
+                live[np.fromfile(self._path(f"tombstones-{generation}.bin"), dtype=np.int64, count=meta["tombstones"])] = False
+        return _Snapshot(meta["version"], rows, matrix, ids, live, self._load_ann(meta["ann"]))
+
+    def snapshot(self) -> _Snapshot:
+        """The current contents; remapped only when a write has bumped the ``meta.json`` version"""
+        with self._lock:
+            for attempt in range(3):
+                meta = self._read_meta()
+                if self._snapshot is not None and self._snapshot.version == meta["version"]:
+                    break
+                try:
+                    self._snapshot = self._map(meta)
+                    break
+                except FileNotFoundError:
+                    # Compacted between reading meta.json and mapping its files
+                    if attempt == 2:
+                        raise
+            return self._snapshot
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray) -> int:
+        """Add rows for ids not already live; returns how many were added"""
+        with self._write_lock():
+            snapshot = self.snapshot()
+            keep = ~np.isin(ids, snapshot.live_ids)
+            ids, vectors = ids[keep], vectors[keep]
+            if not len(ids):
+                return 0
+            meta = self._read_meta()
+            generation, rows = meta["generation"], meta["rows"]
+            vectors = np.ascontiguousarray(vectors, dtype=meta["dtype"])
+            self._append_file(f"vectors-{generation}.bin", rows * self.dim * vectors.itemsize, vectors.tobytes())
+            self._append_file(f"ids-{generation}.bin", rows * 8, ids.astype(np.int64).tobytes())
+            meta["rows"] += len(ids)
+            self._write_meta(meta)
+            self._maintain()
+            return len(ids)
+
+    def remove(self, ids: np.ndarray) -> int:
+        """Tombstone the live rows of ``ids``; returns how many were removed"""
+        with self._write_lock():
+            snapshot = self.snapshot()
+            rows = np.nonzero(snapshot.live & np.isin(snapshot.ids, ids))[0]
+            if not len(rows):
+                return 0
+            meta = self._read_meta()
+            self._append_file(
+                f"tombstones-{meta['generation']}.bin", meta["tombstones"] * 8, rows.astype(np.int64).tobytes()
+            )
+            meta["tombstones"] += len(rows)
+            self._write_meta(meta)
+            self._maintain()
+            return len(rows)
+
+    def _maintain(self):
+        """Compact when tombstones pile up; (re)build the IVF index once it is worth it. Holds the write lock."""
+        meta = self._read_meta()
+        snapshot = self.snapshot()
+        if meta["tombstones"] > settings.VECTOR_INDEX_COMPACT_RATIO * meta["rows"]:
+            self._compact(meta, snapshot)
+            return
+        live = meta["rows"] - meta["tombstones"]
+        ann_rows = snapshot.ann.rows if snapshot.ann else 0
+        if (
+            settings.VECTOR_INDEX_ANN_MIN_ROWS
+            and live >= settings.VECTOR_INDEX_ANN_MIN_ROWS
+            and meta["rows"] - ann_rows > 0.1 * max(ann_rows, 1)
+        ):
+            self._build_ann(meta, snapshot)
+
+    def _compact(self, meta: Dict, snapshot: _Snapshot):
+        old = meta["generation"]
+        generation = old + 1
+        live_rows = np.nonzero(snapshot.live)[0]
+        dtype = settings.VECTOR_INDEX_DTYPE
+        with open(self._path(f"vectors-{generation}.bin"), "wb") as f:
+            for start in range(0, len(live_rows), _BLOCK_ROWS):
+                f.write(np.ascontiguousarray(snapshot.matrix[live_rows[start:start + _BLOCK_ROWS]], dtype=dtype).tobytes())
+        with open(self._path(f"ids-{generation}.bin"), "wb") as f:
+            f.write(np.ascontiguousarray(snapshot.ids[live_rows], dtype=np.int64).tobytes())
+        self._write_meta({**meta, "generation": generation, "rows": len(live_rows), "tombstones": 0, "dtype": dtype, "ann": None})
+        for name in os.listdir(self.directory):
+            if name.startswith((f"vectors-{old}.", f"ids-{old}.", f"tombstones-{old}.", f"ann-{old}-")):
+                os.unlink(self._path(name))
+        if settings.VECTOR_INDEX_ANN_MIN_ROWS and len(live_rows) >= settings.VECTOR_INDEX_ANN_MIN_ROWS:
+            self._build_ann(self._read_meta(), self.snapshot())
+
+    def _build_ann(self, meta: Dict, snapshot: _Snapshot):
+        live_rows = np.nonzero(snapshot.live)[0]
+        ann = _train_ivf(snapshot.matrix, live_rows, max(1, int(np.sqrt(len(live_rows)))))
+        name = f"ann-{meta['generation']}-{snapshot.rows}.npz"
+        with open(self._path(name), "wb") as f:
+            np.savez(f, centroids=ann.centroids, order=ann.order, offsets=ann.offsets, rows=snapshot.rows)
+        previous = meta["ann"]
+        meta["ann"] = name
+        self._write_meta(meta)
+        if previous:
+            os.unlink(self._path(previous))
+
+    def search(self, queries: np.ndarray, k: int) -> List[List[Tuple[float, int]]]:
+        """Top ``k`` ``(score, id)`` pairs by dot product for each query row"""
+        snapshot = self.snapshot()
+        live_count = int(snapshot.live.sum())
+        if snapshot.matrix is None or not live_count:
+            return [[] for _ in range(len(queries))]
+        if snapshot.ann is not None:
+            return [self._search_ann(snapshot, query, k) for query in queries]
+
+        scores = np.empty((len(queries), snapshot.rows), dtype=np.float32)
+        for start in range(0, snapshot.rows, _BLOCK_ROWS):
+            block = np.asarray(snapshot.matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        scores[:, ~snapshot.live] = -np.inf
+        k = min(k, live_count)
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(float(row[i]), int(snapshot.ids[i])) for i in top])
+        return results
+
+    def _search_ann(self, snapshot: _Snapshot, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        ann = snapshot.ann
+        probes = np.argsort(-(ann.centroids @ query))[:settings.VECTOR_INDEX_ANN_PROBES]
+        candidates = np.concatenate(
+            [ann.order[ann.offsets[i]:ann.offsets[i + 1]] for i in probes]
+            + [np.arange(ann.rows, snapshot.rows)]
+        )
+        candidates = np.sort(candidates[snapshot.live[candidates]])
+        if not len(candidates):
+            return []
+        scores = np.asarray(snapshot.matrix[candidates], dtype=np.float32) @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(snapshot.ids[candidates[i]])) for i in top]
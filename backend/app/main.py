@@ -1,6 +1,14 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
+from .core.embedding_service import embedding_service
+from .core.history_index import conversation_indexer
+from .core.jobs import job_worker
+from .core.llm import close_provider, get_provider
+from .core.metrics import metrics
+from .core.response_log import response_log
+from .core.streaming import loop_lag_monitor
 from .routes import auth, advisors, documents, personalities
 
 app = FastAPI(
@@ -30,6 +38,66 @@ app.include_router(auth.router, prefix=settings.API_V1_STR + "/auth", tags=["aut
 app.include_router(advisors.router, prefix=settings.API_V1_STR + "/advisors", tags=["advisors"])
 app.include_router(documents.router, prefix="/api/v1/documents", tags=["documents"])
 
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag_monitor.start()
+
+@app.on_event("startup")
+async def warm_llm_provider():
+    # Build the provider off the loop without delaying readiness; requests that
+    # arrive first simply build it themselves
+    if settings.LLM_WARMUP_ON_STARTUP:
+        asyncio.get_running_loop().run_in_executor(None, _warm_provider)
+
+def _warm_provider():
+    try:
+        get_provider()
+    except Exception as e:
+        print(f"LLM provider warm-up failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_job_worker():
+    # Queued analysis jobs survive restarts in the database; this picks them back up
+    if settings.JOBS_WORKER_ENABLED:
+        job_worker.start()
+
+@app.on_event("startup")
+async def start_conversation_indexer():
+    if settings.CONVERSATION_INDEX_ENABLED:
+        conversation_indexer.start()
+
+@app.on_event("shutdown")
+async def stop_loop_lag_monitor():
+    await loop_lag_monitor.stop()
+
+@app.on_event("shutdown")
+async def stop_job_worker():
+    # Jobs still running go back to the queue for another worker
+    await job_worker.stop()
+
+@app.on_event("shutdown")
+async def stop_conversation_indexer():
+    await conversation_indexer.stop()
+
+@app.on_event("shutdown")
+async def stop_embedding_workers():
+    embedding_service.shutdown()
+
+@app.on_event("shutdown")
+async def flush_response_log():
+    # Buffered advisor output would otherwise be lost with the process
+    await response_log.flush()
+
+@app.on_event("shutdown")
+async def close_llm_provider():
+    # Hands this worker's unused share of the shared quota back to the others
+    await asyncio.to_thread(close_provider)
+
+@app.get(settings.API_V1_STR + "/metrics")
+def get_metrics():
+    """In-process metrics snapshot for this worker"""
+    return metrics.snapshot()
+
 @app.get("/")
 def root():
     return {"message": "Welcome to AI Advisory Board API"}
\ No newline at end of file
@@ -2,4 +2,10 @@ from .user import User
 from .organization import Organization
 from .document import Document
 from .conversation import Conversation
-from .personality import Personality
\ No newline at end of file
+from .personality import Personality
+from .rate_limit import RateLimitBucket
+from .analysis_job import AnalysisJob
+from .advisor_response import AdvisorResponse
+from .document_chunk import DocumentChunk
+from .conversation_embedding import ConversationEmbedding
+from .embedding_cache import EmbeddingCache
\ No newline at end of file
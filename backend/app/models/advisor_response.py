@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+class AdvisorResponse(Base):
+    """Append-only log of advisor output: streamed chunks plus one final row per advisor"""
+    __tablename__ = "advisor_responses"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    event_id = Column(Integer, nullable=False)  # SSE event id within the conversation
+    role = Column(String, nullable=False)
+    seq = Column(Integer, nullable=False)  # Position within the advisor's answer
+    kind = Column(String, nullable=False)  # "chunk", "done" (text is the full answer) or "error"
+    text = Column(Text, nullable=False, default="")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_advisor_responses_conversation_event", "conversation_id", "event_id"),
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Index
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+class ConversationEmbedding(Base):
+    """Embedding of a finished conversation's topic and synthesis, for history retrieval"""
+    __tablename__ = "conversation_embeddings"
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, unique=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    embedding_model = Column(String, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32, L2-normalized
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_conversation_embeddings_org_model", "organization_id", "embedding_model"),
+    )
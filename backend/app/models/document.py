@@ -14,6 +14,7 @@ class Document(Base):
     doc_metadata = Column(JSON, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     organization_id = Column(Integer, ForeignKey("organizations.id"))
+    # search_vector: tsvector of content generated by Postgres for full-text search, not mapped here
 
     # Relationships
     organization = relationship("Organization", back_populates="documents")
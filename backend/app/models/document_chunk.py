@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, Index
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+class DocumentChunk(Base):
+    """A retrieval passage of a document with its embedding"""
+    __tablename__ = "document_chunks"
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    position = Column(Integer, nullable=False)  # Order within the document
+    text = Column(Text, nullable=False)  # Passage as packed into prompts, with its document header
+    embedding_model = Column(String, nullable=False)  # Vectors from different models are not comparable
+    embedding = Column(LargeBinary, nullable=False)  # float32, L2-normalized
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # search_vector: tsvector of text generated by Postgres for full-text search, not mapped here
+
+    __table_args__ = (
+        Index("ix_document_chunks_org_model", "organization_id", "embedding_model"),
+    )
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, DateTime, LargeBinary, PrimaryKeyConstraint
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+class EmbeddingCache(Base):
+    """Embedding of a passage keyed by its content hash, shared across documents and organizations"""
+    __tablename__ = "embedding_cache"
+
+    embedding_model = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=False)  # SHA-256 hex of the embedded text
+    embedding = Column(LargeBinary, nullable=False)  # float32, L2-normalized
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint("embedding_model", "content_hash"),
+    )
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, Float
+from ..db.session import Base
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+
+    name = Column(String, primary_key=True)  # e.g. "gemini:gemini-1.5-flash:tokens"
+    tokens = Column(Float, nullable=False)  # Tokens left as of updated_at
+    updated_at = Column(Float, nullable=False)  # Unix time of the last refill
@@ -0,0 +1,37 @@
+"""Re-embed the documents of one or all organizations.
+
+    python -m app.reindex --org 3
+    python -m app.reindex --all
+
+Run after changing ``EMBEDDING_PROVIDER`` or ``EMBEDDING_MODEL``, or once to
+embed documents uploaded before retrieval indexing existed; set
+``EMBEDDING_WORKERS`` to the number of cores to spread the model over them.
+Large orgs are better re-indexed here than through ``POST /documents/reindex``,
+which holds the request open until it is done.
+"""
+import argparse
+from .core.embedding_service import embedding_service
+from .core.vector_index import reindex_org
+from .db.session import SessionLocal
+from .models.organization import Organization
+
+
+def main(org_ids):
+    db = SessionLocal()
+    try:
+        if org_ids is None:
+            org_ids = [row.id for row in db.query(Organization.id).order_by(Organization.id).all()]
+        for org_id in org_ids:
+            reindex_org(db, org_id)
+    finally:
+        db.close()
+        embedding_service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed organization documents for retrieval")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--org", type=int, action="append", help="Organization id; may be repeated")
+    target.add_argument("--all", action="store_true", help="Every organization")
+    args = parser.parse_args()
+    main(None if args.all else args.org)
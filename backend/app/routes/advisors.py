@@ -1,25 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from typing import List, AsyncGenerator
+from typing import Dict, List, AsyncIterator, Optional
 from ..core.advisors import AIAdvisor
-from ..schemas.advisors import ConversationCreate, ConversationResponse
+from ..core.audio import AudioTooLargeError, receive_audio, stream_audio_analysis
+from ..core.batch import BatchItem, create_conversations, run_batch
+from ..core.board import board_runs, stream_live, stream_persisted
+from ..core.config import settings
+from ..core.context import load_context, load_contexts
+from ..core.jobs import job_worker
+from ..core.registry import advisor_registry
+from ..core.response_log import assemble_discussions
+from ..core.scheduler import Admission, AdmissionTooLargeError, QueueFullError, clamp_concurrency, scheduler
+from ..core.streaming import DisconnectAwareStreamingResponse
+from ..schemas.advisors import AnalysisJobResponse, BatchAnalysisCreate, ConversationCreate, ConversationResponse
+from ..models.analysis_job import AnalysisJob
 from ..models.conversation import Conversation
 from ..models.user import User
-from ..db.session import get_db, SessionLocal
+from ..db.session import get_db
 from ..core.security import get_current_user
-from ..models.personality import Personality
-from fastapi.responses import StreamingResponse
 import json
 import traceback
 
 router = APIRouter()
 
-# Initialize advisors
-ADVISORS = {
-    "legal": AIAdvisor("legal"),
-    "financial": AIAdvisor("financial"),
-    "technology": AIAdvisor("technology")
-}
+def resolve_advisors(db: Session, org_id: int, roles: List[str]) -> Dict[str, AIAdvisor]:
+    """The organization's advisors, after checking that every requested role exists and could ever be admitted"""
+    if not roles:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one advisor role must be specified"
+        )
+    try:
+        scheduler.check_slots(len(roles))
+    except AdmissionTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # Ready advisors for the organization, rebuilt only when personalities change
+    advisors = advisor_registry.get_advisors(db, org_id)
+    invalid_roles = [role for role in roles if role not in advisors]
+    if invalid_roles:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid advisor roles: {', '.join(invalid_roles)}"
+        )
+    return advisors
+
+def admit_or_429(current_user: User, slots: int) -> Admission:
+    """Reserve generation capacity up front, so overload fails fast with a 429 instead of timing out mid-stream"""
+    organization = current_user.organization
+    try:
+        return scheduler.admit(
+            current_user.organization_id,
+            organization.subscription_tier if organization else None,
+            slots
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after))}
+        )
 
 @router.post("/analyze")
 async def get_analysis(
@@ -28,123 +68,66 @@ async def get_analysis(
     db: Session = Depends(get_db)
 ):
     """Get analysis from specified advisors"""
+    context_task = None
+    admission = None
     try:
         # Validate request
-        if not request.advisor_roles:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="At least one advisor role must be specified"
-            )
-        
         if not request.topic:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Topic cannot be empty"
             )
 
-        # Get custom personalities for the organization
-        custom_personalities = db.query(Personality).filter(
-            Personality.organization_id == current_user.organization_id
-        ).all()
-        
-        # Create dynamic advisors dictionary combining default and custom
-        advisors = {
-            "legal": AIAdvisor("legal", db, current_user.organization_id),
-            "financial": AIAdvisor("financial", db, current_user.organization_id),
-            "technology": AIAdvisor("technology", db, current_user.organization_id)
-        }
-        
-        # Add custom personalities to advisors
-        for personality in custom_personalities:
-            advisors[personality.name] = AIAdvisor(personality.name, db, current_user.organization_id)
-        
-        # Validate advisor roles
-        invalid_roles = [role for role in request.advisor_roles if role not in advisors]
-        if invalid_roles:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid advisor roles: {', '.join(invalid_roles)}"
-            )
+        # Start retrieval now so it overlaps with the rest of the request setup;
+        # the result is shared by every advisor
+        context_task = asyncio.create_task(
+            load_context(current_user.organization_id, request.topic)
+        )
+
+        advisors = resolve_advisors(db, current_user.organization_id, request.advisor_roles)
+        admission = admit_or_429(current_user, len(request.advisor_roles))
 
         # Create conversation record
         conversation = Conversation(
             topic=request.topic,
             organization_id=current_user.organization_id,
-            discussion={"responses": {}, "complete": False}
+            discussion={"complete": False, "status": "running"}
         )
         db.add(conversation)
         db.commit()
         db.refresh(conversation)
 
-        async def generate_response():
-            # Create a new session for the streaming context
-            async_db = SessionLocal()
-            try:
-                # Get fresh instances from the new session
-                async_conversation = async_db.merge(conversation)
-                async_user = async_db.merge(current_user)
-                
-                full_responses = {}
-                for role in request.advisor_roles:
-                    try:
-                        advisor = advisors[role]
-                        response_header = f"### {role.upper()} ADVISOR:\n\n"
-                        yield response_header.encode('utf-8')
-                        
-                        full_response = ""
-                        async for chunk in advisor.get_analysis(
-                            request.topic, 
-                            async_db,
-                            async_user.organization_id
-                        ):
-                            if chunk:
-                                chunk_bytes = chunk.encode('utf-8')
-                                yield chunk_bytes
-                                full_response += chunk
-                        
-                        yield b"\n\n"
-                        full_responses[role] = full_response
-
-                        # Update conversation in database after each advisor
-                        async_conversation.discussion["responses"] = full_responses
-                        async_db.commit()
-
-                    except Exception as advisor_error:
-                        error_msg = f"\nError from {role} advisor: {str(advisor_error)}\n"
-                        print(f"Advisor error: {error_msg}\n{traceback.format_exc()}")
-                        yield error_msg.encode('utf-8')
-                        full_responses[role] = f"Error: {str(advisor_error)}"
-                        continue
-
-            except Exception as e:
-                error_msg = f"Error generating response: {str(e)}\n{traceback.format_exc()}"
-                print(error_msg)
-                yield error_msg.encode('utf-8')
-            finally:
-                try:
-                    # Mark conversation as complete and close session
-                    if 'async_conversation' in locals():
-                        async_conversation.discussion["complete"] = True
-                        async_db.commit()
-                except Exception as cleanup_error:
-                    print(f"Error during cleanup: {str(cleanup_error)}")
-                finally:
-                    async_db.close()
-
-        return StreamingResponse(
-            generate_response(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
+        # Bound how many advisors hit the model at once for this request
+        max_parallel = clamp_concurrency(request.max_parallel, settings.ADVISOR_MAX_PARALLELISM)
+
+        conversation_id = conversation.id
+        # Done with the request session; don't keep its connection checked out for the whole stream
+        db.close()
+
+        # Generation runs on its own so a dropped client can reattach and resume
+        run = board_runs.start(
+            conversation_id,
+            advisors,
+            list(request.advisor_roles),
+            context_task,
+            admission,
+            request.use_cache,
+            max_parallel
         )
+        return sse_response(stream_live(run), conversation_id)
         
     except HTTPException as http_ex:
+        if context_task:
+            context_task.cancel()
+        if admission:
+            admission.close()
         # Re-raise HTTP exceptions
         raise http_ex
     except Exception as e:
+        if context_task:
+            context_task.cancel()
+        if admission:
+            admission.close()
         error_detail = f"Error: {str(e)}\n{traceback.format_exc()}"
         print(error_detail)  # Log the full error
         raise HTTPException(
@@ -152,6 +135,256 @@ async def get_analysis(
             detail=f"Internal server error: {str(e)}"
         )
 
+@router.post("/analyze/audio")
+async def analyze_audio(
+    request: Request,
+    advisor_roles: List[str] = Query(...),
+    use_cache: bool = True,
+    max_parallel: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Ask the board a spoken question: the request body is the raw recording.
+
+    The transcript is streamed back as ``transcript`` events while segments
+    are transcribed, followed by the advisors' usual frames.
+    """
+    mime_type = request.headers.get("content-type", "audio/wav").split(";")[0].strip()
+    if not mime_type.startswith("audio/"):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send the recording as the request body with an audio/* content type"
+        )
+
+    advisors = resolve_advisors(db, current_user.organization_id, advisor_roles)
+
+    try:
+        recording = await receive_audio(request.stream(), settings.AUDIO_MAX_BYTES)
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    if recording.tell() == 0 and not recording.read(1):
+        recording.close()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Audio cannot be empty"
+        )
+    recording.seek(0)
+
+    try:
+        admission = admit_or_429(current_user, len(advisor_roles))
+    except HTTPException:
+        recording.close()
+        raise
+
+    # The topic is replaced by the transcript once it is known
+    org_id = current_user.organization_id
+    conversation = Conversation(
+        topic="Audio recording",
+        organization_id=org_id,
+        discussion={"complete": False, "status": "running"}
+    )
+    db.add(conversation)
+    db.commit()
+    conversation_id = conversation.id
+    db.close()
+
+    max_parallel = clamp_concurrency(max_parallel, settings.ADVISOR_MAX_PARALLELISM)
+    return sse_response(
+        stream_audio_analysis(
+            conversation_id,
+            org_id,
+            recording,
+            mime_type,
+            advisors,
+            list(advisor_roles),
+            admission,
+            use_cache,
+            max_parallel
+        ),
+        conversation_id
+    )
+
+@router.post("/analyze/batch")
+async def analyze_batch(
+    request: BatchAnalysisCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Run one advisor panel over many topics, streaming NDJSON results as each topic finishes"""
+    topics = [topic for topic in request.topics if topic and topic.strip()]
+    if not topics:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one topic must be specified"
+        )
+    if len(topics) > settings.BATCH_MAX_TOPICS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BATCH_MAX_TOPICS} topics per batch"
+        )
+
+    org_id = current_user.organization_id
+    organization = current_user.organization
+    tier = organization.subscription_tier if organization else None
+    advisors = resolve_advisors(db, org_id, request.advisor_roles)
+
+    # Retrieval runs once for the whole batch, before the new conversations exist
+    contexts = await load_contexts(org_id, topics)
+    conversation_ids = create_conversations(db, org_id, topics)
+    db.close()
+
+    items = [
+        BatchItem(index, topic, conversation_id)
+        for index, (topic, conversation_id) in enumerate(zip(topics, conversation_ids))
+    ]
+    concurrency = clamp_concurrency(request.max_concurrency, settings.BATCH_MAX_CONCURRENCY)
+    max_parallel = clamp_concurrency(request.max_parallel, settings.ADVISOR_MAX_PARALLELISM)
+
+    async def generate_results():
+        async for result in run_batch(
+            org_id, tier, advisors, list(request.advisor_roles), items, contexts,
+            request.use_cache, max_parallel, concurrency
+        ):
+            yield json.dumps(result) + "\n"
+
+    return DisconnectAwareStreamingResponse(
+        generate_results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def job_response(job: AnalysisJob) -> AnalysisJobResponse:
+    return AnalysisJobResponse(
+        id=job.id,
+        conversation_id=job.conversation_id,
+        status=job.status,
+        attempts=job.attempts,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        stream_url=f"{settings.API_V1_STR}/advisors/conversations/{job.conversation_id}/stream"
+    )
+
+@router.post("/analyze/jobs", response_model=AnalysisJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_analysis_job(
+    request: ConversationCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue an analysis for the background workers and return immediately"""
+    if not request.topic:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Topic cannot be empty"
+        )
+    resolve_advisors(db, current_user.organization_id, request.advisor_roles)
+
+    conversation = Conversation(
+        topic=request.topic,
+        organization_id=current_user.organization_id,
+        discussion={"complete": False, "status": "queued"}
+    )
+    db.add(conversation)
+    db.flush()
+    job = AnalysisJob(
+        conversation_id=conversation.id,
+        organization_id=current_user.organization_id,
+        request={
+            "topic": request.topic,
+            "advisor_roles": list(request.advisor_roles),
+            "use_cache": request.use_cache,
+            "max_parallel": request.max_parallel
+        },
+        status="queued",
+        attempts=0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    # Start it right away if this process runs a worker with a free slot
+    job_worker.notify()
+    return job_response(job)
+
+@router.get("/analyze/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status of a queued analysis; follow its output through the stream_url"""
+    job = (
+        db.query(AnalysisJob)
+        .filter(
+            AnalysisJob.id == job_id,
+            AnalysisJob.organization_id == current_user.organization_id
+        )
+        .first()
+    )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis job not found"
+        )
+    return job_response(job)
+
+def sse_response(events: AsyncIterator[str], conversation_id: int) -> DisconnectAwareStreamingResponse:
+    return DisconnectAwareStreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "X-Conversation-Id": str(conversation_id)
+        }
+    )
+
+@router.get("/conversations/{conversation_id}/stream")
+async def resume_stream(
+    conversation_id: int,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Resume a board stream after the last event the client received"""
+    conversation = (
+        db.query(Conversation.id)
+        .filter(
+            Conversation.id == conversation_id,
+            Conversation.organization_id == current_user.organization_id
+        )
+        .first()
+    )
+    db.close()
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+
+    # EventSource sends the header on reconnect; the query parameter serves other clients
+    after = last_event_id or 0
+    if last_event_id_header and last_event_id_header.isdigit():
+        after = int(last_event_id_header)
+
+    run = board_runs.get(conversation_id)
+    if run is not None:
+        # Still generating in this worker: replay from memory and follow the live output
+        return sse_response(stream_live(run, after), conversation_id)
+    return sse_response(stream_persisted(conversation_id, after), conversation_id)
+
+def conversation_response(conversation: Conversation, discussion: dict) -> ConversationResponse:
+    return ConversationResponse(
+        id=conversation.id,
+        topic=conversation.topic,
+        discussion=discussion,
+        timestamp=conversation.timestamp,
+        organization_id=conversation.organization_id
+    )
+
 @router.get("/conversations", response_model=List[ConversationResponse])
 async def get_conversations(
     current_user: User = Depends(get_current_user),
@@ -164,7 +397,8 @@ async def get_conversations(
         .order_by(Conversation.timestamp.desc())
         .all()
     )
-    return conversations
+    discussions = assemble_discussions(db, conversations)
+    return [conversation_response(conversation, discussions[conversation.id]) for conversation in conversations]
 
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
@@ -188,4 +422,5 @@ async def get_conversation(
             detail="Conversation not found"
         )
         
-    return conversation
\ No newline at end of file
+    discussions = assemble_discussions(db, [conversation])
+    return conversation_response(conversation, discussions[conversation.id])
\ No newline at end of file
@@ -7,13 +7,15 @@ from ..models.document import Document
 from ..models.user import User
 from ..db.session import get_db
 from ..core.security import get_current_user
+import asyncio
 import json
 import io
-import pdfplumber
 import os
 import tempfile
 from datetime import datetime
 from ..api.deps import get_current_organization
+from ..core.prefix_cache import prefix_cache
+from ..core.vector_index import delete_document_chunks, document_index, index_documents, reindex_org
 
 router = APIRouter()
 
@@ -44,6 +46,9 @@ async def upload_documents(
                 temp_path = temp.name
             
             try:
+                # Imported lazily; pdfplumber pulls in a large dependency tree
+                import pdfplumber
+
                 with pdfplumber.open(temp_path) as pdf:
                     content = "\n".join([page.extract_text() or "" for page in pdf.pages])
                 os.unlink(temp_path)
@@ -72,9 +77,17 @@ async def upload_documents(
         db.add(db_document)
         db.commit()
         db.refresh(db_document)
-        
-        # Convert to Pydantic model
-        doc_response = DocumentResponse(
+        uploaded_documents.append(db_document)
+
+    # Embed the passages of all uploaded files together for semantic retrieval,
+    # off the event loop
+    changes = await asyncio.to_thread(index_documents, db, uploaded_documents)
+    db.commit()
+    await asyncio.to_thread(document_index.apply, changes)
+    
+    # Convert to Pydantic models
+    document_responses = [
+        DocumentResponse(
             id=db_document.id,
             type=db_document.type,
             content=db_document.content,
@@ -82,9 +95,20 @@ async def upload_documents(
             timestamp=db_document.timestamp,
             organization_id=db_document.organization_id
         )
-        uploaded_documents.append(doc_response)
+        for db_document in uploaded_documents
+    ]
     
-    return uploaded_documents
+    # The org's document library in cached advisor prompts is now stale
+    prefix_cache.invalidate_org(current_org.id)
+    return document_responses
+
+@router.post("/reindex")
+def reindex_documents(
+    db: Session = Depends(get_db),
+    current_org = Depends(get_current_organization)
+):
+    """Re-embed all documents of the current organization, e.g. after changing the embedding model"""
+    return reindex_org(db, current_org.id)
 
 @router.get("/list", response_model=List[DocumentResponse])
 def list_documents(
@@ -182,7 +206,10 @@ def delete_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    changes = delete_document_chunks(db, document.id)
     db.delete(document)
     db.commit()
+    document_index.apply(changes)
+    prefix_cache.invalidate_org(current_org.id)
     
     return {"message": "Document deleted successfully"}
\ No newline at end of file
@@ -5,6 +5,8 @@ from ..schemas.advisors import PersonalityCreate, PersonalityResponse
 from ..models.personality import Personality
 from ..db.session import get_db
 from ..core.security import get_current_user
+from ..core.prefix_cache import prefix_cache
+from ..core.registry import advisor_registry
 
 router = APIRouter()
 
@@ -24,6 +26,8 @@ def create_personality(
     try:
         db.commit()
         db.refresh(db_personality)
+        advisor_registry.invalidate(current_user.organization_id)
+        prefix_cache.invalidate_org(current_user.organization_id)
         return db_personality
     except Exception as e:
         db.rollback()
@@ -55,4 +59,6 @@ def delete_personality(
         raise HTTPException(status_code=404, detail="Personality not found")
     db.delete(personality)
     db.commit()
+    advisor_registry.invalidate(current_user.organization_id)
+    prefix_cache.invalidate_org(current_user.organization_id)
     return {"message": "Personality deleted"}
\ No newline at end of file
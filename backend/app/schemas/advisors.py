@@ -5,6 +5,15 @@ from datetime import datetime
 class ConversationCreate(BaseModel):
     topic: str
     advisor_roles: List[str]
+    max_parallel: Optional[int] = None  # Capped by ADVISOR_MAX_PARALLELISM
+    use_cache: bool = True  # Set to False to force fresh answers
+
+class BatchAnalysisCreate(BaseModel):
+    topics: List[str]
+    advisor_roles: List[str]
+    max_concurrency: Optional[int] = None  # Capped by BATCH_MAX_CONCURRENCY
+    max_parallel: Optional[int] = None  # Advisors at once per topic, capped by ADVISOR_MAX_PARALLELISM
+    use_cache: bool = True
 
 class ConversationResponse(BaseModel):
     id: int
@@ -16,6 +25,17 @@ class ConversationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AnalysisJobResponse(BaseModel):
+    id: int
+    conversation_id: int
+    status: str  # queued, running, completed, failed or cancelled
+    attempts: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    stream_url: str  # SSE stream of the analysis; resumable with Last-Event-ID
+
 class UserBase(BaseModel):
     email: EmailStr
     full_name: str
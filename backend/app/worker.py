@@ -0,0 +1,46 @@
+"""Standalone analysis job worker.
+
+    python -m app.worker --concurrency 8
+
+Runs queued jobs from ``analysis_jobs`` without serving HTTP, so web capacity
+and LLM generation can be scaled separately. Set ``JOBS_WORKER_ENABLED=false``
+on the API processes to leave all jobs to these workers.
+"""
+import argparse
+import asyncio
+import signal
+from .core.config import settings
+from .core.embedding_service import embedding_service
+from .core.history_index import conversation_indexer
+from .core.jobs import JobWorker
+from .core.response_log import response_log
+from .core.streaming import loop_lag_monitor
+
+
+async def main(concurrency: int):
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    worker = JobWorker(concurrency, settings.JOBS_POLL_SECONDS)
+    loop_lag_monitor.start()
+    worker.start()
+    # Conversations finished here are summarized and embedded here too
+    if settings.CONVERSATION_INDEX_ENABLED:
+        conversation_indexer.start()
+    await stopping.wait()
+
+    print("Stopping job worker, returning unfinished jobs to the queue")
+    await worker.stop()
+    await conversation_indexer.stop()
+    await response_log.flush()
+    await loop_lag_monitor.stop()
+    embedding_service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued advisor analysis jobs")
+    parser.add_argument("--concurrency", type=int, default=settings.JOBS_WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
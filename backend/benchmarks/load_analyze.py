@@ -0,0 +1,97 @@
+"""Load test /advisors/analyze against a running API.
+
+Start the API with the stub backend so no Gemini quota is spent, e.g.
+
+    LLM_PROVIDER=stub LLM_STUB_TTFT_MS=400 LLM_STUB_TOKENS_PER_SEC=80 \\
+        uvicorn app.main:app --workers 2
+
+then run
+
+    python -m benchmarks.load_analyze --email me@example.com --password secret \\
+        --requests 200 --concurrency 20
+
+It reports throughput plus time-to-first-frame and total latency percentiles.
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+
+def login(base_url: str, email: str, password: str) -> str:
+    response = requests.post(
+        f"{base_url}/auth/token",
+        data={"username": email, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def run_one(base_url: str, token: str, topic: str, roles: List[str]) -> Dict[str, Optional[float]]:
+    started = time.perf_counter()
+    first_frame = None
+    try:
+        with requests.post(
+            f"{base_url}/advisors/analyze",
+            json={"topic": topic, "advisor_roles": roles},
+            headers={"Authorization": f"Bearer {token}"},
+            stream=True,
+            timeout=300
+        ) as response:
+            if response.status_code != 200:
+                return {"ok": False, "ttff": None, "total": time.perf_counter() - started}
+            for line in response.iter_lines():
+                # Only SSE data lines carry advisor output (skip the retry hint)
+                if line.startswith(b"data:") and first_frame is None:
+                    first_frame = time.perf_counter() - started
+        return {"ok": True, "ttff": first_frame, "total": time.perf_counter() - started}
+    except requests.RequestException:
+        return {"ok": False, "ttff": None, "total": time.perf_counter() - started}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--roles", default="legal,financial,technology")
+    parser.add_argument("--topic", default="Should we expand into the European market next year?")
+    args = parser.parse_args()
+
+    token = login(args.base_url, args.email, args.password)
+    roles = args.roles.split(",")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda i: run_one(args.base_url, token, f"{args.topic} (#{i})", roles),
+            range(args.requests)
+        ))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    print(f"requests: {len(results)}  ok: {len(ok)}  errors: {len(results) - len(ok)}")
+    print(f"throughput: {len(ok) / elapsed:.2f} req/s over {elapsed:.1f}s")
+    for label, key in (("time to first frame", "ttff"), ("total latency", "total")):
+        values = [r[key] for r in ok if r[key] is not None]
+        if not values:
+            continue
+        print(
+            f"{label}: mean {statistics.mean(values):.3f}s  "
+            f"p50 {percentile(values, 50):.3f}s  p95 {percentile(values, 95):.3f}s  "
+            f"p99 {percentile(values, 99):.3f}s  max {max(values):.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
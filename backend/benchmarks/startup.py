@@ -0,0 +1,122 @@
+"""Import-time and cold-start benchmark for app.main.
+
+    python -m benchmarks.startup --runs 5 --max-import-ms 1500 --max-cold-start-ms 4000
+
+Import time is measured in fresh interpreters (best of ``--runs``), with
+the slowest modules taken from ``python -X importtime``. Cold start launches
+uvicorn and times how long it takes until ``/`` answers. The script also
+checks that heavy libraries are not imported eagerly, and exits non-zero
+when a budget is exceeded so CI can catch regressions.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ("google.generativeai", "pdfplumber")
+
+IMPORT_SNIPPET = """
+import sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+eager = [name for name in {lazy!r} if name in sys.modules]
+print(elapsed, ",".join(eager))
+"""
+
+
+def measure_import() -> tuple:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    elapsed, _, eager = output.partition(" ")
+    return float(elapsed), [name for name in eager.split(",") if name]
+
+
+def slowest_imports(limit: int = 10) -> list:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_cold_start(timeout: float = 60.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.RequestException:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving")
+            time.sleep(0.02)
+        raise RuntimeError(f"server not ready after {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-cold-start-ms", type=float, default=None)
+    parser.add_argument("--skip-cold-start", action="store_true")
+    args = parser.parse_args()
+
+    failures = []
+
+    results = [measure_import() for _ in range(args.runs)]
+    import_ms = min(elapsed for elapsed, _ in results) * 1000
+    eager = sorted({name for _, names in results for name in names})
+    print(f"import app.main: {import_ms:.0f} ms (best of {args.runs})")
+    print("slowest imports (cumulative):")
+    for micros, name in slowest_imports():
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import time {import_ms:.0f} ms exceeds {args.max_import_ms:.0f} ms")
+
+    if not args.skip_cold_start:
+        cold_ms = min(measure_cold_start() for _ in range(args.runs)) * 1000
+        print(f"cold start to first response: {cold_ms:.0f} ms (best of {args.runs})")
+        if args.max_cold_start_ms is not None and cold_ms > args.max_cold_start_ms:
+            failures.append(f"cold start {cold_ms:.0f} ms exceeds {args.max_cold_start_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Settings are read when the app is first imported: point it at a throwaway
+# SQLite database and index directory, never at a developer's own
+_scratch = tempfile.mkdtemp(prefix="boardai-tests-")
+os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(_scratch, 'test.db')}"
+os.environ["VECTOR_INDEX_DIR"] = os.path.join(_scratch, "vector_index")
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["CONVERSATION_INDEX_ENABLED"] = "false"
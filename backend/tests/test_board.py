@@ -0,0 +1,176 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from app import models
+from app.core.board import BoardEvent, BoardRun, stream_live
+from app.core.metrics import metrics
+from app.core.response_log import ResponseLogWriter
+from app.core.security import get_current_user
+from app.core.streaming import AdvisorFrame
+from app.db.session import Base, SessionLocal, engine
+from app.main import app
+
+
+def event_ids(sse: str):
+    return [int(line[len("id: "):]) for line in sse.splitlines() if line.startswith("id: ")]
+
+
+def end_status(sse: str) -> str:
+    blocks = [block for block in sse.split("\n\n") if block.startswith("event: end")]
+    assert len(blocks) == 1
+    return json.loads(blocks[0].split("data: ", 1)[1])["status"]
+
+
+def publish(run: BoardRun, *frames: AdvisorFrame):
+    for frame in frames:
+        run.broadcast.publish(BoardEvent(len(run.events) + 1, frame))
+
+
+def answer(role: str, *chunks: str):
+    frames = [AdvisorFrame(role, seq, text) for seq, text in enumerate(chunks)]
+    return frames + [AdvisorFrame(role, len(chunks), "", kind="done")]
+
+
+def test_live_resume_sends_only_the_missing_events():
+    async def scenario():
+        run = BoardRun(1, ["legal", "financial"])
+        publish(run, *answer("legal", "a", "b"), *answer("financial", "c"))
+        run.status = "completed"
+        run.broadcast.finish()
+        return "".join([frame async for frame in stream_live(run, after=3)])
+
+    sse = asyncio.run(scenario())
+    assert sse.startswith("retry: ")
+    assert event_ids(sse) == [4, 5]
+    assert end_status(sse) == "completed"
+
+
+def test_live_resume_follows_output_produced_after_reattaching():
+    async def scenario():
+        run = BoardRun(1, ["legal"])
+        publish(run, AdvisorFrame("legal", 0, "a"), AdvisorFrame("legal", 1, "b"))
+        frames = []
+
+        async def watch():
+            async for frame in stream_live(run, after=1):
+                frames.append(frame)
+
+        watcher = asyncio.create_task(watch())
+        await asyncio.sleep(0)
+        publish(run, AdvisorFrame("legal", 2, "c"), AdvisorFrame("legal", 3, "", kind="done"))
+        run.status = "completed"
+        run.broadcast.finish()
+        await watcher
+        return "".join(frames)
+
+    sse = asyncio.run(scenario())
+    assert event_ids(sse) == [2, 3, 4]
+    assert "data: " + AdvisorFrame("legal", 0, "a").to_json() not in sse
+
+
+@pytest.fixture
+def persisted_conversation():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    organization = models.Organization(name="Resume test")
+    db.add(organization)
+    db.flush()
+    conversation = models.Conversation(
+        topic="Resume",
+        organization_id=organization.id,
+        discussion={"complete": True, "status": "completed"}
+    )
+    db.add(conversation)
+    db.flush()
+    rows = [
+        (1, "legal", 0, "chunk", "Hello "),
+        (2, "legal", 1, "chunk", "board"),
+        (3, "legal", 2, "done", "Hello board"),
+        (4, "financial", 0, "chunk", "Numbers"),
+        (5, "financial", 1, "done", "Numbers"),
+    ]
+    db.add_all([
+        models.AdvisorResponse(
+            conversation_id=conversation.id, event_id=event_id, role=role, seq=seq, kind=kind, text=text
+        )
+        for event_id, role, seq, kind, text in rows
+    ])
+    db.commit()
+    ids = SimpleNamespace(organization=organization.id, conversation=conversation.id)
+    db.close()
+
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(organization_id=ids.organization)
+    yield ids
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_persisted_resume_from_last_event_id_header(persisted_conversation):
+    client = TestClient(app)
+    url = f"/api/v1/advisors/conversations/{persisted_conversation.conversation}/stream"
+
+    response = client.get(url, headers={"Last-Event-ID": "2"})
+    assert response.status_code == 200
+    assert event_ids(response.text) == [3, 4, 5]
+    # Done events carry no text; the resumed client already has the chunks
+    assert "Hello board" not in response.text
+    assert end_status(response.text) == "completed"
+
+    # Clients without EventSource pass the id as a query parameter
+    assert event_ids(client.get(url, params={"last_event_id": 4}).text) == [5]
+    assert event_ids(client.get(url).text) == [1, 2, 3, 4, 5]
+
+
+def test_answer_logged_whole_replays_as_one_event(persisted_conversation):
+    # Batch answers are logged as a single done row at seq 0, with no chunks before it
+    db = SessionLocal()
+    db.add(models.AdvisorResponse(
+        conversation_id=persisted_conversation.conversation, event_id=7, role="strategy", seq=0, kind="done",
+        text="Whole answer"
+    ))
+    db.commit()
+    db.close()
+
+    client = TestClient(app)
+    response = client.get(
+        f"/api/v1/advisors/conversations/{persisted_conversation.conversation}/stream",
+        headers={"Last-Event-ID": "5"}
+    )
+    assert event_ids(response.text) == [7]
+    assert "data: " + AdvisorFrame("strategy", 0, "Whole answer", "done").to_json() in response.text
+
+
+def test_resume_of_another_orgs_conversation_is_not_found(persisted_conversation):
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        organization_id=persisted_conversation.organization + 1
+    )
+    client = TestClient(app)
+    response = client.get(f"/api/v1/advisors/conversations/{persisted_conversation.conversation}/stream")
+    assert response.status_code == 404
+
+
+def test_a_row_the_database_rejects_does_not_hold_back_the_batch(persisted_conversation):
+    def dropped():
+        return metrics.snapshot()["counters"].get("response_log_dropped", 0)
+
+    async def scenario():
+        writer = ResponseLogWriter(batch_size=100, flush_seconds=60)
+        writer.append(persisted_conversation.conversation, 6, "strategy", 0, "chunk", "Kept")
+        writer.append(persisted_conversation.conversation, 7, None, 1, "chunk", "Lost")  # NOT NULL violation
+        writer.append(persisted_conversation.conversation, 8, "strategy", 2, "done", "Kept too")
+        await writer.flush()
+        return writer
+
+    before = dropped()
+    writer = asyncio.run(scenario())
+    assert dropped() == before + 1
+    assert writer._buffer == []
+
+    db = SessionLocal()
+    rows = db.query(models.AdvisorResponse).filter(
+        models.AdvisorResponse.conversation_id == persisted_conversation.conversation,
+        models.AdvisorResponse.role == "strategy"
+    ).all()
+    db.close()
+    assert sorted(row.event_id for row in rows) == [6, 8]
@@ -0,0 +1,46 @@
+import asyncio
+from app.core import advisors
+from app.core.advisors import AIAdvisor
+from app.core.context import AdvisorContext
+from app.core.llm import LLMProvider
+
+
+class Provider(LLMProvider):
+    name = "uncacheable"
+    supports_prefix_cache = True
+
+    def __init__(self):
+        self.prompts = []
+
+    async def create_prefix_cache(self, prefix, ttl_seconds):
+        raise RuntimeError("caching unavailable")
+
+    async def stream(self, prompt, cached_prefix=None):
+        self.prompts.append((prompt, cached_prefix))
+        yield "answer"
+
+
+def test_uncached_prefix_sends_packed_passages_instead_of_the_corpus(monkeypatch):
+    provider = Provider()
+    monkeypatch.setattr(advisors, "get_provider", lambda: provider)
+    context = AdvisorContext(
+        org_id=1,
+        topic="Budget",
+        history="",
+        documents="Relevant company documents:\nbudget memo",
+        corpus="Company document library:\nevery document the org has",
+        corpus_tokens=60000,
+        corpus_fingerprint="library",
+        uncached_documents="Relevant company documents:\nbudget passage\nbudget memo",
+        uncached_document_tokens=8
+    )
+    advisor = AIAdvisor("financial")
+
+    async def scenario():
+        return [text async for text in advisor._stream_upstream(context, advisor.cache_key(context), False)]
+
+    assert asyncio.run(scenario()) == ["answer"]
+    [(prompt, handle)] = provider.prompts
+    assert handle is None
+    assert "Company document library" not in prompt
+    assert "budget passage\nbudget memo" in prompt
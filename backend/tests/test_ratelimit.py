@@ -0,0 +1,168 @@
+import asyncio
+import time
+import pytest
+from app.core import ratelimit
+from app.core.ratelimit import BucketSpec, DatabaseTokenBucketLimiter, LocalTokenBucketLimiter, RateLimitedProvider
+from app.db.session import Base, SessionLocal, engine
+from app.models.rate_limit import RateLimitBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    return clock
+
+
+def make_limiter() -> LocalTokenBucketLimiter:
+    return LocalTokenBucketLimiter({
+        "requests": BucketSpec("test:requests", capacity=2, rate=1.0),
+        "tokens": BucketSpec("test:tokens", capacity=100, rate=10.0),
+    })
+
+
+def test_starts_full_and_reports_the_refill_wait(clock):
+    limiter = make_limiter()
+    assert limiter._try_acquire({"tokens": 60}) <= 0
+    assert limiter._try_acquire({"tokens": 40}) <= 0
+    # Empty: 30 tokens at 10/s
+    assert limiter._try_acquire({"tokens": 30}) == pytest.approx(3.0)
+
+
+def test_refills_with_elapsed_time_up_to_capacity(clock):
+    limiter = make_limiter()
+    limiter._try_acquire({"tokens": 100})
+    clock.now += 2.5
+    assert limiter._try_acquire({"tokens": 30}) == pytest.approx(0.5)
+    assert limiter._try_acquire({"tokens": 25}) <= 0
+
+    clock.now += 3600
+    assert limiter._try_acquire({"tokens": 100}) <= 0
+    assert limiter._try_acquire({"tokens": 1}) > 0
+
+
+def test_charges_every_bucket_or_none(clock):
+    limiter = make_limiter()
+    assert limiter._try_acquire({"requests": 1, "tokens": 90}) <= 0
+    # Requests could pay but tokens can't: nothing is taken
+    assert limiter._try_acquire({"requests": 1, "tokens": 50}) == pytest.approx(4.0)
+    assert limiter._try_acquire({"requests": 1, "tokens": 10}) <= 0
+    assert limiter._try_acquire({"requests": 1}) == pytest.approx(1.0)
+
+
+def test_settle_credits_and_debits_the_estimate(clock):
+    limiter = make_limiter()
+    limiter._try_acquire({"tokens": 80})
+    limiter.settle(tokens=-50)
+    assert limiter._try_acquire({"tokens": 70}) <= 0
+    # Extra usage puts the bucket into debt instead of blocking
+    limiter.settle(tokens=40)
+    assert limiter._try_acquire({"tokens": 1}) == pytest.approx(4.1)
+
+
+def test_acquire_sleeps_until_refilled(monkeypatch):
+    monkeypatch.setattr(ratelimit.settings, "RATE_LIMIT_MAX_WAIT_SECONDS", 0.05)
+    limiter = LocalTokenBucketLimiter({"tokens": BucketSpec("test:tokens", capacity=10, rate=100.0)})
+
+    async def scenario():
+        await limiter.acquire(tokens=10)
+        started = time.monotonic()
+        await limiter.acquire(tokens=5)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.04
+
+
+def test_provider_settles_streams_against_their_output(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit.settings, "RATE_LIMIT_EXPECTED_OUTPUT_TOKENS", 50)
+    settled = []
+
+    class Limiter(LocalTokenBucketLimiter):
+        def _settle(self, deltas):
+            settled.append(deltas)
+
+    class Provider(ratelimit.LLMProvider):
+        name = "test"
+
+        async def stream(self, prompt, cached_prefix=None):
+            yield "one two three "
+            yield "four"
+
+    provider = RateLimitedProvider(Provider(), Limiter({
+        "requests": BucketSpec("test:requests", capacity=10, rate=1.0),
+        "tokens": BucketSpec("test:tokens", capacity=1000, rate=10.0),
+    }))
+
+    async def scenario():
+        return [chunk async for chunk in provider.stream("prompt")]
+
+    assert "".join(asyncio.run(scenario())) == "one two three four"
+    produced = ratelimit.estimate_tokens("one two three four")
+    assert settled == [{"tokens": produced - 50}]
+
+
+@pytest.fixture
+def shared_buckets(request):
+    Base.metadata.create_all(engine, tables=[RateLimitBucket.__table__])
+    name = f"{request.node.name}:tokens"
+
+    def worker() -> DatabaseTokenBucketLimiter:
+        return DatabaseTokenBucketLimiter({"tokens": BucketSpec(name, capacity=100, rate=10.0)})
+
+    def shared_tokens() -> float:
+        db = SessionLocal()
+        try:
+            return db.get(RateLimitBucket, name).tokens
+        finally:
+            db.close()
+
+    return worker, shared_tokens
+
+
+def test_workers_draw_on_one_shared_quota(clock, shared_buckets):
+    worker, shared_tokens = shared_buckets
+    first, second = worker(), worker()
+    assert first._try_acquire({"tokens": 60}) <= 0
+    assert second._try_acquire({"tokens": 40}) <= 0
+    assert shared_tokens() == pytest.approx(0)
+    # Neither lease has anything left, and the shared row is empty: 30 tokens at 10/s
+    assert second._try_acquire({"tokens": 30}) == pytest.approx(3.0)
+
+
+def test_released_leases_return_unused_capacity_and_debt(clock, shared_buckets):
+    worker, shared_tokens = shared_buckets
+    first, second = worker(), worker()
+    assert first._try_acquire({"tokens": 50}) <= 0
+    first.settle(tokens=-20)  # The answer came in shorter than charged
+    assert second._try_acquire({"tokens": 70}) == pytest.approx(2.0)
+
+    first.release()
+    assert shared_tokens() == pytest.approx(70)
+    assert second._try_acquire({"tokens": 70}) <= 0
+
+    second.settle(tokens=30)  # Longer than charged: the debt reaches the shared row too
+    second.release()
+    assert shared_tokens() == pytest.approx(-30)
+
+
+def test_leases_are_returned_when_they_expire(clock, shared_buckets, monkeypatch):
+    monkeypatch.setattr(ratelimit.settings, "RATE_LIMIT_LEASE_SECONDS", 0.05)
+    worker, shared_tokens = shared_buckets
+    limiter = worker()
+    assert limiter._try_acquire({"tokens": 5}) <= 0
+    # A lease is at least RATE_LIMIT_LEASE_FRACTION of the bucket
+    assert shared_tokens() == pytest.approx(90)
+
+    deadline = time.monotonic() + 2
+    while shared_tokens() < 95 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert shared_tokens() == pytest.approx(95)
+    assert limiter._leased == {"tokens": 0.0}
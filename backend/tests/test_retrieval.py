@@ -0,0 +1,42 @@
+import pytest
+from app.core.retrieval import reciprocal_rank_fusion
+from app.core.vector_index import PassageHit
+
+
+def hit(chunk_id: int, score: float) -> PassageHit:
+    return PassageHit(chunk_id, document_id=chunk_id // 10, text=f"passage {chunk_id}", score=score)
+
+
+def test_passages_ranked_by_both_lists_come_first():
+    vector = [hit(1, 0.91), hit(2, 0.85), hit(3, 0.80)]
+    lexical = [hit(2, 14.2), hit(4, 9.7)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+
+    assert [passage.chunk_id for passage in fused] == [2, 1, 4, 3]
+    assert fused[0].score == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1].score == pytest.approx(1 / 61)
+    assert fused[2].score == pytest.approx(1 / 62)
+    assert fused[3].score == pytest.approx(1 / 63)
+
+
+def test_raw_scores_on_different_scales_do_not_matter():
+    # Only ranks count: a huge lexical score doesn't outweigh a first vector rank
+    vector = [hit(1, 0.2), hit(2, 0.1)]
+    lexical = [hit(2, 1000.0), hit(1, 999.0)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+    assert fused[0].score == pytest.approx(fused[1].score)
+    assert {passage.chunk_id for passage in fused} == {1, 2}
+
+
+def test_smaller_k_rewards_top_ranks_more():
+    # 3 is a runner-up in both lists; 1 and 4 each top one list
+    rankings = [[hit(1, 0), hit(2, 0), hit(3, 0)], [hit(4, 0), hit(3, 0)]]
+    assert reciprocal_rank_fusion(rankings, k=60)[0].chunk_id == 3
+    assert [passage.chunk_id for passage in reciprocal_rank_fusion(rankings, k=0)][:2] == [1, 4]
+
+
+def test_keeps_passage_fields_and_handles_empty_rankings():
+    fused = reciprocal_rank_fusion([[], [hit(12, 3.0)], []], k=60)
+    assert len(fused) == 1
+    assert (fused[0].chunk_id, fused[0].document_id, fused[0].text) == (12, 1, "passage 12")
+    assert reciprocal_rank_fusion([], k=60) == []
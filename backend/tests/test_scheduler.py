@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from app.core.scheduler import AdmissionTooLargeError, FairScheduler, QueueFullError, clamp_concurrency
+from app.routes import advisors as advisor_routes
+
+
+def make_scheduler(**overrides) -> FairScheduler:
+    options = dict(
+        global_limit=1,
+        org_limit=1,
+        max_queued=100,
+        max_queued_per_org=100,
+        tier_weights={"basic": 1.0, "pro": 2.0}
+    )
+    options.update(overrides)
+    return FairScheduler(**options)
+
+
+def test_weighted_orgs_get_proportional_slots():
+    async def scenario():
+        scheduler = make_scheduler()
+        granted = []
+
+        async def generation(admission):
+            async with admission.slot():
+                granted.append(admission.org_id)
+                await asyncio.sleep(0)
+
+        # Hold the only slot so both orgs queue up behind it
+        blocker = scheduler.admit(3, "basic", 1)
+        await scheduler.acquire(3)
+        basic = scheduler.admit(1, "basic", 12)
+        pro = scheduler.admit(2, "pro", 12)
+        tasks = [asyncio.create_task(generation(basic)) for _ in range(12)]
+        tasks += [asyncio.create_task(generation(pro)) for _ in range(12)]
+        await asyncio.sleep(0)
+        scheduler.release(3)
+        blocker.close()
+        await asyncio.gather(*tasks)
+        return scheduler, granted
+
+    scheduler, granted = asyncio.run(scenario())
+    # Weight 2 against weight 1: about two of every three slots while both are waiting
+    first = granted[:12]
+    assert first.count(2) == 8
+    assert first.count(1) == 4
+    assert scheduler.reserved == {1: 0, 2: 0, 3: 0}
+    assert scheduler.running_total == 0
+
+
+def test_full_queue_raises_with_retry_after():
+    scheduler = make_scheduler(max_queued=1, max_queued_per_org=1)
+    admission = scheduler.admit(1, None, 2)
+    with pytest.raises(QueueFullError) as raised:
+        scheduler.admit(1, None, 1)
+    assert raised.value.retry_after >= 1
+    admission.close()
+    scheduler.admit(1, None, 1).close()
+    assert scheduler.reserved[1] == 0
+
+
+def test_requests_that_can_never_fit_fail_without_waiting():
+    scheduler = make_scheduler(global_limit=2, org_limit=1, max_queued=10, max_queued_per_org=2)
+    assert scheduler.capacity == 3
+    with pytest.raises(AdmissionTooLargeError):
+        scheduler.admit(1, None, 4)
+
+    async def wait_for_admission():
+        return await asyncio.wait_for(scheduler.admit_waiting(1, None, 4), 1.0)
+
+    with pytest.raises(AdmissionTooLargeError):
+        asyncio.run(wait_for_admission())
+    assert scheduler.reserved == {}
+    scheduler.admit(1, None, 3).close()
+
+
+def test_admit_or_429_sets_retry_after(monkeypatch):
+    scheduler = make_scheduler(max_queued=0, max_queued_per_org=0)
+    monkeypatch.setattr(advisor_routes, "scheduler", scheduler)
+    user = SimpleNamespace(organization_id=1, organization=SimpleNamespace(subscription_tier="basic"))
+
+    admission = advisor_routes.admit_or_429(user, 1)
+    with pytest.raises(HTTPException) as raised:
+        advisor_routes.admit_or_429(user, 1)
+    assert raised.value.status_code == 429
+    assert int(raised.value.headers["Retry-After"]) >= 1
+    admission.close()
+
+
+def test_clamp_concurrency():
+    assert clamp_concurrency(None, 4) == 4
+    assert clamp_concurrency(0, 4) == 4
+    assert clamp_concurrency(2, 4) == 2
+    assert clamp_concurrency(10, 4) == 4
+    assert clamp_concurrency(-3, 4) == 1
@@ -0,0 +1,106 @@
+import asyncio
+from app.core.singleflight import SingleFlight
+
+
+async def _drain(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_late_joiner_gets_the_whole_stream_from_one_producer():
+    async def scenario():
+        flights = SingleFlight("test_flights")
+        release = asyncio.Event()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            yield "a"
+            await release.wait()
+            yield "b"
+
+        leader = flights.stream("key", produce)
+        assert await leader.__anext__() == "a"
+        # Joins after "a" was emitted, while the producer is still running
+        late = flights.stream("key", produce)
+        late_task = asyncio.create_task(_drain(late))
+        await asyncio.sleep(0)
+        release.set()
+        rest = await _drain(leader)
+        return calls, rest, await late_task, len(flights)
+
+    calls, rest, late, inflight = asyncio.run(scenario())
+    assert calls == [1]
+    assert rest == ["b"]
+    assert late == ["a", "b"]
+    assert inflight == 0
+
+
+def test_new_callers_after_completion_start_a_new_producer():
+    async def scenario():
+        flights = SingleFlight("test_flights")
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            yield "x"
+
+        first = await _drain(flights.stream("key", produce))
+        second = await _drain(flights.stream("key", produce))
+        return calls, first, second
+
+    calls, first, second = asyncio.run(scenario())
+    assert calls == [1, 1]
+    assert first == second == ["x"]
+
+
+def test_producer_is_cancelled_when_the_last_subscriber_leaves():
+    async def scenario():
+        flights = SingleFlight("test_flights")
+        cancelled = asyncio.Event()
+
+        async def produce():
+            try:
+                while True:
+                    yield "tick"
+                    await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = flights.stream("key", produce)
+        second = flights.stream("key", produce)
+        await first.__anext__()
+        await second.__anext__()
+
+        await first.aclose()
+        await asyncio.sleep(0.05)
+        still_running = not cancelled.is_set()
+
+        await second.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1.0)
+        return still_running, len(flights)
+
+    still_running, inflight = asyncio.run(scenario())
+    # One subscriber leaving must not stop the others' stream
+    assert still_running
+    assert inflight == 0
+
+
+def test_producer_errors_reach_every_subscriber():
+    async def scenario():
+        flights = SingleFlight("test_flights")
+
+        async def produce():
+            yield "partial"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        results = await asyncio.gather(
+            _drain(flights.stream("key", produce)),
+            _drain(flights.stream("key", produce)),
+            return_exceptions=True
+        )
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,62 @@
+import asyncio
+from app.core.streaming import coalesce_chunks
+
+
+async def source(chunks, pauses=None):
+    pauses = pauses or {}
+    for index, chunk in enumerate(chunks):
+        if index in pauses:
+            await asyncio.sleep(pauses[index])
+        yield chunk
+
+
+def collect(chunks, max_bytes, max_delay, pauses=None):
+    async def run():
+        return [frame async for frame in coalesce_chunks(source(chunks, pauses), max_bytes, max_delay)]
+    return asyncio.run(run())
+
+
+def test_first_chunk_goes_out_alone():
+    frames = collect(["a", "b", "c"], max_bytes=1000, max_delay=10.0)
+    assert frames == ["a", "bc"]
+
+
+def test_flushes_once_max_bytes_accumulate():
+    chunks = ["ab", "cd", "ef", "gh", "ij", "k"]
+    frames = collect(chunks, max_bytes=4, max_delay=10.0)
+    assert frames == ["ab", "cdef", "ghij", "k"]
+
+
+def test_byte_limit_counts_utf8_bytes():
+    # Each "é" is two bytes, so two of them reach the four byte limit
+    frames = collect(["x", "é", "é", "é"], max_bytes=4, max_delay=10.0)
+    assert frames == ["x", "éé", "é"]
+
+
+def test_flushes_after_max_delay_while_upstream_is_quiet():
+    # Upstream stalls before "d": "bc" must not wait for it
+    frames = collect(["a", "b", "c", "d"], max_bytes=1000, max_delay=0.05, pauses={3: 0.3})
+    assert frames == ["a", "bc", "d"]
+
+
+def test_zero_delay_passes_chunks_through():
+    frames = collect(["a", "b", "c"], max_bytes=1000, max_delay=0.0)
+    assert frames == ["a", "b", "c"]
+
+
+def test_delivers_buffered_text_before_an_upstream_error():
+    async def failing():
+        yield "a"
+        yield "b"
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        frames = []
+        try:
+            async for frame in coalesce_chunks(failing(), 1000, 10.0):
+                frames.append(frame)
+        except RuntimeError:
+            return frames
+        raise AssertionError("error was swallowed")
+
+    assert asyncio.run(run()) == ["a", "b"]
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.core.vector_store import OrgVectorFile
+
+DIM = 8
+
+
+def unit_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def org_file(tmp_path):
+    return OrgVectorFile(str(tmp_path / "org"), DIM)
+
+
+def test_empty_file_returns_no_hits(org_file):
+    assert org_file.search(unit_vectors(2), 3) == [[], []]
+    assert org_file.snapshot().signature == (0, 0)
+
+
+def test_search_finds_appended_vectors(org_file):
+    vectors = unit_vectors(20)
+    ids = np.arange(100, 120, dtype=np.int64)
+    assert org_file.append(ids, vectors) == 20
+
+    hits = org_file.search(vectors[[3, 7]], 3)
+    assert [topic_hits[0][1] for topic_hits in hits] == [103, 107]
+    assert hits[0][0][0] == pytest.approx(1.0, abs=1e-5)
+    # Scores come back best first
+    assert [score for score, _ in hits[0]] == sorted((score for score, _ in hits[0]), reverse=True)
+    assert org_file.snapshot().signature == (20, 119)
+
+
+def test_append_skips_ids_already_live(org_file):
+    vectors = unit_vectors(5)
+    ids = np.arange(5, dtype=np.int64)
+    org_file.append(ids, vectors)
+    assert org_file.append(ids[:3], vectors[:3]) == 0
+    assert org_file.append(np.array([3, 4, 5], dtype=np.int64), unit_vectors(3, seed=1)) == 1
+    assert sorted(org_file.snapshot().live_ids.tolist()) == [0, 1, 2, 3, 4, 5]
+
+
+def test_removed_ids_are_tombstoned_and_never_returned(org_file, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_COMPACT_RATIO", 0.5)
+    vectors = unit_vectors(10)
+    org_file.append(np.arange(10, dtype=np.int64), vectors)
+
+    assert org_file.remove(np.array([2, 99], dtype=np.int64)) == 1
+    assert org_file.remove(np.array([2], dtype=np.int64)) == 0
+    meta = org_file._read_meta()
+    assert (meta["generation"], meta["rows"], meta["tombstones"]) == (0, 10, 1)
+
+    hits = org_file.search(vectors[[2]], 10)[0]
+    assert 2 not in [row_id for _, row_id in hits]
+    assert len(hits) == 9
+
+
+def test_compaction_rewrites_live_rows_into_a_new_generation(org_file, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_COMPACT_RATIO", 0.2)
+    vectors = unit_vectors(10)
+    org_file.append(np.arange(10, dtype=np.int64), vectors)
+    org_file.remove(np.array([0, 1], dtype=np.int64))
+    assert org_file._read_meta()["generation"] == 0
+
+    # The third tombstone crosses 20% of the rows
+    org_file.remove(np.array([5], dtype=np.int64))
+    meta = org_file._read_meta()
+    assert (meta["generation"], meta["rows"], meta["tombstones"]) == (1, 7, 0)
+    assert sorted(org_file.snapshot().live_ids.tolist()) == [2, 3, 4, 6, 7, 8, 9]
+
+    hits = org_file.search(vectors[[4, 9]], 1)
+    assert [topic_hits[0][1] for topic_hits in hits] == [4, 9]
+    # Later appends go to the new generation
+    org_file.append(np.array([10], dtype=np.int64), unit_vectors(1, seed=2))
+    assert org_file.snapshot().signature == (8, 10)
+
+
+def test_other_handles_see_writes_through_the_version(org_file, tmp_path):
+    reader = OrgVectorFile(str(tmp_path / "org"), DIM)
+    assert reader.search(unit_vectors(1), 1) == [[]]
+
+    vectors = unit_vectors(4)
+    org_file.append(np.arange(4, dtype=np.int64), vectors)
+    assert reader.search(vectors[[1]], 1)[0][0][1] == 1
+
+    org_file.remove(np.array([1], dtype=np.int64))
+    assert 1 not in [row_id for _, row_id in reader.search(vectors[[1]], 4)[0]]
+
+
+def test_ivf_index_matches_exhaustive_search_when_every_list_is_probed(org_file, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_ANN_MIN_ROWS", 100)
+    monkeypatch.setattr(settings, "VECTOR_INDEX_ANN_PROBES", 1000)
+    vectors = unit_vectors(200)
+    org_file.append(np.arange(200, dtype=np.int64), vectors)
+    assert org_file._read_meta()["ann"] is not None
+    assert org_file.snapshot().ann is not None
+
+    queries = unit_vectors(5, seed=3)
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    hits = org_file.search(queries, 5)
+    assert [[row_id for _, row_id in topic_hits] for topic_hits in hits] == expected.tolist()
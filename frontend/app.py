@@ -168,6 +168,32 @@ def display_document_management():
     except Exception as e:
         st.error(f"Error: {str(e)}")
 
+def format_board_response(advisor_responses: Dict[str, str]) -> str:
+    """Render each advisor's (possibly partial) answer under its own heading"""
+    sections = [
+        f"### {role.upper()} ADVISOR:\n\n{text}"
+        for role, text in advisor_responses.items()
+    ]
+    return "\n\n".join(sections)
+
+def iter_sse_events(response):
+    """Yield (event id, event type, data) for each server-sent event in a streaming response"""
+    event_id, event_type, data = None, "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "id":
+                event_id = value
+            elif field == "event":
+                event_type = value
+            elif field == "data":
+                data.append(value)
+            continue
+        if data:
+            yield event_id, event_type, "\n".join(data)
+        event_type, data = "message", []
+
 def display_chat():
     st.header("Board Discussion")
     
@@ -226,27 +252,63 @@ def display_chat():
                 # Create a placeholder for the streaming response
                 with st.chat_message("assistant"):
                     message_placeholder = st.empty()
+                    advisor_responses = {role: "" for role in selected_advisors}
                     full_response = ""
                     
-                    try:
-                        # Process the streaming response
-                        for chunk in response.iter_content(chunk_size=1024, decode_unicode=True):
-                            if chunk:
-                                # Decode the chunk if it's bytes
-                                if isinstance(chunk, bytes):
-                                    chunk = chunk.decode('utf-8')
-                                full_response += chunk
+                    conversation_id = response.headers.get("X-Conversation-Id")
+                    last_event_id = None
+                    reconnects = 0
+                    stream = response
+
+                    while True:
+                        try:
+                            # Advisors answer concurrently; each event is a tagged frame
+                            for event_id, event_type, data in iter_sse_events(stream):
+                                if event_id:
+                                    last_event_id = event_id
+                                if event_type == "end":
+                                    break
+                                frame = json.loads(data)
+                                role = frame["role"]
+                                if frame["type"] == "chunk":
+                                    advisor_responses[role] = advisor_responses.get(role, "") + frame["text"]
+                                elif frame["type"] == "error":
+                                    advisor_responses[role] = (
+                                        advisor_responses.get(role, "")
+                                        + f"\nError from {role} advisor: {frame['text']}\n"
+                                    )
+                                full_response = format_board_response(advisor_responses)
                                 # Update the message placeholder with the accumulated response
                                 message_placeholder.markdown(full_response)
-                    except Exception as stream_error:
-                        st.error(f"Error processing stream: {str(stream_error)}")
-                        st.error(f"Response headers: {response.headers}")
+                            break
+                        except requests.exceptions.RequestException as stream_error:
+                            # Dropped connection: pick up after the last event instead of starting over
+                            if not conversation_id or reconnects >= 3:
+                                st.error(f"Error processing stream: {str(stream_error)}")
+                                break
+                            reconnects += 1
+                            time.sleep(1)
+                            stream = requests.get(
+                                f"{API_URL}/advisors/conversations/{conversation_id}/stream",
+                                headers={
+                                    "Authorization": f"Bearer {st.session_state.token}",
+                                    "Last-Event-ID": last_event_id or "0"
+                                },
+                                stream=True
+                            )
+                        except Exception as stream_error:
+                            st.error(f"Error processing stream: {str(stream_error)}")
+                            st.error(f"Response headers: {response.headers}")
+                            break
                 
                 # Add AI response to chat history
                 st.session_state.chat_history.append({
                     "role": "assistant",
                     "content": full_response
                 })
+            elif response.status_code == 429:
+                retry_after = response.headers.get("Retry-After", "a few")
+                st.warning(f"The board is busy right now. Please try again in {retry_after} seconds.")
             else:
                 error_detail = "Unknown error"
                 try: